@@ -3,45 +3,97 @@
 #
 # Autohome のランキングページを毎月自動で取得し、
 # output/company 以下に CSV + 画像 を保存する。
+#
+# 使い方:
+#   python tools/autohome_company_from_html.py                       # 先月のみ（従来どおり）
+#   python tools/autohome_company_from_html.py --from 2023-10 --to 2025-09   # 月範囲をまとめて取得
+#   python tools/autohome_company_from_html.py --months 2025-08 2025-09 --force
+#
+#   - 複数月は接続プール付きのセッションで並行取得（--workers）
+#   - 前回の ETag / Last-Modified を output/company/fetch_state.json に保存し、条件付きリクエストで取得
+#   - 304、または本文のハッシュが前回と同じ月は書き直さない
+#     判定は fetch_state.json だけで行う（CI では月別 CSV をコミットしないので CSV の有無は見ない。
+#     ローカルで CSV を消して作り直したいときは --force）
+#   - 書き直した月は ranking_history の SQLite（maker_rankings）にも反映
 
-import os
 import re
 import csv
+import json
 import base64
+import hashlib
+import argparse
 import requests
+import threading
 from pathlib import Path
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lxml import etree, html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from image_store import ImageStore, decode_data_url, enabled as image_store_enabled
+import ranking_history
 
 
 # =============================
-# ① 対象月を自動生成 （今日の1ヶ月前/次月など調整可能）
+# ① 対象月
 # =============================
-# 今回は GitHub Actions 実行日を基準に “先月”
-today = datetime.utcnow()
-target_month = today.replace(day=1) - timedelta(days=1)     # 1ヶ月前
-year = target_month.year
-month = target_month.month
+def default_month() -> str:
+    """実行日を基準に “先月”（GitHub Actions の定期実行用）"""
+    today = datetime.utcnow()
+    target_month = today.replace(day=1) - timedelta(days=1)     # 1ヶ月前
+    return f"{target_month.year}-{target_month.month:02d}"
+
+
+def month_range(start: str, end: str) -> list[str]:
+    y, m = map(int, start.split("-"))
+    ey, em = map(int, end.split("-"))
+    out = []
+    while (y, m) <= (ey, em):
+        out.append(f"{y}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
 
-# URL 形式に変換
-target_str = f"{year}-{month:02d}"
-print("▶ Target:", target_str)
 
 # =============================
 # ② Autohome のランキング URL
 # =============================
-BASE_URL = f"https://www.autohome.com.cn/rank/1-3-1072-x/{target_str}.html"
+def rank_url(target_str: str) -> str:
+    return f"https://www.autohome.com.cn/rank/1-3-1072-x/{target_str}.html"
 
 
 # =============================
 # ③ 保存先
 # =============================
-BASE_DIR = Path("output/company") / target_str
-IMG_DIR = BASE_DIR / "images"
-CSV_PATH = BASE_DIR / f"autohome_company_ranking_{target_str}.csv"
+OUT_ROOT = Path("output/company")
+STATE_PATH = OUT_ROOT / "fetch_state.json"
+
+
+def base_dir_for(target_str: str) -> Path:
+    return OUT_ROOT / target_str
+
+
+def img_dir_for(target_str: str) -> Path:
+    return base_dir_for(target_str) / "images"
+
+
+def csv_path_for(target_str: str) -> Path:
+    return base_dir_for(target_str) / f"autohome_company_ranking_{target_str}.csv"
+
 
-BASE_DIR.mkdir(parents=True, exist_ok=True)
-IMG_DIR.mkdir(parents=True, exist_ok=True)
+# ロゴは月をまたいで同じものが多いので内容アドレスのストアに 1 回だけ保存（IMAGE_STORE=0 で従来の月別 PNG）
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> ImageStore | None:
+    global _STORE
+    if not image_store_enabled():
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ImageStore(OUT_ROOT / "img_store", "output/company/img_store")
+    return _STORE
 
 
 def sanitize_filename(s: str) -> str:
@@ -49,16 +101,25 @@ def sanitize_filename(s: str) -> str:
     return s[:80].strip("_") or "company"
 
 
-def save_base64_image(data_url: str, rank: int, manufacturer: str):
+def save_base64_image(data_url: str, rank: int, manufacturer: str, img_dir: Path):
     """data:image/base64 を画像として保存"""
     if not data_url.startswith("data:image"):
         return ""
 
+    store = get_store()
+    if store is not None:
+        img_bytes = decode_data_url(data_url)
+        try:
+            return store.put(img_bytes)["url"] if img_bytes else ""
+        except Exception:
+            return ""
+
     try:
         header, b64 = data_url.split(",", 1)
         img_bytes = base64.b64decode(b64)
         fname = f"{rank:03d}_{sanitize_filename(manufacturer)}.png"
-        outpath = IMG_DIR / fname
+        img_dir.mkdir(parents=True, exist_ok=True)
+        outpath = img_dir / fname
         with open(outpath, "wb") as f:
             f.write(img_bytes)
         return str(outpath)
@@ -66,16 +127,33 @@ def save_base64_image(data_url: str, rank: int, manufacturer: str):
         return ""
 
 
+# =============================
+# ④ パース（lxml）
+# =============================
+SVG_XP = etree.XPath(".//*[local-name()='svg']")
+NAME_XP = etree.XPath(
+    ".//*[contains(concat(' ', normalize-space(@class), ' '), ' tw-text-lg ')"
+    " and contains(concat(' ', normalize-space(@class), ' '), ' tw-font-medium ')]"
+)
+IMG_XP = etree.XPath(".//img")
+CARDS_XP = etree.XPath("//div[@data-rank-num]")
+
+
+def _text(el, sep: str = "") -> str:
+    return sep.join(t.strip() for t in el.itertext() if t.strip())
+
+
 def parse_delta(card):
     """SVG 色 ＋ 数字から +2 / -1 / → / NEW を判定"""
-    svg = card.find("svg")
-    if not svg:
+    svgs = SVG_XP(card)
+    if not svgs:
         return "NEW"
+    svg = svgs[0]
 
-    svg_html = str(svg)
+    svg_html = etree.tostring(svg, encoding="unicode")
     fills = {c.lower() for c in re.findall(r'fill="(#?[0-9a-fA-F]{3,6})"', svg_html)}
 
-    text = svg.get_text(strip=True)
+    text = _text(svg)
     m = re.search(r"\d+", text)
     num = m.group(0) if m else None
 
@@ -95,28 +173,28 @@ def parse_delta(card):
 
 def parse_units(card):
     """カード内のテキストから台数(大きな数字)を抽出"""
-    text = card.get_text(" ", strip=True)
+    text = _text(card, " ")
     candidates = re.findall(r"\d{4,7}", text)
     if not candidates:
         return None
     return int(candidates[-1])
 
 
-def extract_one_card(card):
+def extract_one_card(card, img_dir: Path):
     rank = int(card.get("data-rank-num"))
 
     # メーカー名
-    name_el = card.select_one(".tw-text-lg.tw-font-medium")
-    manufacturer = name_el.get_text(strip=True) if name_el else ""
+    name_el = NAME_XP(card)
+    manufacturer = _text(name_el[0]) if name_el else ""
 
     units = parse_units(card)
     delta = parse_delta(card)
 
-    img_tag = card.find("img")
-    img_src = img_tag["src"] if img_tag else ""
+    img_tag = IMG_XP(card)
+    img_src = (img_tag[0].get("src") or "") if img_tag else ""
     img_path = ""
     if img_src.startswith("data:image"):
-        img_path = save_base64_image(img_src, rank, manufacturer)
+        img_path = save_base64_image(img_src, rank, manufacturer, img_dir)
 
     return {
         "rank": rank,
@@ -127,20 +205,16 @@ def extract_one_card(card):
     }
 
 
-def main():
-    print("📥 Downloading:", BASE_URL)
-    r = requests.get(BASE_URL, headers={"User-Agent": "Mozilla/5.0"})
-    r.encoding = "utf-8"
-    html = r.text
-
-    soup = BeautifulSoup(html, "lxml")
-
-    cards = soup.find_all("div", attrs={"data-rank-num": True})
-
-    rows = [extract_one_card(card) for card in cards]
+def parse_rows(html_text: str, img_dir: Path) -> list[dict]:
+    doc = lxml_html.fromstring(html_text)
+    rows = [extract_one_card(card, img_dir) for card in CARDS_XP(doc)]
     rows.sort(key=lambda x: x["rank"])
+    return rows
+
 
-    with open(CSV_PATH, "w", newline="", encoding="utf-8-sig") as f:
+def write_csv(csv_path: Path, rows: list[dict]):
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
         w = csv.writer(f)
         w.writerow(["rank", "manufacturer", "units", "delta", "image"])
         for r in rows:
@@ -152,8 +226,119 @@ def main():
                 r["image"],
             ])
 
-    print(f"✔ CSV saved → {CSV_PATH}")
-    print(f"✔ Images → {len(list(IMG_DIR.glob('*.png')))} files")
+
+# =============================
+# ⑤ 取得（プール付きセッション + 条件付きリクエスト）
+# =============================
+def make_session(pool: int) -> requests.Session:
+    s = requests.Session()
+    retry = Retry(total=4, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(["GET"]))
+    adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"User-Agent": "Mozilla/5.0"})
+    return s
+
+
+def load_state() -> dict:
+    try:
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def save_state(state: dict):
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(STATE_PATH)
+
+
+def process_month(session: requests.Session, target_str: str, prev: dict, force: bool, timeout: float) -> tuple[str, dict]:
+    """1 か月分を取得して保存 → (status, 新しい state)"""
+    url = rank_url(target_str)
+    csv_path = csv_path_for(target_str)
+    known = bool(prev.get("sha256")) and not force   # 前回この月を取得・保存済み
+
+    headers = {}
+    if known:
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+
+    r = session.get(url, headers=headers, timeout=timeout)
+    if r.status_code == 304:
+        return "not-modified", prev
+    r.raise_for_status()
+    r.encoding = "utf-8"
+    html_text = r.text
+
+    digest = hashlib.sha256(r.content).hexdigest()
+    state = {
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", ""),
+        "sha256": digest,
+        "fetched_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    if known and prev.get("sha256") == digest:
+        return "unchanged", {**prev, **state}
+
+    rows = parse_rows(html_text, img_dir_for(target_str))
+    if not rows:
+        return "empty", prev
+    write_csv(csv_path, rows)
+    state["rows"] = len(rows)
+    return "written", state
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--from", dest="start", type=str, default="", help="開始月 YYYY-MM")
+    ap.add_argument("--to", dest="end", type=str, default="", help="終了月 YYYY-MM（省略時は先月）")
+    ap.add_argument("--months", nargs="*", default=[], help="個別に指定する月 YYYY-MM")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--force", action="store_true", help="条件付きリクエスト・未変更スキップを使わない")
+    args = ap.parse_args()
+
+    months = list(args.months)
+    if args.start:
+        months += month_range(args.start, args.end or default_month())
+    if not months:
+        months = [default_month()]
+    months = sorted(set(months))
+    print("▶ Target:", months[0] if len(months) == 1 else f"{months[0]} .. {months[-1]} ({len(months)} months)")
+
+    state = load_state()
+    session = make_session(max(1, args.workers))
+    counts: dict[str, int] = {}
+    failed = []
+    history = ranking_history.connect()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        futs = {ex.submit(process_month, session, m, state.get(m, {}), args.force, args.timeout): m for m in months}
+        for fut in as_completed(futs):
+            m = futs[fut]
+            try:
+                status, st = fut.result()
+            except Exception as e:
+                failed.append(m)
+                print(f"❌ {m}: {type(e).__name__}: {e}")
+                continue
+            state[m] = st
+            counts[status] = counts.get(status, 0) + 1
+            if status == "written":
+                print(f"✔ CSV saved → {csv_path_for(m)} ({st.get('rows', 0)} rows)")
+                ranking_history.ingest_company_csv(history, csv_path_for(m), m)
+            else:
+                print(f"… {m}: {status}")
+    save_state(state)
+    history.close()
+
+    print("✔ Summary: " + " ".join(f"{k}={v}" for k, v in sorted(counts.items())) + (f" failed={len(failed)}" if failed else ""))
+    if failed and len(failed) == len(months):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
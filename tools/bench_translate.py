@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# tools/bench_translate.py
+#
+# 目的:
+#   実データ（output/autohome/*/config_*.csv）を使い、translate_columns.py の
+#   スループットをオフラインで計測する。LLM は tools/llm_standin.py で代替。
+#
+# 計測項目:
+#   terms/sec（ユニーク語数 / 経過秒）・LLM リクエスト数・リトライ数（注入エラー数）・
+#   キャッシュヒット率（translate_columns.py の cache_stats.json を集計）
+#
+# 使い方:
+#   python tools/bench_translate.py --limit 10 --latency 0.3 --error-rate 0.05
+#   python tools/bench_translate.py --warm          # リポジトリの cache/ を複製して計測
+#   python tools/bench_translate.py --base-url http://127.0.0.1:8770/v1   # 起動済みの代替サーバを使う
+#
+# 計測例（2026-10-18, 1 CPU のコンテナ, Python 3.11 / pandas 3.0, 代替サーバは内蔵・記録なし）:
+#   --limit 0（186 ファイル, cold）       308.2s  68346 terms  221.8 terms/s  requests=1297  hit=38.6%
+#   --limit 0 --warm                      285.1s  68346 terms  239.7 terms/s  requests=233   hit=89.2%
+#   --limit 5                             8.2s    1819 terms   222.0 terms/s  requests=35    hit=39.8%
+#   --limit 5 --latency 0.3 --error-rate 0.05 --seed 1
+#                                         22.6s   1819 terms   80.4 terms/s   requests=40    retries=5
+#   代替サーバの応答が即時だと 1 ファイルあたり約 1.5s はほぼプロセス起動（pandas 等の import）で、
+#   warm でも短縮は 1 割程度。LLM の待ちが入ると requests 数がそのまま効く
+
+import argparse, json, os, shutil, subprocess, sys, tempfile, time, urllib.request
+from pathlib import Path
+
+from llm_standin import StandIn, serve
+
+TOOLS_DIR = Path(__file__).resolve().parent
+REPO_DIR = TOOLS_DIR.parent
+
+def fetch_stats(base_url: str) -> dict:
+    root = base_url.rstrip("/")
+    if root.endswith("/v1"):
+        root = root[:-3]
+    try:
+        with urllib.request.urlopen(root + "/stats", timeout=10) as r:
+            return json.loads(r.read().decode("utf-8"))
+    except Exception:
+        return {}
+
+def find_corpus(pattern: str, limit: int) -> list[Path]:
+    files = sorted(REPO_DIR.glob(pattern))
+    # 翻訳済み（.ja.csv / _ja.csv / .en.csv）は除外
+    files = [p for p in files if not p.stem.endswith(("_ja", ".ja", ".en"))]
+    return files[:limit] if limit else files
+
+def run_one(csv_in: Path, workdir: Path, env_base: dict, langs: str) -> dict:
+    sid = csv_in.parent.name
+    out_dir = workdir / "out" / sid
+    out_dir.mkdir(parents=True, exist_ok=True)
+    env = dict(env_base)
+    env.update({
+        "CSV_IN": str(csv_in),
+        "CSV_OUT": str(out_dir / f"config_{sid}.ja.csv"),
+        "SERIES_ID": sid,
+        "TARGET_LANGS": langs,
+        "CACHE_STATS_OUT": str(out_dir / "cache_stats.json"),
+    })
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(TOOLS_DIR / "translate_columns.py")],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - t0
+    stats = {}
+    try:
+        stats = json.loads((out_dir / "cache_stats.json").read_text(encoding="utf-8"))
+    except Exception:
+        pass
+    if proc.returncode != 0:
+        print(f"  !! {sid} failed (rc={proc.returncode})\n{proc.stderr[-800:]}")
+    return {"series": sid, "ok": proc.returncode == 0, "seconds": elapsed, "cache": stats.get("total", {})}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--glob", type=str, default="output/autohome/*/config_*.csv", help="コーパス（リポジトリ相対）")
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--langs", type=str, default="ja")
+    ap.add_argument("--warm", action="store_true", help="リポジトリの cache/<sid> を複製してから実行")
+    ap.add_argument("--base-url", type=str, default="", help="起動済みの OpenAI 互換サーバ（省略時は内蔵の代替サーバ）")
+    ap.add_argument("--recordings", type=str, default="")
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--truncate-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=str, default="", help="結果 JSON の保存先")
+    args = ap.parse_args()
+
+    corpus = find_corpus(args.glob, args.limit)
+    if not corpus:
+        print(f"❌ no corpus matched: {args.glob}")
+        sys.exit(1)
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        standin = StandIn(Path(args.recordings) if args.recordings else None, args.latency, args.jitter,
+                          args.error_rate, args.truncate_rate, args.seed)
+        server = serve(standin)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    before = fetch_stats(base_url)
+
+    env = {k: v for k, v in os.environ.items() if k not in ("CURRENCY", "TRANSLATE_SERVICE_URL")}
+    env.update({"OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "offline"})
+
+    results = []
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="bench_translate_") as tmp:
+        workdir = Path(tmp)
+        if args.warm:
+            for p in corpus:
+                src = REPO_DIR / "cache" / p.parent.name
+                if src.is_dir():
+                    shutil.copytree(src, workdir / "cache" / p.parent.name, dirs_exist_ok=True)
+        for i, p in enumerate(corpus, 1):
+            r = run_one(p, workdir, env, args.langs)
+            n = sum(r["cache"].values())
+            print(f"[{i}/{len(corpus)}] {r['series']}: {r['seconds']:.2f}s terms={n} llm={r['cache'].get('llm', 0)}")
+            results.append(r)
+    wall = time.perf_counter() - t0
+
+    after = fetch_stats(base_url)
+    if server:
+        server.shutdown()
+
+    tiers = ("fixed", "series", "mem", "llm")
+    total = {t: sum(r["cache"].get(t, 0) for r in results) for t in tiers}
+    terms = sum(total.values())
+    report = {
+        "files": len(results),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "seconds": round(wall, 3),
+        "terms": terms,
+        "terms_per_sec": round(terms / wall, 2) if wall else 0.0,
+        "llm_terms": total["llm"],
+        "requests": after.get("requests", 0) - before.get("requests", 0),
+        "retries": after.get("errors", 0) - before.get("errors", 0),
+        "truncated": after.get("truncated", 0) - before.get("truncated", 0),
+        "cache": total,
+        "hit_rate": round((terms - total["llm"]) / terms, 4) if terms else 0.0,
+        "per_file": results,
+    }
+    print(
+        f"\n📊 files={report['files']} failed={report['failed']} seconds={report['seconds']} "
+        f"terms={terms} terms/sec={report['terms_per_sec']} requests={report['requests']} "
+        f"retries={report['retries']} hit={report['hit_rate']:.1%}"
+    )
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"✅ Saved: {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# tools/image_store.py
+#
+# 内容アドレスの画像ストア（ランキング画像・メーカーロゴ共通）
+#   - デコード後のピクセル（mode + サイズ + 画素列）の SHA-256 をキーにし、同じ画像は 1 回だけ保存
+#   - 保存形式: WebP（表示用）+ 最適化 PNG（互換用）+ サムネイル WebP
+#   - 既にあるキーは書き直さない → 毎月・毎回同じ画像でもファイルは増えず、差分も出ない
+#
+# 配置:
+#   <root>/<hash[:2]>/<hash>.webp / <hash>.png / <hash>_t.webp
+#
+# 環境変数:
+#   IMAGE_STORE          1（既定）で有効 / 0 で従来どおり個別 PNG を書く
+#   IMAGE_THUMB_PX       サムネイルの最大辺（既定 160）
+#   IMAGE_WEBP_QUALITY   WebP 品質（既定 82）
+
+import base64, hashlib, io, os, threading
+from pathlib import Path
+
+try:
+    from PIL import Image
+    _PIL_OK = True
+except Exception:
+    _PIL_OK = False
+
+IMAGE_STORE = os.environ.get("IMAGE_STORE", "1").strip() not in ("0", "false", "no", "")
+THUMB_PX = int(os.environ.get("IMAGE_THUMB_PX", "160"))
+WEBP_QUALITY = int(os.environ.get("IMAGE_WEBP_QUALITY", "82"))
+
+def enabled() -> bool:
+    return IMAGE_STORE and _PIL_OK
+
+def decode_data_url(data_url: str) -> bytes | None:
+    """data:image/...;base64,... → バイト列"""
+    if not (data_url or "").startswith("data:image") or "," not in data_url:
+        return None
+    try:
+        return base64.b64decode(data_url.split(",", 1)[1])
+    except Exception:
+        return None
+
+def pixel_hash(im: "Image.Image") -> str:
+    h = hashlib.sha256()
+    h.update(f"{im.mode}:{im.width}x{im.height}:".encode("ascii"))
+    h.update(im.tobytes())
+    return h.hexdigest()[:20]
+
+def _atomic_save(im: "Image.Image", path: Path, **kw):
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    im.save(tmp, **kw)
+    os.replace(tmp, path)
+
+class ImageStore:
+    def __init__(self, root: Path, url_prefix: str = "", thumb_px: int = THUMB_PX, quality: int = WEBP_QUALITY):
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.thumb_px = thumb_px
+        self.quality = quality
+
+    def _url(self, path: Path) -> str:
+        return f"{self.url_prefix}/{path.relative_to(self.root).as_posix()}"
+
+    def put(self, src) -> dict:
+        """bytes / パス / PIL.Image を保存し {hash, url, png_url, thumb_url, width, height, new} を返す"""
+        if isinstance(src, (bytes, bytearray)):
+            im = Image.open(io.BytesIO(src))
+        elif isinstance(src, (str, Path)):
+            im = Image.open(src)
+        else:
+            im = src
+        im.load()
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+        # 全面不透明なら RGB に落とす（同じ見た目は同じキーになるように）
+        if im.mode == "RGBA" and im.getchannel("A").getextrema() == (255, 255):
+            im = im.convert("RGB")
+
+        key = pixel_hash(im)
+        d = self.root / key[:2]
+        webp, png, thumb = d / f"{key}.webp", d / f"{key}.png", d / f"{key}_t.webp"
+        new = not (webp.exists() and png.exists() and thumb.exists())
+        if new:
+            d.mkdir(parents=True, exist_ok=True)
+            _atomic_save(im, webp, format="WEBP", quality=self.quality, method=6)
+            _atomic_save(im, png, format="PNG", optimize=True)
+            t = im.copy()
+            t.thumbnail((self.thumb_px, self.thumb_px))
+            _atomic_save(t, thumb, format="WEBP", quality=self.quality, method=6)
+        return {
+            "hash": key,
+            "url": self._url(webp),
+            "png_url": self._url(png),
+            "thumb_url": self._url(thumb),
+            "width": im.width,
+            "height": im.height,
+            "new": new,
+        }
@@ -4,8 +4,10 @@
 koubei_review_diff.py
 目的:
   - autohome_reviews_{series_id}.csv の review ID 一覧を取得
-  - cache/koubei/{series_id}/ 内に存在する過去 JSON 群から前回 ID 一覧を取得
-  - 新旧の差分数を比較して、MIN_DIFF を超えた場合のみ story 再生成フラグを立てる
+  - cache/koubei/{series_id}/story_ids.txt（なければ過去 JSON 群）から前回 ID 一覧を取得
+  - 前回に無かった ID（新着）の数が MIN_DIFF 以上の場合のみ story 再生成フラグを立てる
+    （CSV は新しい順に上限件数だけなので、古い ID が CSV から外れたことは差分に数えない）
+  - --save-ids: story の元にした CSV の ID を story_ids.txt に保存（story 再生成後に呼ぶ）
 出力:
   - diff 数などをログ出力
   - 環境ファイルに do_story=true/false を書き込む（YML 両対応）
@@ -14,6 +16,7 @@ koubei_review_diff.py
 import os
 import re
 import glob
+import argparse
 import pandas as pd
 from pathlib import Path
 
@@ -22,6 +25,10 @@ def load_ids_from_csv(csv_path: str):
     return df["id"].astype(str).tolist()
 
 def load_ids_from_cache(cache_dir: Path):
+    # 前回 story 生成時の ID 一覧（review_store.py ids --out で保存）→ なければ旧形式の JSON 群
+    story_ids = cache_dir / "story_ids.txt"
+    if story_ids.exists():
+        return [ln.strip() for ln in story_ids.read_text(encoding="utf-8").splitlines() if ln.strip()]
     ids = []
     if cache_dir.exists():
         for f in cache_dir.glob("*.json"):
@@ -49,18 +56,29 @@ def infer_series_id():
     raise RuntimeError("series_id could not be inferred (no env, no file).")
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--min-diff", type=int, default=int(os.environ.get("MIN_DIFF", "3") or 3))
+    ap.add_argument("--save-ids", action="store_true", help="CSV の ID を story_ids.txt に保存して終了")
+    args = ap.parse_args()
+
     series_id = infer_series_id()
-    min_diff = int(os.environ.get("MIN_DIFF", "3"))
+    min_diff = args.min_diff
     csv_path = f"autohome_reviews_{series_id}.csv"
     cache_dir = Path(f"cache/koubei/{series_id}")
 
     print(f"[series] {series_id}")
 
     cur_ids = load_ids_from_csv(csv_path)
+    if args.save_ids:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        out = cache_dir / "story_ids.txt"
+        out.write_text("".join(f"{rid}\n" for rid in sorted(set(cur_ids))), encoding="utf-8")
+        print(f"✅ {len(set(cur_ids))} story ids → {out}")
+        return
     prev_ids = load_ids_from_cache(cache_dir)
 
-    diff = len(set(cur_ids) ^ set(prev_ids))
-    print(f"[diffguard] prev={len(prev_ids)} new={len(cur_ids)} diff={diff}")
+    diff = len(set(cur_ids) - set(prev_ids))
+    print(f"[diffguard] prev={len(prev_ids)} new={len(cur_ids)} diff={diff} (ids not in prev)")
 
     do_story = diff >= min_diff
     if do_story:
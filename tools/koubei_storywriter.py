@@ -4,6 +4,7 @@ import os, sys, re, json, time
 import pandas as pd
 from pathlib import Path
 from openai import OpenAI
+from llm_budget import Budget, Planner, estimate_tokens, series_priority_offset
 
 # =========================================================
 # 概要:
@@ -78,17 +79,23 @@ def build_prompt(payload, style):
     return user
 
 
-def ask_model(client, system, user):
+STORY_MODEL = "gpt-4o-mini"
+STORY_MAX_TOKENS = 1300
+
+
+def ask_model(client, system, user, budget=None):
     """OpenAIモデル呼び出し"""
     comp = client.chat.completions.create(
-        model="gpt-4o-mini",
+        model=STORY_MODEL,
         messages=[
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
         temperature=0.2,
-        max_tokens=1300,
+        max_tokens=STORY_MAX_TOKENS,
     )
+    if budget is not None:
+        budget.record(getattr(comp, "usage", None))
     return comp.choices[0].message.content.strip()
 
 
@@ -112,8 +119,7 @@ def make_payload(df: pd.DataFrame):
     return {"pros": pros, "cons": cons, "representatives": reps, "meta": meta}
 
 
-def main(series_id: str, style: str = "formal"):
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+def main(series_id: str, style: str = "formal", plan: bool = False):
     csv_path = detect_csv(series_id)
     print(f"[detect] found {csv_path}")
     df = pd.read_csv(csv_path)
@@ -123,7 +129,26 @@ def main(series_id: str, style: str = "formal"):
         "あなたは日本語Markdownレポート作成者です。"
         "常に###見出しと箇条書きを用いて構成し、自然で整然としたMarkdown形式を維持してください。"
     )
-    story = ask_model(client, system, prompt)
+    if plan:
+        planner = Planner("koubei_storywriter", STORY_MODEL)
+        planner.rows.append(("story", 1, 1, estimate_tokens(system + prompt) + STORY_MAX_TOKENS))
+        planner.print_report()
+        return
+
+    # 予算が足りなければ既存の story を残して次回へ回す
+    budget = Budget.from_env("koubei_storywriter", series_id, STORY_MODEL)
+    if not budget.allow(estimate_tokens(system + prompt), STORY_MAX_TOKENS, priority=1 + series_priority_offset()):
+        budget.defer(1)
+        budget.print_summary()
+        print(f"⏭️ budget: story for {series_id} deferred to next run")
+        return
+
+    # OPENAI_BASE_URL でローカル互換サーバ（tools/llm_standin.py）へ差し替え可能
+    base_url = os.environ.get("OPENAI_BASE_URL", "").strip() or None
+    api_key = os.environ.get("OPENAI_API_KEY", "") or ("offline" if base_url else "")
+    client = OpenAI(api_key=api_key, base_url=base_url)
+    story = ask_model(client, system, prompt, budget)
+    budget.print_summary()
     story = clean_report(story)
     outdir = Path(f"output/koubei/{series_id}")
     outdir.mkdir(parents=True, exist_ok=True)
@@ -135,9 +160,10 @@ def main(series_id: str, style: str = "formal"):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python tools/koubei_storywriter.py <series_id> [style]")
+    args = [a for a in sys.argv[1:] if a != "--plan"]
+    if len(args) < 1:
+        print("Usage: python tools/koubei_storywriter.py [--plan] <series_id> [style]")
         sys.exit(1)
-    series_id = sys.argv[1]
-    style = sys.argv[2] if len(sys.argv) > 2 else "formal"
-    main(series_id, style)
+    series_id = args[0]
+    style = args[1] if len(args) > 1 else "formal"
+    main(series_id, style, plan="--plan" in sys.argv[1:])
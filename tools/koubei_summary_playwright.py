@@ -1,21 +1,68 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import sys, re, json, time
+import os, sys, re, time, asyncio, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+import requests
 from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+from lxml import etree, html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+
+from review_store import COMPACT_AT, ReviewStore
 
 """
 Usage:
-  python tools/koubei_summary_playwright.py <series_id> <pages>
+  python tools/koubei_summary_playwright.py <series_id> [pages]
+    pages: 一覧ページ数の上限（0 / 省略時は 1 ページ目のページ送りから実際のページ数を検出）
 
 最小方針（余計なことなし）:
 - 一覧は「左カラム（.con-left）」内のみから review_id を抽出（右カラムの固定リンクは除外）
 - 詳細は Playwright の response.body() を取得して <meta charset> を見てデコード（GBK/GB2312/UTF-8 自動判定）
-- 詳細アクセスは domcontentloaded + リトライ1回、timeout やや長め
-- 既存のキャッシュ/zip/artifact の流れはそのまま
+- 詳細アクセスは domcontentloaded + リトライ、timeout やや長め
+- レビューは review_store.py のシャード（cache/koubei/<sid>/store/*.jsonl.gz + index.tsv）に追記
+  zip（artifact）には今回追加したシャードだけを入れる（全体の再圧縮はしない）
+  旧形式の cache/<sid>/*.json・cache/koubei/<sid>/*.json は初回にストアへ取り込む
+- ブラウザは 1 回だけ起動し、一覧・詳細とも同じブラウザのページプール（KOUBEI_PAGES 枚）を使い回す
+  詳細は asyncio で並行取得（1 件ごとに KOUBEI_TIMEOUT_S のタイムアウト、KOUBEI_RETRIES 回まで再試行）
+- 詳細ページは描画結果を使わない（body バイトのみ）ので、既定は素の HTTP で取得
+  keep-alive の接続プール + UA/Referer + バックオフ付き再試行、同時数は KOUBEI_HTTP_CONCURRENCY
+  （HTTP 専用のスレッドプール。asyncio の既定 executor は使わない）
+  ブロックされたらしい応答（403/429・200 なのに本文のマーカーなし）だけ Playwright のページプールで取り直す
+  404 などそれ以外の失敗はその回は諦める（ストアに載らないので次回また取りに行く）
+- 一覧は差分クロール（既定）: 1 ページ目でページ数を検出し、2 ページ目以降を KOUBEI_LIST_WINDOW 枚ずつ並行取得
+  取得済み ID（ストアの索引）しか出てこないページに当たったらそこで打ち切る
+- 取得（I/O）と解析（CPU）を分離: 取得した詳細のバイト列は ProcessPoolExecutor（KOUBEI_PARSE_WORKERS）の
+  lxml/XPath パーサへ渡し、結果はキュー経由で 1 つの writer がストアへまとめて追記（KOUBEI_FLUSH_EVERY 件ごと）
+- 一覧の review_id 抽出は正規表現の高速経路（左カラムを閉じタグまで切り出し）→ 判断できないときだけ BeautifulSoup
+
+環境変数:
+  KOUBEI_PAGES       同時に開くページ数（既定 4）
+  KOUBEI_TIMEOUT_S   1 リクエストのタイムアウト秒（既定 60）
+  KOUBEI_RETRIES     詳細取得の再試行回数（既定 2）
+  KOUBEI_DETAIL      http（既定・ブロック時はブラウザ）/ browser（常にブラウザ）
+  KOUBEI_HTTP_CONCURRENCY  HTTP の同時リクエスト数（既定 16）
+  KOUBEI_LIST_MODE   incremental（既定）/ full（打ち切らずに 1..ページ数 をすべて取得。ページ数不明なら空ページまで）
+  KOUBEI_LIST_WINDOW 一覧を並行取得する枚数（既定 3）
+  KOUBEI_PARSE_WORKERS  詳細解析のプロセス数（既定 CPU 数）
+  KOUBEI_FLUSH_EVERY    writer がストアへ追記する件数の区切り（既定 200）
 """
 
+POOL_PAGES = max(1, int(os.environ.get("KOUBEI_PAGES", "4")))
+TIMEOUT_S = float(os.environ.get("KOUBEI_TIMEOUT_S", "60"))
+RETRIES = max(0, int(os.environ.get("KOUBEI_RETRIES", "2")))
+DETAIL_MODE = os.environ.get("KOUBEI_DETAIL", "http").strip().lower()
+HTTP_CONCURRENCY = max(1, int(os.environ.get("KOUBEI_HTTP_CONCURRENCY", "16")))
+LIST_MODE = os.environ.get("KOUBEI_LIST_MODE", "incremental").strip().lower()
+LIST_WINDOW = max(1, int(os.environ.get("KOUBEI_LIST_WINDOW", "3")))
+LIST_MAX_PAGES = 200  # ページ数を検出できず引数もないときの上限
+PARSE_WORKERS = max(1, int(os.environ.get("KOUBEI_PARSE_WORKERS", "0") or 0) or (os.cpu_count() or 1))
+FLUSH_EVERY = max(1, int(os.environ.get("KOUBEI_FLUSH_EVERY", "200")))
+UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+      "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
 DETAIL_URL = "https://k.autohome.com.cn/detail/view_{reviewid}.html"
 
 def build_list_url(series_id: str, page: int) -> str:
@@ -27,7 +74,64 @@ def build_list_url(series_id: str, page: int) -> str:
 # ---------- 一覧: 左カラム限定で review_id 抽出（右カラム除外）、.html なしも救済 ----------
 ID_PAT = re.compile(r"/detail/view_([A-Za-z0-9]+)(?:\.html|\.)")
 
+# 高速経路: 生 HTML から正規表現で拾う
+HREF_ID_PAT = re.compile(r"""href\s*=\s*["'][^"']*/detail/view_([A-Za-z0-9]+)(?:\.html|\.)""", re.I)
+LI_RID_PAT = re.compile(r"""<li\b[^>]*?\bdata-reviewid\s*=\s*["']\s*([^"']*?)\s*["']""", re.I)
+
+def _class_pos(html: str, token: str) -> list[int]:
+    pat = re.compile(r"""class\s*=\s*["'][^"']*(?<![\w-])""" + re.escape(token) + r"""(?![\w-])""", re.I)
+    return [m.start() for m in pat.finditer(html)]
+
+TAG_NAME_PAT = re.compile(r"<([a-zA-Z][\w-]*)")
+
+def _element_end(html: str, pos: int) -> int | None:
+    """pos（属性の位置）を含む開始タグの要素の終了位置。コメント・script 内のタグは数えない。
+    閉じタグが見つからない・開始タグが読めないときは None"""
+    start = html.rfind("<", 0, pos)
+    m = TAG_NAME_PAT.match(html, start) if start >= 0 else None
+    if not m:
+        return None
+    tag = m.group(1).lower()
+    pat = re.compile(r"(?P<skip><!--.*?-->|<script\b.*?</script\s*>)|<(?P<close>/?)"
+                     + re.escape(tag) + r"(?![\w-])[^>]*>", re.I | re.S)
+    depth = 0
+    for t in pat.finditer(html, start):
+        if t.group("skip"):
+            continue
+        depth += -1 if t.group("close") else 1
+        if depth == 0:
+            return t.end()
+    return None
+
+def extract_review_ids_fast(html: str) -> list[str] | None:
+    """左カラムが 1 つで、その終わり（閉じタグ）が確定でき、中に右カラムが無く、右カラムの中にも無い
+    素直な構造なら、左カラムの区間だけを正規表現で見る。左も右も無ければ全体。
+    判断できない構造なら None（BeautifulSoup 経路へ）"""
+    left, right = _class_pos(html, "con-left"), _class_pos(html, "con-right")
+    if len(left) > 1:
+        return None
+    if left:
+        end = _element_end(html, left[0])
+        if end is None or any(left[0] < r < end for r in right):
+            return None
+        for r in right:
+            if r < left[0]:
+                r_end = _element_end(html, r)
+                if r_end is None or r_end > left[0]:
+                    return None   # 左カラムが右カラムの中にある
+        scope = html[left[0]:end]
+    elif right:
+        return None
+    else:
+        scope = html
+    ids = set(HREF_ID_PAT.findall(scope))
+    ids.update(r for r in LI_RID_PAT.findall(scope) if r)
+    return list(ids) if ids else None
+
 def extract_review_ids_from_list(html: str) -> list[str]:
+    fast = extract_review_ids_fast(html)
+    if fast is not None:
+        return fast
     soup = BeautifulSoup(html, "lxml")
     ids: set[str] = set()
 
@@ -61,6 +165,27 @@ def extract_review_ids_from_list(html: str) -> list[str]:
 
     return list(ids)
 
+# ---------- 一覧: ページ送りから総ページ数を検出 ----------
+# ページ送りの要素（class のトークンで判定。page-container のような全体の枠は含めない）
+PAGER_CLASS_PAT = re.compile(
+    r"""class\s*=\s*["'][^"']*(?<![\w-])(?:[\w]+-)?(?:page|pages|pager|pagination|paging)(?:-(?:box|list|wrap|bar|nav))?(?![\w-])""",
+    re.I,
+)
+PAGE_TOTAL_PAT = re.compile(r"共\s*(\d+)\s*页")
+
+def discover_page_count(html: str, series_id: str) -> int | None:
+    """ページ送りの中の /<series_id>/index_N.html と「共N页」だけを見る（関連車種・フッタのリンクは数えない）"""
+    link_pat = re.compile(r"/" + re.escape(str(series_id)) + r"/index_(\d+)\.html")
+    nums: list[int] = []
+    for m in PAGER_CLASS_PAT.finditer(html):
+        end = _element_end(html, m.start())
+        if end is None:
+            continue
+        pager = html[m.start():end]
+        nums += [int(n) for n in link_pat.findall(pager)]
+        nums += [int(n) for n in PAGE_TOTAL_PAT.findall(pager)]
+    return max(nums) if nums else None
+
 # ---------- 詳細: body バイトから charset 判定してデコード ----------
 CHARSET_RE = re.compile(br"charset\s*=\s*([a-zA-Z0-9\-\_]+)", re.I)
 
@@ -79,146 +204,351 @@ def decode_html(body: bytes) -> str:
     # 最後の手段
     return body.decode("utf-8", errors="ignore")
 
-# ---------- 本文抽出部のみ修正 ----------
+# ---------- 本文抽出（lxml/XPath。ProcessPoolExecutor のワーカーで実行） ----------
+def _xp_class(cls: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+TITLE_XP = etree.XPath("//title")
+MSG_XP = etree.XPath(f"//*[{_xp_class('kb-item-msg')}]")
+TEXT_CON_P_XP = etree.XPath(f"//*[{_xp_class('text-con')}]//p")
+# 旧レイアウトのフォールバック（元のまま）: (XPath, 段落単位か)
+FALLBACK_XPS = [
+    (etree.XPath(f"//*[{_xp_class('koubei-txt')}]//p"), True),
+    (etree.XPath(f"//*[{_xp_class('mouthcon-text')}]//p"), True),
+    (etree.XPath(f"//*[{_xp_class('text-con')}]"), False),
+    (etree.XPath(f"//*[{_xp_class('koubei-txt')}]"), False),
+    (etree.XPath(f"//*[{_xp_class('mouthcon-text')}]"), False),
+    (etree.XPath("//article"), False),
+]
+TEXT_XP = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+
+def _text(el) -> str:
+    return " ".join(t.strip() for t in TEXT_XP(el) if t.strip())
+
+# lxml は str に XML 宣言（encoding 付き）があると ValueError で読めないので外す
+XML_DECL_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+
 def parse_detail_html_bytes(body: bytes) -> dict:
-    html = decode_html(body)
-    soup = BeautifulSoup(html, "lxml")
+    html = XML_DECL_RE.sub("", decode_html(body), count=1)
+    try:
+        doc = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return {"title": "", "text": ""}
 
     title = ""
-    t = soup.find("title")
+    t = TITLE_XP(doc)
     if t:
-        title = re.sub(r"_口碑_汽车之家.*", "", t.get_text(strip=True))
+        title = re.sub(r"_口碑_汽车之家.*", "", _text(t[0]))
 
     # 新レイアウト対応: p.kb-item-msg 優先
-    nodes = soup.select(".kb-con .kb-item .kb-item-msg, .kb-item-msg")
+    nodes = MSG_XP(doc)
     if nodes:
-        text_blocks = [n.get_text(" ", strip=True) for n in nodes]
+        text_blocks = [_text(n) for n in nodes]
     else:
-        text_blocks = [p.get_text(" ", strip=True) for p in soup.select(".text-con p")]
+        text_blocks = [_text(p) for p in TEXT_CON_P_XP(doc)]
         if not text_blocks:
-            # 旧レイアウトのフォールバック（元のまま）
-            for css in [
-                ".koubei-txt p",
-                ".mouthcon-text p",
-                ".text-con",
-                ".koubei-txt",
-                ".mouthcon-text",
-                "article",
-            ]:
-                nodes = soup.select(css)
+            for xp, per_p in FALLBACK_XPS:
+                nodes = xp(doc)
                 if nodes:
-                    if css.endswith(" p"):
-                        text_blocks = [p.get_text(" ", strip=True) for p in nodes]
-                    else:
-                        text_blocks = [" ".join(n.get_text(" ", strip=True) for n in nodes)]
+                    text_blocks = [_text(n) for n in nodes] if per_p else [" ".join(_text(n) for n in nodes)]
                     break
 
     text = "\n".join([s for s in text_blocks if s]).strip()
     text = re.sub(r"\s+", " ", text)
     return {"title": title, "text": text}
 
-# ---------- 詳細取得（domcontentloaded・60s・1回リトライ） ----------
-def fetch_detail_into_cache(pw, reviewid: str, cache_dir: Path) -> None:
-    cache_file = cache_dir / f"{reviewid}.json"
-    if cache_file.exists():
-        return
+# ---------- ページプール（1 ブラウザ・1 コンテキストのページを使い回す） ----------
+class PagePool:
+    def __init__(self, context, size: int):
+        self.context = context
+        self.sem = asyncio.Semaphore(size)
+        self.free: list = []
 
-    url = DETAIL_URL.format(reviewid=reviewid)
-    print(f"  fetching detail {url}")
+    @asynccontextmanager
+    async def page(self):
+        async with self.sem:
+            pg = self.free.pop() if self.free else await self.context.new_page()
+            try:
+                yield pg
+            except BaseException:
+                # 状態が怪しいページは捨てる（次の利用者が新しく開く）
+                await pg.close()
+                raise
+            self.free.append(pg)
 
-    def _once() -> bytes | None:
-        browser = pw.chromium.launch(headless=True)
-        page = browser.new_page()
-        # UAを固定（ブロック回避のため穏当なデスクトップUA）
-        page.set_extra_http_headers({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                          "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        })
+# ---------- 詳細取得: HTTP（接続プール・再試行） ----------
+# 本文がある詳細ページなら必ずどれかのクラス名が入っている（ASCII なので GBK のままでも探せる）
+DETAIL_MARKERS = (b"kb-item-msg", b"text-con", b"koubei-txt", b"mouthcon-text", b"<article")
+
+def make_session(pool: int, referer: str) -> requests.Session:
+    s = requests.Session()
+    # リトライ切れでも最後の応答を返す（raise_on_status=False）。429 が RetryError で消えると
+    # looks_blocked に届かずブラウザへのフォールバックが起きない
+    retry = Retry(total=RETRIES + 1, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(["GET"]), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "User-Agent": UA,
+        "Referer": referer,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "zh-CN,zh;q=0.9",
+    })
+    return s
+
+BLOCK_STATUSES = (403, 429)
+
+def looks_blocked(status: int, body: bytes | None) -> bool:
+    """ブラウザで取り直す応答: 403/429、または 200 なのに本文のマーカーがない（チャレンジページ等）。
+    404 などそれ以外の失敗はブラウザでも同じなので取り直さない"""
+    if status in BLOCK_STATUSES:
+        return True
+    return status == 200 and not (body and any(m in body for m in DETAIL_MARKERS))
+
+def fetch_body_http(session: requests.Session, url: str) -> tuple[int, bytes | None]:
+    try:
+        r = session.get(url, timeout=TIMEOUT_S)
+    except requests.RequestException:
+        return 0, None
+    return r.status_code, r.content
+
+# ---------- 詳細取得: Playwright（domcontentloaded・タイムアウト・リトライ） ----------
+async def fetch_body_playwright(pool: PagePool, url: str) -> bytes | None:
+    async with pool.page() as page:
+        resp = await asyncio.wait_for(
+            page.goto(url, wait_until="domcontentloaded", timeout=TIMEOUT_S * 1000),
+            TIMEOUT_S + 5,
+        )
+        return await resp.body() if resp else None
+
+async def fetch_detail_body_playwright(pool: PagePool, reviewid: str, url: str) -> bytes | None:
+    for attempt in range(RETRIES + 1):
         try:
-            resp = page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            if not resp:
-                return None
-            body = resp.body()
+            body = await fetch_body_playwright(pool, url)
+        except (PWTimeout, asyncio.TimeoutError):
+            body = None
+        except Exception as e:
+            print(f"  .. {reviewid} attempt {attempt + 1}: {type(e).__name__}: {e}")
+            body = None
+        if body is not None:
             return body
-        finally:
-            page.close()
-            browser.close()
+        if attempt < RETRIES:
+            await asyncio.sleep(2 * (attempt + 1))  # 軽く待って再試行
+    return None
+
+async def fetch_detail(pool: PagePool, reviewid: str,
+                       http: tuple[requests.Session, ThreadPoolExecutor] | None = None,
+                       stats: dict | None = None) -> bytes | None:
+    """詳細ページの body バイト列を返す（失敗時 None）。解析はしない"""
+    url = DETAIL_URL.format(reviewid=reviewid)
+    stats = stats if stats is not None else {}
 
     body = None
-    try:
-        body = _once()
-    except PWTimeout:
-        body = None
+    if http is not None:
+        session, executor = http
+        # 既定の executor（to_thread）は他の処理と共有なので、HTTP 専用のスレッドプールで同時数を決める
+        status, body = await asyncio.get_running_loop().run_in_executor(executor, fetch_body_http, session, url)
+        if looks_blocked(status, body):
+            print(f"  .. {reviewid}: http {status} looks blocked; falling back to browser")
+            stats["fallback"] = stats.get("fallback", 0) + 1
+            body = None
+        elif status != 200:
+            print(f"  !! failed {reviewid}: http {status or 'error'}")
+            stats["http_error"] = stats.get("http_error", 0) + 1
+            return None
+        else:
+            stats["http"] = stats.get("http", 0) + 1
 
     if body is None:
-        # 1回だけリトライ（軽く待つ）
-        time.sleep(2)
-        try:
-            body = _once()
-        except Exception:
-            body = None
+        print(f"  fetching detail {url}")
+        body = await fetch_detail_body_playwright(pool, reviewid, url)
 
     if body is None:
         print(f"  !! failed {reviewid}: fetch timeout")
-        return
+    return body
 
-    data = parse_detail_html_bytes(body)
+# ---------- 取得 → 解析（プロセスプール）→ 書き込み（単一 writer） ----------
+async def fetch_and_parse(pool: PagePool, reviewid: str, http, stats: dict,
+                          parsers: ProcessPoolExecutor, out: asyncio.Queue) -> bool:
+    body = await fetch_detail(pool, reviewid, http, stats)
+    if body is None:
+        return False
+    data = await asyncio.get_running_loop().run_in_executor(parsers, parse_detail_html_bytes, body)
+    if not data["text"]:
+        # 本文が取れないページは保存しない（ストアに載ると次回以降も取り直されない）
+        print(f"  !! failed {reviewid}: no review text")
+        return False
     data["id"] = reviewid
-    data["url"] = url
-    with open(cache_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    data["url"] = DETAIL_URL.format(reviewid=reviewid)
+    await out.put(data)
+    return True
 
-# ---------- main ----------
-def main(series_id: str, pages: int):
-    cache_dir = Path("cache") / series_id
-    cache_dir.mkdir(parents=True, exist_ok=True)
+async def store_writer(store: ReviewStore, queue: asyncio.Queue, flush_every: int) -> int:
+    """キューのレコードを flush_every 件ずつストアへ追記（ストアに書くのはこの 1 タスクだけ）。None で終了"""
+    buf, written = [], 0
+    while True:
+        r = await queue.get()
+        if r is not None:
+            buf.append(r)
+        if buf and (r is None or len(buf) >= flush_every):
+            n_before = len(store)
+            shard = await asyncio.to_thread(store.append, buf)
+            written += len(store) - n_before
+            print(f"[store] +{len(store) - n_before} reviews → {shard.name if shard else '(no new shard)'}")
+            buf = []
+        if r is None:
+            return written
 
-    all_ids: set[str] = set()
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.set_extra_http_headers({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                          "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        })
-        for i in range(1, pages + 1):
-            url = build_list_url(series_id, i)
-            print(f"[page {i}] fetching… {url}")
+# ---------- 一覧 ----------
+async def fetch_list_page(pool: PagePool, series_id: str, i: int) -> tuple[list[str] | None, int | None]:
+    """(review_id 一覧, 検出したページ数) を返す。読み込めなければ (None, None)"""
+    url = build_list_url(series_id, i)
+    print(f"[page {i}] fetching… {url}")
+    async with pool.page() as page:
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=TIMEOUT_S * 1000)
+            # 左カラムのリンクが現れるまで待つ（無ければ通常リンク）
             try:
-                page.goto(url, wait_until="domcontentloaded", timeout=60000)
-                # 左カラムのリンクが現れるまで待つ（無ければ通常リンク）
-                try:
-                    page.wait_for_selector(".con-left a[href*='/detail/view_']", timeout=20000)
-                except Exception:
-                    page.wait_for_selector("a[href*='/detail/view_']", timeout=20000)
-            except Exception as e:
-                print(f"  !! timeout or load error on page {i}: {e}")
-                continue
-
-            html = page.content()
-            ids = extract_review_ids_from_list(html)
-            print(f"[page {i}] found {len(ids)} reviews")
+                await page.wait_for_selector(".con-left a[href*='/detail/view_']", timeout=20000)
+            except Exception:
+                await page.wait_for_selector("a[href*='/detail/view_']", timeout=20000)
+        except Exception as e:
+            print(f"  !! timeout or load error on page {i}: {e}")
+            return None, None
+        html = await page.content()
+    ids = extract_review_ids_from_list(html)
+    print(f"[page {i}] found {len(ids)} reviews")
+    return ids, discover_page_count(html, series_id)
+
+def open_store(series_id: str) -> ReviewStore:
+    """系列のストアを開き、旧形式の JSON（cache/<sid>/, cache/koubei/<sid>/）があれば取り込む"""
+    store = ReviewStore(series_id)
+    for legacy in (Path("cache") / series_id, Path("cache") / "koubei" / series_id):
+        if legacy.is_dir():
+            shard = store.migrate_dir(legacy)
+            if shard:
+                print(f"[store] migrated legacy review JSONs from {legacy} → {shard.name}")
+    # 追記のたびにシャードが増えるので、多くなったら実行前にまとめる（今回の追加分は別シャードのまま zip へ）
+    n = len(store.shards())
+    if n > COMPACT_AT:
+        removed = store.compact()
+        print(f"[store] compacted {n} → {n - removed} shard(s)")
+    return store
+
+async def crawl_list(pool: PagePool, series_id: str, pages: int, known: set[str]) -> set[str]:
+    """一覧の review_id を集める。incremental では既知 ID だけのページ・空ページで打ち切る。
+    full でもページ数を検出できなかったときは空ページで打ち切る（上限まで空ページを読み続けない）"""
+    incremental = LIST_MODE != "full"
+    all_ids: set[str] = set()
+
+    ids, total = await fetch_list_page(pool, series_id, 1)
+    all_ids.update(ids or [])
+    # ページ数: 検出値 → 引数 → 上限（検出できない場合は空ページ/既知ページまで進む）
+    last = total or pages or LIST_MAX_PAGES
+    if pages:
+        last = min(last, pages)
+    print(f"[list] pages: detected={total} cap={pages or '-'} → up to {last} ({LIST_MODE})")
+    if incremental and ids and known and all(r in known for r in ids):
+        print("[list] page 1 has only known reviews; stop")
+        return all_ids
+
+    i = 2
+    while i <= last:
+        window = list(range(i, min(i + LIST_WINDOW, last + 1)))
+        results = await asyncio.gather(*(fetch_list_page(pool, series_id, n) for n in window))
+        for n, (ids, _) in zip(window, results):
+            if ids is None:
+                continue  # 読み込み失敗は打ち切り判定に使わない
             all_ids.update(ids)
-        page.close()
-        browser.close()
+            if not ids and (incremental or not total):
+                print(f"[list] page {n} has no reviews; stop")
+                return all_ids
+            if incremental and all(r in known for r in ids):
+                print(f"[list] page {n} has only known reviews; stop")
+                return all_ids
+        i = window[-1] + 1
+    return all_ids
+
+def parse_mp_context():
+    """解析プロセスの起動方式。スレッド（Playwright・asyncio）を抱えたプロセスを fork しない"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
 
-        print(f"[total] unique reviews: {len(all_ids)}")
-        for rid in sorted(all_ids):
+async def crawl(series_id: str, pages: int, store: ReviewStore) -> int:
+    """一覧 → 未取得分の詳細（取得 → 解析 → ストア）→ 追加件数を返す"""
+    t0 = time.perf_counter()
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True)
+        # UAを固定（ブロック回避のため穏当なデスクトップUA）
+        context = await browser.new_context(user_agent=UA, extra_http_headers={"User-Agent": UA})
+        pool = PagePool(context, POOL_PAGES)
+        try:
+            known = store.ids()
+            all_ids = await crawl_list(pool, series_id, pages, known)
+
+            print(f"[total] unique reviews: {len(all_ids)} (new {len(all_ids - known)}, known {len(known)})")
+            todo = sorted(all_ids - known)
+            print(f"[detail] {len(all_ids) - len(todo)} stored / {len(todo)} to fetch "
+                  f"(mode={DETAIL_MODE}, pages={POOL_PAGES})")
+            http = None
+            session = None
+            http_pool = None
+            if DETAIL_MODE != "browser" and todo:
+                session = make_session(HTTP_CONCURRENCY, build_list_url(series_id, 1))
+                http_pool = ThreadPoolExecutor(HTTP_CONCURRENCY, thread_name_prefix="koubei-http")
+                http = (session, http_pool)
+            stats: dict = {}
+            queue: asyncio.Queue = asyncio.Queue()
+            writer = asyncio.create_task(store_writer(store, queue, FLUSH_EVERY))
             try:
-                fetch_detail_into_cache(pw, rid, cache_dir)
-            except Exception as e:
-                print(f"  !! failed {rid}: {e}")
+                with ProcessPoolExecutor(max_workers=min(PARSE_WORKERS, max(1, len(todo))),
+                                         mp_context=parse_mp_context()) as parsers:
+                    results = await asyncio.gather(
+                        *(fetch_and_parse(pool, rid, http, stats, parsers, queue) for rid in todo),
+                        return_exceptions=True,
+                    )
+            finally:
+                if http_pool is not None:
+                    http_pool.shutdown(wait=True)
+                if session is not None:
+                    session.close()
+                await queue.put(None)
+                written = await writer
+            for rid, r in zip(todo, results):
+                if isinstance(r, Exception):
+                    print(f"  !! failed {rid}: {r}")
+            ok = sum(1 for r in results if r is True)
+            print(f"[detail] fetched {ok}/{len(todo)} in {time.perf_counter() - t0:.1f}s "
+                  f"(http={stats.get('http', 0)} http_error={stats.get('http_error', 0)} "
+                  f"browser_fallback={stats.get('fallback', 0)}, "
+                  f"parse_workers={PARSE_WORKERS}, 1 browser launch)")
+            return written
+        finally:
+            await context.close()
+            await browser.close()
+
+def main(series_id: str, pages: int):
+    store = open_store(series_id)
+    before = {p.name for p in store.shards()}
+
+    written = asyncio.run(crawl(series_id, pages, store))
+    print(f"[store] +{written} reviews (total {len(store)})")
 
-    # zip 化（artifact 用）
-    import shutil
-    zipname = f"autohome_reviews_{series_id}"
-    shutil.make_archive(zipname, "zip", cache_dir)
-    print(f"[done] cached and zipped -> {zipname}.zip")
+    # zip 化（artifact 用）: 今回増えたシャード（旧形式の取り込み分を含む）だけ
+    import zipfile
+    zipname = f"autohome_reviews_{series_id}.zip"
+    new_shards = [p for p in store.shards() if p.name not in before]
+    with zipfile.ZipFile(zipname, "w", compression=zipfile.ZIP_STORED) as zf:
+        for p in new_shards:
+            zf.write(p, p.name)  # 既に gzip なので再圧縮しない
+        zf.writestr("index.tsv", store.index_path.read_text(encoding="utf-8") if store.exists() else "")
+    print(f"[done] stored and zipped -> {zipname} ({len(new_shards)} new shard(s))")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python tools/koubei_summary_playwright.py <series_id> <pages>")
+    if len(sys.argv) < 2:
+        print("Usage: python tools/koubei_summary_playwright.py <series_id> [pages]")
         sys.exit(1)
     series_id = sys.argv[1].strip()
-    pages = int(sys.argv[2])
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].strip() else 0
     main(series_id, pages)
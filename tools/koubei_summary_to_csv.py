@@ -1,11 +1,14 @@
 # tools/koubei_summary_to_csv.py
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, sys, re, json, zipfile
+import os, sys, re, gzip, json, zipfile
+from collections import deque
 import pandas as pd
 from pathlib import Path
 from bs4 import BeautifulSoup
 
+from review_store import ReviewStore
+
 """
 概要:
   autohome_reviews_<series_id>.zip 内の JSON または HTML を解析し、
@@ -13,13 +16,47 @@ from bs4 import BeautifulSoup
 
 変更点（最小限）:
   - JSON中に pros/cons が無い場合、text を pros に流し込む
+  - 系列のレビューストア（cache/koubei/<sid>/store、review_store.py）があればそこからストリーミングで読む
+    （zip は今回追加分のシャードだけなので、ストアがない環境でのみ zip 内の .json / .jsonl.gz を読む）
+  - ストアは実行のたびに増えるので、CSV に出すのは新しい順に KOUBEI_CSV_MAX 件（既定 300、0 で全件）
+    ※ 以前の zip 由来の CSV とは行の順序が違う（新しいレビューが先頭。koubei_storywriter.py は先頭から使う）
 """
 
+CSV_MAX = max(0, int(os.environ.get("KOUBEI_CSV_MAX", "300") or 0))
+
+def row_from_record(data: dict, name: str = "") -> dict:
+    rid = data.get("id") or Path(name).stem
+    title = data.get("title", "")
+    # ✅ pros/cons が無ければ text を pros に使用
+    pros = "、".join(data.get("pros", [])) if "pros" in data else data.get("text", "")
+    cons = "、".join(data.get("cons", [])) if "cons" in data else ""
+    return {
+        "id": rid,
+        "title": title,
+        "pros": pros,
+        "cons": cons
+    }
+
+def parse_store(store: ReviewStore, limit: int = CSV_MAX):
+    """新しい順に最大 limit 件（0 なら全件）。読むのは 1 行ずつで、保持するのは limit 件だけ"""
+    recent = deque(store.iter_records(), maxlen=limit or None)
+    return pd.DataFrame(row_from_record(r) for r in reversed(recent))
+
 def parse_json_from_zip(zip_path: Path):
     """ZIP内の .json ファイルを順に読み込み DataFrame を作成"""
     rows = []
     with zipfile.ZipFile(zip_path, "r") as zf:
         for name in zf.namelist():
+            if name.endswith(".jsonl.gz"):
+                try:
+                    with zf.open(name) as raw, gzip.open(raw, "rt", encoding="utf-8") as f:
+                        for line in f:
+                            data = json.loads(line)
+                            if isinstance(data, dict):
+                                rows.append(row_from_record(data))
+                except Exception as e:
+                    print(f"[warn] {name}: {e}")
+                continue
             if not name.endswith(".json"):
                 continue
             try:
@@ -30,17 +67,7 @@ def parse_json_from_zip(zip_path: Path):
                         data = data[0]
                     if not isinstance(data, dict):
                         continue
-                    rid = data.get("id") or Path(name).stem
-                    title = data.get("title", "")
-                    # ✅ pros/cons が無ければ text を pros に使用
-                    pros = "、".join(data.get("pros", [])) if "pros" in data else data.get("text", "")
-                    cons = "、".join(data.get("cons", [])) if "cons" in data else ""
-                    rows.append({
-                        "id": rid,
-                        "title": title,
-                        "pros": pros,
-                        "cons": cons
-                    })
+                    rows.append(row_from_record(data, name))
             except Exception as e:
                 print(f"[warn] {name}: {e}")
                 continue
@@ -76,11 +103,17 @@ def parse_html_from_zip(zip_path: Path):
 
 def main(zip_file: str):
     zip_path = Path(zip_file)
-    if not zip_path.exists():
-        raise FileNotFoundError(f"ZIP not found: {zip_file}")
+    series_id = zip_path.stem.replace("autohome_reviews_", "")
+    store = ReviewStore(series_id)
 
-    df = parse_json_from_zip(zip_path)
-    if df.empty:
+    if store.exists():
+        df = parse_store(store)
+        print(f"📦 read {len(df)} of {len(store)} reviews from {store.dir} (newest first, max {CSV_MAX or 'all'})")
+    else:
+        if not zip_path.exists():
+            raise FileNotFoundError(f"ZIP not found: {zip_file}")
+        df = parse_json_from_zip(zip_path)
+    if df.empty and zip_path.exists():
         print("⚠️ No valid JSON data found in zip, trying HTML fallback")
         df = parse_html_from_zip(zip_path)
 
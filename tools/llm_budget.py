@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# tools/llm_budget.py
+#
+# LLM 利用の共通アカウンティング（translate_columns.py / stage_translate_maker_to_ja.py /
+# koubei_storywriter.py から利用）
+#   - 呼び出しごとの prompt/completion トークンと概算コストを stage・series 単位で記録
+#   - 実行単位の上限（トークン / USD）を強制し、余裕が少ないときは優先度の低い仕事を次回へ回す
+#   - --plan 用の見積り（Planner）
+#
+# 環境変数:
+#   LLM_BUDGET_TOKENS   実行あたりのトークン上限（未設定なら無制限）
+#   LLM_BUDGET_USD      実行あたりの概算コスト上限（USD）
+#   LLM_LEDGER          記録先 JSONL（同じ LLM_RUN_ID の記録は上限計算に合算）
+#   LLM_RUN_ID          実行 ID（GitHub Actions では run_id を渡す）
+#   LLM_PRICE_IN / LLM_PRICE_OUT   1M トークンあたり USD（モデル表より優先）
+#   SERIES_RANK / LLM_PRIORITY_TOP  ランキング順位が TOP より下の系列は優先度を 1 段下げる
+#
+# 優先度: 0=必須（価格行・セクション/項目名） 1=基本仕様・上位系列 2=その他 3=下位系列のその他
+
+import json, math, os, re, time
+from pathlib import Path
+
+# 1M トークンあたり USD（入力, 出力）
+PRICES = {
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# 優先度ごとに使ってよい上限の割合（低い仕事ほど早く打ち切る）
+PRIORITY_SHARE = {0: 1.0, 1: 0.85, 2: 0.6, 3: 0.4}
+
+def estimate_tokens(text: str) -> int:
+    # CJK は 1 文字 ≒ 1 トークン、それ以外は 4 文字 ≒ 1 トークンの概算
+    text = text or ""
+    cjk = len(re.findall(r"[\u3000-\u9fff\uff00-\uffef]", text))
+    return cjk + max(0, len(text) - cjk) // 4
+
+def _env_float(name: str) -> float | None:
+    v = os.environ.get(name, "").strip()
+    try:
+        return float(v) if v else None
+    except ValueError:
+        return None
+
+def series_priority_offset() -> int:
+    rank = _env_float("SERIES_RANK")
+    top = _env_float("LLM_PRIORITY_TOP") or 30
+    return 1 if rank is not None and rank > top else 0
+
+class Budget:
+    def __init__(self, stage: str, series: str = "", model: str = "",
+                 max_tokens: float | None = None, max_usd: float | None = None,
+                 ledger: Path | None = None, run_id: str = ""):
+        self.stage = stage
+        self.series = series
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_usd = max_usd
+        self.ledger = ledger
+        self.run_id = run_id
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.usd = 0.0
+        self.calls = 0
+        self.deferred = 0
+        # 同じ実行 ID で先に動いた stage の消費を合算
+        self.prior_tokens, self.prior_usd = self._load_prior()
+
+    @classmethod
+    def from_env(cls, stage: str, series: str = "", model: str = "") -> "Budget":
+        ledger = os.environ.get("LLM_LEDGER", "").strip()
+        return cls(
+            stage, series, model,
+            max_tokens=_env_float("LLM_BUDGET_TOKENS"),
+            max_usd=_env_float("LLM_BUDGET_USD"),
+            ledger=Path(ledger) if ledger else None,
+            run_id=os.environ.get("LLM_RUN_ID", "").strip(),
+        )
+
+    def _load_prior(self) -> tuple[int, float]:
+        if not (self.ledger and self.run_id and self.ledger.exists()):
+            return 0, 0.0
+        tok, usd = 0, 0.0
+        with self.ledger.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                if rec.get("run_id") == self.run_id:
+                    tok += int(rec.get("prompt_tokens", 0)) + int(rec.get("completion_tokens", 0))
+                    usd += float(rec.get("usd", 0.0))
+        return tok, usd
+
+    def price(self, model: str = "") -> tuple[float, float]:
+        pin, pout = PRICES.get(model or self.model, PRICES["gpt-4.1-mini"])
+        return (_env_float("LLM_PRICE_IN") or pin, _env_float("LLM_PRICE_OUT") or pout)
+
+    def cost(self, prompt_tokens: int, completion_tokens: int, model: str = "") -> float:
+        pin, pout = self.price(model)
+        return (prompt_tokens * pin + completion_tokens * pout) / 1_000_000
+
+    @property
+    def spent_tokens(self) -> int:
+        return self.prior_tokens + self.prompt_tokens + self.completion_tokens
+
+    @property
+    def spent_usd(self) -> float:
+        return self.prior_usd + self.usd
+
+    def allow(self, est_prompt: int, est_completion: int = 0, priority: int = 0) -> bool:
+        """見積りで上限（優先度に応じた割合）を超えるなら False。"""
+        share = PRIORITY_SHARE.get(min(priority, max(PRIORITY_SHARE)), 1.0)
+        if self.max_tokens is not None:
+            if self.spent_tokens + est_prompt + est_completion > self.max_tokens * share:
+                return False
+        if self.max_usd is not None:
+            if self.spent_usd + self.cost(est_prompt, est_completion) > self.max_usd * share:
+                return False
+        return True
+
+    def defer(self, n: int):
+        self.deferred += n
+
+    def record(self, usage, model: str = ""):
+        """OpenAI の resp.usage（または dict）を記録"""
+        if usage is None:
+            return
+        get = usage.get if isinstance(usage, dict) else (lambda k, d=0: getattr(usage, k, d))
+        pt = int(get("prompt_tokens", 0) or 0)
+        ct = int(get("completion_tokens", 0) or 0)
+        usd = self.cost(pt, ct, model)
+        self.prompt_tokens += pt
+        self.completion_tokens += ct
+        self.usd += usd
+        self.calls += 1
+        if self.ledger:
+            try:
+                self.ledger.parent.mkdir(parents=True, exist_ok=True)
+                with self.ledger.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({
+                        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "run_id": self.run_id,
+                        "stage": self.stage, "series": self.series, "model": model or self.model,
+                        "prompt_tokens": pt, "completion_tokens": ct, "usd": round(usd, 6),
+                    }, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"⚠️ ledger write failed {self.ledger}: {e}")
+
+    def print_summary(self):
+        limit = []
+        if self.max_tokens is not None:
+            limit.append(f"tokens≤{int(self.max_tokens)}")
+        if self.max_usd is not None:
+            limit.append(f"usd≤{self.max_usd}")
+        print(
+            f"💰 llm[{self.stage}{'/' + self.series if self.series else ''}] calls={self.calls} "
+            f"prompt={self.prompt_tokens} completion={self.completion_tokens} usd≈{self.usd:.4f} "
+            f"deferred={self.deferred}" + (f" (run total {self.spent_tokens} tok, {' '.join(limit)})" if limit else "")
+        )
+
+class Planner:
+    """--plan 用: 実際には呼ばず、必要な LLM 呼び出し数とトークンを見積もる"""
+    def __init__(self, stage: str, model: str = ""):
+        self.stage = stage
+        self.model = model
+        self.rows: list[tuple[str, int, int, int]] = []  # (label, terms, calls, est_tokens)
+
+    def add(self, label: str, terms: list[str], batch_size: int, overhead: int = 200, out_ratio: float = 1.5):
+        if not terms:
+            self.rows.append((label, 0, 0, 0))
+            return
+        calls = math.ceil(len(terms) / batch_size)
+        body = sum(estimate_tokens(t) for t in terms)
+        self.rows.append((label, len(terms), calls, int(calls * overhead + body * (1 + out_ratio))))
+
+    def print_report(self):
+        budget = Budget(self.stage, model=self.model)
+        total_calls = sum(r[2] for r in self.rows)
+        total_tok = sum(r[3] for r in self.rows)
+        print(f"🗒️ plan[{self.stage}]")
+        for label, n, calls, tok in self.rows:
+            print(f"  {label:<14} missing={n:<5} calls={calls:<4} ≈{tok} tok")
+        print(f"  total          calls={total_calls} ≈{total_tok} tok ≈${budget.cost(int(total_tok * 0.4), int(total_tok * 0.6)):.4f}")
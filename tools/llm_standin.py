@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# tools/llm_standin.py
+#
+# 目的:
+#   OpenAI 互換（POST /v1/chat/completions）のローカル代替サーバ。
+#   OPENAI_API_KEY なしで translate_columns.py / stage_translate_maker_to_ja.py /
+#   koubei_storywriter.py を動かし、スループットや回帰をオフラインで計測する。
+#
+#   - 応答は録画ファイル（JSONL）を優先し、無ければ入力から決定的に合成
+#   - 遅延・エラー率（429/500）・途中切れ（finish_reason=length）を設定可能
+#   - --record を付けると本物の API へ中継し、応答を録画ファイルへ追記
+#
+# 使い方:
+#   python tools/llm_standin.py --port 8770 --latency 0.3 --error-rate 0.05
+#   OPENAI_BASE_URL=http://127.0.0.1:8770/v1 python tools/translate_columns.py
+#
+#   GET /stats で requests / errors / truncated / replayed / synthesized / tokens を返す
+
+import argparse, hashlib, json, os, random, re, sys, threading, time, urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from llm_budget import estimate_tokens
+
+try:
+    sys.stdout.reconfigure(line_buffering=True)
+except Exception:
+    pass
+
+UPSTREAM = "https://api.openai.com/v1"
+
+def request_key(model: str, messages: list[dict]) -> str:
+    """録画の照合キー（model + messages のハッシュ）"""
+    raw = json.dumps({"model": model, "messages": messages}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# =============================
+# 応答の合成（録画に無い場合）
+# =============================
+def synth_translations(system: str, user: str) -> str | None:
+    # translate_columns.py 形式: user={"terms": [...]}、system に出力 JSON の言語キー
+    try:
+        terms = json.loads(user).get("terms")
+    except Exception:
+        return None
+    if not isinstance(terms, list):
+        return None
+    langs = re.findall(r"'([a-zA-Z\-]{2,5})':'[^']*訳", system) or ["ja"]
+    return json.dumps(
+        {"translations": [{"cn": t, **{l: f"[{l}]{t}" for l in langs}} for t in terms]},
+        ensure_ascii=False,
+    )
+
+def synth_numbered(user: str) -> str | None:
+    # stage_translate_maker_to_ja.py 形式: 「入力:」以下の番号付きリスト
+    if "入力:" not in user:
+        return None
+    block = user.split("入力:", 1)[1].split("出力形式", 1)[0]
+    items = re.findall(r"^\s*(\d+)\.\s*(.+)$", block, re.M)
+    if not items:
+        return None
+    return "\n".join(f"{n}. {t.strip()}（ja）" for n, t in items)
+
+def synth_story(user: str) -> str:
+    # koubei_storywriter.py 形式: 見出しと箇条書きの Markdown
+    pros = re.findall(r"^- (.+)$", user.split("ポジティブ上位:", 1)[-1].split("ネガティブ上位:", 1)[0], re.M)[:4]
+    cons = re.findall(r"^- (.+)$", user.split("ネガティブ上位:", 1)[-1].split("代表コメント", 1)[0], re.M)[:3]
+    lines = ["全体的には肯定的な評価が多い一方で、一部に改善を求める声もあります。", "", "### ポジティブな評価点"]
+    lines += [f"- **項目{i+1}：** {p[:60]}という声があります。" for i, p in enumerate(pros or ["（該当なし）"])]
+    lines += ["", "### ネガティブな評価点"]
+    lines += [f"- **項目{i+1}：** {c[:60]}と指摘されています。" for i, c in enumerate(cons or ["（該当なし）"])]
+    return "\n".join(lines)
+
+def synthesize(messages: list[dict]) -> str:
+    system = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    user = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    return synth_translations(system, user) or synth_numbered(user) or synth_story(user)
+
+# =============================
+# サーバ本体
+# =============================
+class StandIn:
+    def __init__(self, recordings: Path | None = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, truncate_rate: float = 0.0, seed: int | None = None,
+                 record: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.rng = random.Random(seed)
+        self.recordings = recordings
+        self.record = record
+        self.lock = threading.Lock()
+        self.replay: dict[str, str] = {}
+        self.stats = {"requests": 0, "errors": 0, "truncated": 0, "replayed": 0, "synthesized": 0,
+                      "recorded": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        if recordings and recordings.exists():
+            with recordings.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        self.replay[rec["key"]] = rec["content"]
+                    except Exception:
+                        continue
+            print(f"📼 loaded {len(self.replay)} recorded responses from {recordings}")
+
+    def _roll(self, p: float) -> bool:
+        with self.lock:
+            return p > 0 and self.rng.random() < p
+
+    def _forward(self, body: dict) -> str:
+        req = urllib.request.Request(
+            UPSTREAM + "/chat/completions",
+            data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json",
+                     "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY', '')}"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=300) as r:
+            data = json.loads(r.read().decode("utf-8"))
+        return data["choices"][0]["message"]["content"] or ""
+
+    def complete(self, body: dict) -> tuple[int, dict]:
+        model = body.get("model", "standin")
+        messages = body.get("messages") or []
+        with self.lock:
+            self.stats["requests"] += 1
+
+        delay = max(0.0, self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0))
+        if delay:
+            time.sleep(delay)
+
+        if self._roll(self.error_rate):
+            code = 429 if self._roll(0.5) else 500
+            with self.lock:
+                self.stats["errors"] += 1
+            return code, {"error": {"message": "stand-in injected error", "type": "server_error", "code": code}}
+
+        key = request_key(model, messages)
+        content = self.replay.get(key)
+        if content is not None:
+            with self.lock:
+                self.stats["replayed"] += 1
+        elif self.record:
+            try:
+                content = self._forward(body)
+            except Exception as e:
+                # 上流の失敗は記録せず、注入エラーと同じ形でクライアントに返す（クライアント側でリトライ）
+                with self.lock:
+                    self.stats["errors"] += 1
+                return 502, {"error": {"message": f"upstream failed: {e!r}", "type": "server_error", "code": 502}}
+            with self.lock:
+                self.replay[key] = content
+                self.stats["recorded"] += 1
+                with self.recordings.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "model": model, "content": content}, ensure_ascii=False) + "\n")
+        else:
+            content = synthesize(messages)
+            with self.lock:
+                self.stats["synthesized"] += 1
+
+        finish = "stop"
+        if self._roll(self.truncate_rate):
+            content = content[: max(1, len(content) // 2)]
+            finish = "length"
+            with self.lock:
+                self.stats["truncated"] += 1
+
+        pt = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        ct = estimate_tokens(content)
+        with self.lock:
+            self.stats["prompt_tokens"] += pt
+            self.stats["completion_tokens"] += ct
+        return 200, {
+            "id": f"chatcmpl-standin-{key[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish}],
+            "usage": {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": pt + ct},
+        }
+
+def make_handler(standin: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with standin.lock:
+                    self._send(200, dict(standin.stats))
+            else:
+                self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            try:
+                n = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(n).decode("utf-8"))
+            except Exception as e:
+                self._send(400, {"error": {"message": f"bad request: {e}"}})
+                return
+            code, payload = standin.complete(body)
+            self._send(code, payload)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+def serve(standin: StandIn, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """バックグラウンドで起動して server を返す（port=0 で空きポート）"""
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", type=str, default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8770)
+    ap.add_argument("--recordings", type=str, default="", help="録画 JSONL（key/content）")
+    ap.add_argument("--record", action="store_true", help="録画に無い依頼を本物の API へ中継して追記")
+    ap.add_argument("--latency", type=float, default=0.0, help="1 リクエストあたりの遅延（秒）")
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="429/500 を返す割合")
+    ap.add_argument("--truncate-rate", type=float, default=0.0, help="応答を途中で切る割合")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    rec = Path(args.recordings) if args.recordings else None
+    if args.record and not rec:
+        ap.error("--record には --recordings が必要です")
+    standin = StandIn(rec, args.latency, args.jitter, args.error_rate, args.truncate_rate, args.seed, args.record)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(standin))
+    print(f"🚀 LLM stand-in on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
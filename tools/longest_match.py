@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# tools/longest_match.py
+#
+# 辞書キーの最長一致索引（Aho-Corasick）
+#   - longest(text): text に部分文字列として含まれるキーのうち最長のもの
+#       同じ長さなら辞書の登録順が先のもの（sorted(keys, key=len, reverse=True) を先頭から
+#       `k in text` で探すのと同じ結果）
+#   - exact(text):   text 全体がキーと一致する場合だけ
+#   どちらも 1 文字ずつ遷移するだけなので、コストは入力長に比例し辞書の大きさには依存しない
+#
+# 利用: stage_translate_maker_to_ja.py（メーカー・車名）/ translate_columns.py（BRAND_MAP）
+
+from collections import deque
+
+class LongestMatchIndex:
+    def __init__(self, mapping: dict[str, str]):
+        self.mapping = dict(mapping)
+        self.keys = [k for k in self.mapping if k]
+        self.goto: list[dict[str, int]] = [{}]
+        self.term: list[int] = [-1]   # このノードで終わるキーの番号
+        for i, k in enumerate(self.keys):
+            node = 0
+            for ch in k:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.term.append(-1)
+                node = nxt
+            if self.term[node] < 0:
+                self.term[node] = i
+        # fail リンクと「このノードで終わる最長キー」（自身 → なければ fail 先の値）
+        self.fail = [0] * len(self.goto)
+        self.best = list(self.term)
+        q = deque(self.goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if node else 0
+                if self.best[nxt] < 0:
+                    self.best[nxt] = self.best[self.fail[nxt]]
+                q.append(nxt)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def longest(self, text: str) -> str | None:
+        node, found = 0, -1
+        for ch in str(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            b = self.best[node]
+            if b >= 0 and (found < 0 or len(self.keys[b]) > len(self.keys[found])
+                           or (len(self.keys[b]) == len(self.keys[found]) and b < found)):
+                found = b
+        return self.keys[found] if found >= 0 else None
+
+    def get(self, text: str, default=None):
+        """最長一致キーの値"""
+        k = self.longest(text)
+        return self.mapping[k] if k is not None else default
+
+    def exact(self, text: str, default=None):
+        node = 0
+        for ch in str(text):
+            node = self.goto[node].get(ch)
+            if node is None:
+                return default
+        t = self.term[node]
+        return self.mapping[self.keys[t]] if t >= 0 else default
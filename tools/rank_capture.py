@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# tools/rank_capture.py
+#
+# 目的:
+#   Autohome の各ランキング（販売・hezi など）を 1 つのブラウザで並行取得し、
+#   ランキングごとに画像と CSV を出力する共通エンジン。
+#   ランキングの追加は RANKINGS に定義を足すだけ（スクリプトもブラウザも増やさない）。
+#
+# ランキング定義:
+#   key     CLI で指定する名前
+#   url     ランキングページ
+#   prefix  出力名の接頭辞 → public/<prefix>_images/*.png, public/<prefix>_ranking_with_image_urls.csv
+#   fields  CSV の列セット（FIELD_SETS のキー）
+#
+# 使い方:
+#   python tools/rank_capture.py                 # 定義済みの全ランキングを並行取得
+#   python tools/rank_capture.py hezi            # 指定したものだけ
+#   python tools/rank_capture.py --config defs.json   # [{"key","url","prefix","fields"}, ...]
+#
+# 画像:
+#   CAPTURE_MODE=page（既定）  カード画像の矩形を 1 回の evaluate で集め、縦長のスクショ数枚から
+#                              Pillow で切り出す（CPU に余裕があればプロセスプール）
+#   CAPTURE_MODE=element       従来どおりカードごとの要素スクショ
+#   RANK_HISTORY=1（既定）     取得結果を ranking_history の SQLite（model_rankings, source=key）に追記
+#   IMAGE_STORE=1（既定）      画像は public/img_store/ に内容アドレスで保存（WebP + PNG + サムネイル）し、
+#                              image_url / thumb_url はそこを指す。0 なら public/<prefix>_images/*.png
+#
+# 互換:
+#   rank_capture_images_and_csv.py / rank_capture_images_and_csv_hezi.py はこのエンジンのラッパー
+#   （hezi ラッパーは旧版と画像名・image_url・切り出し範囲が異なる。詳細は同ファイル冒頭）
+
+import argparse, asyncio, io, os, re, csv, json, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from playwright.async_api import async_playwright
+
+try:
+    from PIL import Image
+    _PIL_OK = True
+except Exception:
+    _PIL_OK = False
+
+from image_store import ImageStore, enabled as image_store_enabled
+from rank_lazyload import wait_for_cards
+import ranking_history
+from rank_json import RankFeed, use_json
+
+PUBLIC_DIR = Path("public")
+BASE = "https://www.autohome.com.cn"
+PUBLIC_PREFIX = os.environ.get("PUBLIC_PREFIX", "").rstrip("/")
+RANK_LIMIT = 100
+RANK_HISTORY = os.environ.get("RANK_HISTORY", "1").strip() not in ("0", "false", "no", "")
+# page: 全ページを数枚撮って Pillow で切り出す（既定） / element: カードごとに要素スクショ
+CAPTURE_MODE = os.environ.get("CAPTURE_MODE", "page").strip().lower()
+# 1 枚のスクショの最大高さ（Chromium のテクスチャ上限 16384px より十分小さく）
+BAND_MAX_PX = int(os.environ.get("BAND_MAX_PX", "6000"))
+
+RANKINGS = {
+    "sales": {"key": "sales", "url": "https://www.autohome.com.cn/rank/1", "prefix": "autohome", "fields": "sales"},
+    "hezi": {"key": "hezi", "url": "https://www.autohome.com.cn/rank/1-1-0-0_9000-hezi-x-x/", "prefix": "hezi", "fields": "sales"},
+}
+
+FIELD_SETS = {
+    "sales": ["rank","name","units","delta_vs_last_month","link","price","image_url","thumb_url"],
+    "series": ["rank","series_id","name","image_url","series_url","thumb_url"],
+}
+
+STORE_DIR = PUBLIC_DIR / "img_store"
+
+def make_store() -> ImageStore | None:
+    return ImageStore(STORE_DIR, f"{PUBLIC_PREFIX}/{STORE_DIR.name}") if image_store_enabled() else None
+
+def legacy_image(img_dir: Path, fname: str) -> dict:
+    url = f"{PUBLIC_PREFIX}/{img_dir.name}/{fname}" if PUBLIC_PREFIX else f"/{img_dir.name}/{fname}"
+    return {"image_url": url, "thumb_url": ""}
+
+def stored_image(rec: dict) -> dict:
+    return {"image_url": rec["url"], "thumb_url": rec["thumb_url"], "new": rec["new"]}
+
+def img_dir_for(d: dict) -> Path:
+    return PUBLIC_DIR / f"{d['prefix']}_images"
+
+def csv_path_for(d: dict) -> Path:
+    return PUBLIC_DIR / f"{d['prefix']}_ranking_with_image_urls.csv"
+
+def sanitize_filename(s: str) -> str:
+    s = re.sub(r"[^\w\-]+", "_", (s or "car").strip())
+    return s[:80].strip("_") or "car"
+
+async def scroll_and_load(page, target=100):
+    """下までスクロール＋加载更多＋Lazy-load待ち（MutationObserver で完了を検知）"""
+    return await wait_for_cards(page, "div[data-rank-num]", target)
+
+# 全カードの生データを 1 回の evaluate で取得（カードごとの locator 往復をなくす）
+EXTRACT_JS = """
+(cards) => cards.map((card) => {
+  let name = null;
+  const nameEl = card.querySelector(".tw-text-nowrap.tw-text-lg");
+  if (nameEl) {
+    name = nameEl.innerText.trim();
+  } else {
+    for (const tag of ["h1", "h2", "h3", "h4"]) {
+      const t = card.querySelector(tag);
+      if (t) { name = t.innerText.trim(); break; }
+    }
+  }
+  const btn = card.querySelector("button[data-series-id]");
+  const a = card.querySelector("a[href]");
+  const svg = card.querySelector("svg");
+  return {
+    rank: card.getAttribute("data-rank-num"),
+    name: name,
+    text: card.innerText || "",
+    sid: btn ? btn.getAttribute("data-series-id") : null,
+    href: a ? (a.getAttribute("href") || "") : null,
+    svg_parent_text: svg && svg.parentElement ? (svg.parentElement.innerText || "") : null,
+    svg_html: svg ? svg.innerHTML : null,
+  };
+})
+"""
+
+def record_from_raw(raw: dict) -> dict:
+    rank = raw.get("rank")
+    try:
+        rank_num = int(rank) if rank else None
+    except:
+        rank_num = None
+
+    name = raw.get("name")
+
+    # price
+    price = None
+    text = (raw.get("text") or "").replace("\n"," ")
+    m = re.search(r"\d+(?:\.\d+)?-\d+(?:\.\d+)?万", text)
+    if m:
+        price = m.group(0)
+
+    # link
+    link = None
+    sid = raw.get("sid")
+    if sid:
+        link = f"{BASE}/{sid}"
+    if not link and raw.get("href") is not None:
+        href = raw["href"].strip()
+        if re.fullmatch(r"/\d{3,6}/?", href):
+            link = BASE + href
+        elif re.match(r"^https?://www\.autohome\.com\.cn/\d{3,6}/?$", href):
+            link = href
+
+    # units
+    units = None
+    m2 = re.findall(r'(\d{1,3}(?:,\d{3})+|\d{4,6})', text)
+    if m2:
+        try:
+            units = int(m2[-1].replace(",", ""))
+        except:
+            units = None
+
+    # delta（親要素のテキストの数字 + SVG の色で符号）
+    delta = None
+    if raw.get("svg_html") is not None:
+        m3 = re.search(r"\d+", raw.get("svg_parent_text") or "")
+        if m3:
+            num = m3.group(0)
+            colors = set(re.findall(r'fill="(#?[0-9a-fA-F]{3,6})"', raw["svg_html"]))
+            sign = ""
+            if any(c.lower() in {"#f60","#ff6600"} for c in colors):
+                sign = "+"
+            elif any(c.lower() in {"#1ccd99","#00cc99","#1ccd9a"} for c in colors):
+                sign = "-"
+            delta = f"{sign}{num}" if num else None
+
+    m4 = re.search(r"/(\d{3,6})/?$", link or "")
+    series_id = sid or (m4.group(1) if m4 else None)
+
+    return {"rank": rank_num, "name": name, "price": price, "link": link, "units": units,
+            "delta_vs_last_month": delta, "series_id": series_id}
+
+async def extract_all_records(cards, limit: int) -> list[dict]:
+    raws = await cards.evaluate_all(EXTRACT_JS)
+    return [record_from_raw(r) for r in raws[:limit]]
+
+async def records_from_feed(feed, cards, limit: int) -> list[dict] | None:
+    """JSON から取れた行をカード順に並べる（使えないときは None → DOM 抽出）"""
+    await feed.settle()
+    await feed.collect_embedded(cards.page)
+    pairs = (await cards.evaluate_all(
+        """cs => cs.map((c) => {
+             const b = c.querySelector('[data-series-id]');
+             return [parseInt(c.getAttribute('data-rank-num'), 10) || null, b ? b.getAttribute('data-series-id') : null];
+           })"""
+    ))[:limit]
+    ranks = [r for r, _ in pairs]
+    # カードの series_id と一致する JSON だけを使う（食い違えば DOM 抽出）
+    if not feed.verify({r: str(sid) for r, sid in pairs if r is not None and sid}):
+        return None
+    if not use_json(feed, [r for r in ranks if r is not None]):
+        return None
+    recs, dom = [], None
+    for i, r in enumerate(ranks):
+        j = feed.rows.get(r) if r is not None else None
+        if j is None:
+            if dom is None:
+                dom = await extract_all_records(cards, limit)
+            recs.append(dom[i])
+            continue
+        rec = {k: j[k] for k in ("rank", "name", "price", "units", "delta_vs_last_month", "series_id")}
+        rec["link"] = f"{BASE}/{j['series_id']}"
+        recs.append(rec)
+    return recs
+
+# 画像の読み込み完了（complete + decode）を待つ。固定 sleep の代わり
+WAIT_IMG_JS = """
+(img) => new Promise((resolve) => {
+  const done = () => (img.decode ? img.decode().catch(() => {}) : Promise.resolve()).then(() => resolve(true));
+  if (img.complete && img.naturalWidth > 0) { done(); return; }
+  img.addEventListener("load", done, { once: true });
+  img.addEventListener("error", () => resolve(false), { once: true });
+  setTimeout(() => resolve(false), %d);
+})
+"""
+IMG_READY_TIMEOUT_MS = 5000
+SHOT_CONCURRENCY = int(os.environ.get("SHOT_CONCURRENCY", "6"))
+
+async def screenshot_card_image(card, rank, name, img_dir: Path, store: ImageStore | None = None) -> dict:
+    # 画像が含まれる領域を優先
+    img = card.locator("img").first
+    loc = img
+    if not await loc.count():
+        loc = card.locator("div:has(img)").first
+    if not await loc.count():
+        loc = card  # 最悪カード全体
+    # 描画完了を待ってからスクショ
+    if await img.count():
+        try:
+            await img.scroll_into_view_if_needed(timeout=IMG_READY_TIMEOUT_MS)
+            await img.evaluate(WAIT_IMG_JS % IMG_READY_TIMEOUT_MS)
+        except Exception:
+            pass
+    fname = f"{(rank or 0):03d}_{sanitize_filename(name)}.png"
+    if store is not None:
+        return stored_image(store.put(await loc.screenshot(type="png")))
+    path = img_dir / fname
+    await loc.screenshot(path=str(path), type="png")
+    return legacy_image(img_dir, fname)
+
+async def screenshot_all(cards, recs: list[dict], img_dir: Path, store: ImageStore | None = None) -> list[dict | None]:
+    """スクショを上限付きの非同期プールで実行（結果は recs と同じ順）"""
+    sem = asyncio.Semaphore(max(1, SHOT_CONCURRENCY))
+
+    async def one(i: int, rec: dict):
+        if rec["rank"] is None:
+            return None
+        async with sem:
+            return await screenshot_card_image(cards.nth(i), rec["rank"], rec["name"], img_dir, store)
+
+    return await asyncio.gather(*(one(i, r) for i, r in enumerate(recs)))
+
+# カード内の画像（無ければカード全体）のページ座標。要素スクショと同じ対象を選ぶ
+BOXES_JS = """
+(cards) => cards.map((card) => {
+  const el = card.querySelector("img") || card;
+  const r = el.getBoundingClientRect();
+  return { x: r.left + window.scrollX, y: r.top + window.scrollY, w: r.width, h: r.height };
+})
+"""
+
+# position: fixed / sticky の要素（ヘッダー等）が全ページスクショに重ならないよう隠す
+HIDE_FIXED_JS = """
+() => {
+  for (const el of document.querySelectorAll("body *")) {
+    const pos = getComputedStyle(el).position;
+    if (pos === "fixed" || pos === "sticky") el.style.setProperty("visibility", "hidden", "important");
+  }
+}
+"""
+
+def make_bands(boxes: list[tuple[int, dict]], max_px: int) -> list[tuple[int, int, list[tuple[int, dict]]]]:
+    """y 順に並べた矩形を高さ max_px 以内の帯にまとめる → [(top, bottom, [(idx, box), ...])]"""
+    bands = []
+    for idx, b in sorted(boxes, key=lambda t: t[1]["y"]):
+        top, bottom = int(b["y"]), int(b["y"] + b["h"] + 0.999)
+        if bands and bottom - bands[-1][0] <= max_px:
+            t, btm, items = bands[-1]
+            bands[-1] = (t, max(btm, bottom), items + [(idx, b)])
+        else:
+            bands.append((top, bottom, [(idx, b)]))
+    return bands
+
+def crop_band(png: bytes, top: int, scale: float, jobs: list[tuple[str, dict]],
+              store: ImageStore | None = None) -> list[dict | None]:
+    """帯のスクショから各カード画像を切り出して保存（プロセスプールから呼ぶ）"""
+    im = Image.open(io.BytesIO(png))
+    im.load()
+    out = []
+    for path, b in jobs:
+        box = (
+            round(b["x"] * scale), round((b["y"] - top) * scale),
+            round((b["x"] + b["w"]) * scale), round((b["y"] - top + b["h"]) * scale),
+        )
+        if store is not None:
+            out.append(store.put(im.crop(box)))
+        else:
+            im.crop(box).save(path, format="PNG")
+            out.append(None)
+    return out
+
+async def screenshot_all_page(page, cards, recs: list[dict], img_dir: Path,
+                              store: ImageStore | None = None) -> list[dict | None]:
+    """矩形を一括取得 → 帯ごとに 1 枚スクショ → Pillow で切り出し（結果は recs と同じ順）"""
+    boxes = (await cards.evaluate_all(BOXES_JS))[:len(recs)]
+    scale = await page.evaluate("window.devicePixelRatio") or 1
+    await page.evaluate(HIDE_FIXED_JS)
+
+    fnames: list[str | None] = [None] * len(recs)
+    targets = []
+    for i, (rec, b) in enumerate(zip(recs, boxes)):
+        if rec["rank"] is None or b["w"] < 1 or b["h"] < 1:
+            continue
+        fnames[i] = f"{(rec['rank'] or 0):03d}_{sanitize_filename(rec['name'])}.png"
+        targets.append((i, b))
+
+    bands = make_bands(targets, BAND_MAX_PX)
+    width = await page.evaluate("document.documentElement.scrollWidth")
+    shots = []
+    for top, bottom, items in bands:
+        png = await page.screenshot(
+            full_page=True, type="png",
+            clip={"x": 0, "y": top, "width": width, "height": max(1, bottom - top)},
+        )
+        shots.append((png, top, items))
+
+    jobs_of = lambda items: [(str(img_dir / fnames[i]), b) for i, b in items]
+    workers = min(len(shots), max(0, (os.cpu_count() or 1) - 1))
+    if workers >= 2:
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = await asyncio.gather(*(loop.run_in_executor(ex, crop_band, png, top, scale, jobs_of(items), store)
+                                             for png, top, items in shots))
+    else:
+        results = [crop_band(png, top, scale, jobs_of(items), store) for png, top, items in shots]
+    print(f"  📸 {len(targets)} images from {len(shots)} screenshots (workers={max(workers, 1)})")
+
+    images: list[dict | None] = [None] * len(recs)
+    for (_, _, items), res in zip(shots, results):
+        for (i, _), r in zip(items, res):
+            images[i] = stored_image(r) if r is not None else legacy_image(img_dir, fnames[i])
+    return images
+
+async def capture_ranking(ctx, d: dict) -> list[dict]:
+    """1 ランキング = 1 ページ。取得した行を CSV に書いて返す"""
+    img_dir, csv_path = img_dir_for(d), csv_path_for(d)
+    store = make_store()
+    if store is None:
+        img_dir.mkdir(parents=True, exist_ok=True)
+    page = await ctx.new_page()
+    feed = RankFeed(page)
+    tag = f"[{d['key']}]"
+    try:
+        print(f"🌐 {tag} Visiting: {d['url']}")
+        t_nav = time.time()
+        await page.goto(d["url"], wait_until="domcontentloaded", timeout=60000)
+        print(f"🔄 {tag} Scrolling and loading... (goto {time.time() - t_nav:.1f}s)")
+        await scroll_and_load(page, RANK_LIMIT)
+
+        cards = page.locator("div[data-rank-num]")
+        count = await cards.count()
+        print(f"  {tag} loaded cards: {count}")
+        # 先頭100件だけ（多く出ても100位まで）
+        limit = min(RANK_LIMIT, count)
+        t0 = time.time()
+        recs = await records_from_feed(feed, cards, limit) or await extract_all_records(cards, limit)
+        if CAPTURE_MODE == "page" and _PIL_OK:
+            images = await screenshot_all_page(page, cards, recs, img_dir, store)
+        else:
+            if CAPTURE_MODE == "page":
+                print(f"  ⚠️ {tag} Pillow not available → element screenshots")
+            images = await screenshot_all(cards, recs, img_dir, store)
+        rows = []
+        for rec, image in zip(recs, images):
+            if rec["rank"] is None:
+                continue
+            rec.update(image or {"image_url": "", "thumb_url": ""})
+            sid = rec.get("series_id")
+            rec["series_url"] = f"{BASE}/series/{sid}.html" if sid else ""
+            rows.append(rec)
+        print(f"  {tag} extracted + captured {len(rows)} cards in {time.time() - t0:.1f}s")
+    finally:
+        await page.close()
+
+    rows.sort(key=lambda r: (r["rank"] if r["rank"] is not None else 10**9))
+    headers = FIELD_SETS[d.get("fields", "sales")]
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.DictWriter(f, fieldnames=headers)
+        w.writeheader()
+        for r in rows:
+            w.writerow({k: r.get(k) for k in headers})
+    print(f"✅ {tag} CSV: {csv_path}")
+    if RANK_HISTORY:
+        try:
+            conn = ranking_history.connect()
+            n = ranking_history.ingest_ranking_rows(conn, d["key"], ranking_history.default_month(), rows)
+            conn.close()
+            print(f"🗃️ {tag} history: {n} rows → {ranking_history.DB_PATH}")
+        except Exception as e:
+            print(f"⚠️ {tag} history append failed: {e}")
+    if store is not None:
+        n_new = sum(1 for r in rows if r.get("new"))
+        print(f"✅ {tag} Images: {len(rows)} in {STORE_DIR} ({n_new} new, {len(rows) - n_new} unchanged)")
+    else:
+        print(f"✅ {tag} Images: {len(list(img_dir.glob('*.png')))} files under {img_dir}")
+    return rows
+
+async def run(defs: list[dict]):
+    """全ランキングを 1 ブラウザ・ランキングごとに 1 ページで並行取得"""
+    PUBLIC_DIR.mkdir(parents=True, exist_ok=True)
+    prefixes = [d["prefix"] for d in defs]
+    if len(set(prefixes)) != len(prefixes):
+        raise SystemExit(f"❌ duplicate output prefix: {prefixes}")
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        ctx = await browser.new_context()
+        results = await asyncio.gather(*(capture_ranking(ctx, d) for d in defs), return_exceptions=True)
+        await ctx.close()
+        await browser.close()
+    failed = [d["key"] for d, r in zip(defs, results) if isinstance(r, Exception)]
+    for d, r in zip(defs, results):
+        if isinstance(r, Exception):
+            print(f"❌ [{d['key']}] {type(r).__name__}: {r}")
+    if failed:
+        raise SystemExit(1)
+
+def load_defs(keys: list[str], config: str = "") -> list[dict]:
+    table = dict(RANKINGS)
+    if config:
+        for d in json.loads(Path(config).read_text(encoding="utf-8")):
+            d.setdefault("prefix", d["key"])
+            d.setdefault("fields", "sales")
+            table[d["key"]] = d
+    keys = keys or list(table)
+    unknown = [k for k in keys if k not in table]
+    if unknown:
+        raise SystemExit(f"❌ unknown ranking: {unknown} (known: {list(table)})")
+    return [table[k] for k in keys]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("keys", nargs="*", help="取得するランキング（省略時は全部）")
+    ap.add_argument("--config", type=str, default="", help="追加/上書きのランキング定義 JSON")
+    args = ap.parse_args()
+    asyncio.run(run(load_defs(args.keys, args.config)))
+
+if __name__ == "__main__":
+    main()
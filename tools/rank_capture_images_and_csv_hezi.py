@@ -5,103 +5,35 @@
 # 唯一の変更点: URLをheziランキングに差し替え
 #   https://www.autohome.com.cn/rank/1-1-0-0_9000-hezi-x-x/
 #
+# 本体は tools/rank_capture.py（ランキング定義 "hezi" を従来の出力先・列セットで実行する互換ラッパー）
+# CI（autohome_pipeline.yml）はこのラッパーを使わず、python tools/rank_capture.py で
+# 販売・hezi を 1 回で取得し、hezi は public/hezi_* → output/pipeline/hezi/ に出す。
+#
 # 目的:
 #   - Autohome heziランキングをPlaywrightで取得
 #   - 上位（最大100件）を抽出し、画像＋series_idをCSV化
-#   - 既存 autohome_pipeline の出力構造と完全互換
 #
 # 出力:
-#   public/autohome_images/*.png
+#   public/autohome_images/*.png（IMAGE_STORE=0 のとき。既定は public/img_store/）
 #   public/autohome_ranking_with_image_urls.csv
 #
+# 旧版（単体スクリプト）からの変更点（出力は完全互換ではない）:
+#   - 画像ファイル名: "<rank>_<series_id>_<name>.png" → "<rank 3 桁>_<name>.png"
+#   - image_url: PUBLIC_PREFIX 未設定時のローカルパス "public/autohome_images/..." → "/autohome_images/..."
+#     （IMAGE_STORE=1 なら "/img_store/..."）。thumb_url 列が増える
+#   - 切り出し: カード全体の要素スクショ → カード内の画像部分（CAPTURE_MODE=page なら全ページから切り出し）
+#   旧い名前・URL を前提にした利用側はなく、CI の hezi 出力は public/hezi_* に移した
+#
 # 依存:
-#   playwright, pandas, beautifulsoup4, lxml, requests
+#   playwright
 # -----------------------------------------------------------
 
-import asyncio, os, re, csv, time
-from pathlib import Path
-from playwright.async_api import async_playwright
-
-# ★ 唯一の差し替え
-RANK_URLS = ["https://www.autohome.com.cn/rank/1-1-0-0_9000-hezi-x-x/"]
-
-PUBLIC_DIR = Path("public")
-IMG_DIR = PUBLIC_DIR / "autohome_images"
-CSV_PATH = PUBLIC_DIR / "autohome_ranking_with_image_urls.csv"
-BASE = "https://www.autohome.com.cn"
-PUBLIC_PREFIX = os.environ.get("PUBLIC_PREFIX", "").rstrip("/")
+import asyncio
 
-def sanitize_filename(s: str) -> str:
-    s = re.sub(r"[^\w\-]+", "_", (s or "car").strip())
-    return s[:80].strip("_") or "car"
-
-async def scroll_and_load(page, target=100):
-    """ページを下までスクロールし、必要に応じて“加载更多”をクリック"""
-    seen = 0
-    last_update = time.time()
-    for _ in range(60):
-        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        await asyncio.sleep(1.0)
-        count = await page.locator("div[data-rank-num]").count()
-        if count > seen:
-            seen = count
-            last_update = time.time()
-        try:
-            btn = page.locator("text=/加载更多|下一页|更多/").first
-            if await btn.is_visible():
-                await btn.click()
-                await asyncio.sleep(1.5)
-        except Exception:
-            pass
-        if seen >= target:
-            break
-        if time.time() - last_update > 5:
-            break
+from rank_capture import RANKINGS, run
 
 async def main():
-    IMG_DIR.mkdir(parents=True, exist_ok=True)
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page(viewport={"width": 1280, "height": 2000})
-        all_rows = []
-
-        for url in RANK_URLS:
-            await page.goto(url, timeout=60000)
-            await scroll_and_load(page)
-            cards = page.locator("div[data-rank-num]")
-            count = await cards.count()
-            for i in range(count):
-                try:
-                    card = cards.nth(i)
-                    rank = await card.get_attribute("data-rank-num") or str(i + 1)
-                    sid = await card.get_attribute("data-series-id")
-                    if not sid:
-                        html = await card.inner_html()
-                        m = re.search(r"/(\d+)/", html)
-                        sid = m.group(1) if m else None
-                    name = await card.locator("h4,h3,h2,.tw-text-lg,.rank-list-info").nth(0).inner_text(timeout=1000)
-                    name = re.sub(r"\s+", " ", name).strip()
-                    fname = sanitize_filename(f"{rank}_{sid or i}_{name}.png")
-                    fpath = IMG_DIR / fname
-                    await card.screenshot(path=fpath)
-                    rel_url = f"{PUBLIC_PREFIX}/autohome_images/{fname}" if PUBLIC_PREFIX else str(fpath)
-                    all_rows.append({
-                        "rank": rank,
-                        "series_id": sid or "",
-                        "name": name,
-                        "image_url": rel_url,
-                        "series_url": f"{BASE}/series/{sid}.html" if sid else "",
-                    })
-                except Exception as e:
-                    print(f"[warn] card {i}: {e}")
-            await asyncio.sleep(1)
-        await browser.close()
-
-    # CSV出力
-    with open(CSV_PATH, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=["rank", "series_id", "name", "image_url", "series_url"])
-        writer.writeheader()
-        writer.writerows(all_rows)
+    await run([dict(RANKINGS["hezi"], prefix="autohome", fields="series")])
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# tools/rank_json.py
+#
+# ランキングページが読み込む構造化データ（XHR/fetch の JSON・JSONP、埋め込みの __NEXT_DATA__）
+# から rank / series_id / name / price / units / delta を取り出す（rank_capture.py から利用）
+#   - page.on("response") で autohome ドメインの JSON 応答を横取りする（追加リクエストは送らない）
+#   - ランキングの配列とみなすのは、ほぼ全要素が series_id と明示的な順位キーを両方持つ dict の配列だけ
+#     （順位キーのない要素は捨てる。配列の位置を順位の代わりにはしない）
+#   - 候補の配列は応答ごとに別の表として持ち、カードの data-series-id と rank → series_id を突き合わせて
+#     1 件も食い違わない表だけを採用する（verify）。食い違い・照合不能なら DOM 抽出にフォールバック
+#
+# 環境変数:
+#   RANK_SOURCE   auto（既定: JSON が全カードを覆えば JSON、足りなければ DOM）/ json / dom
+
+import asyncio, json, os, re
+
+RANK_SOURCE = os.environ.get("RANK_SOURCE", "auto").strip().lower()
+
+# 正規化に使うキー候補（小文字・_ 無視で比較）
+KEYS = {
+    "series_id": ("seriesid", "sid", "specseriesid"),
+    "rank": ("rank", "ranknum", "rankno", "ranking"),
+    "name": ("seriesname", "name", "title", "carname"),
+    "units": ("salecount", "salescount", "salesnum", "salenum"),
+    # 順位の増減だけ。change / trend のような汎用キーは販売台数の増減のこともあるので使わない
+    "delta": ("rankchange", "changerank", "rankdiff", "rankdelta", "ranktrend"),
+    "price": ("pricerange", "price", "pricestr", "guideprice", "dealerprice"),
+    "min_price": ("minprice", "pricemin", "lowprice"),
+    "max_price": ("maxprice", "pricemax", "highprice"),
+}
+
+# ランキング配列とみなす条件: series_id と順位の両方を持つ要素の割合・最低件数
+REQUIRED_SHARE = 0.9
+MIN_ROWS = 3
+
+JSONP_RE = re.compile(r"^[\w$.]+\s*\(\s*(.*)\s*\)\s*;?\s*$", re.S)
+PRICE_RE = re.compile(r"\d+(?:\.\d+)?-\d+(?:\.\d+)?万")
+
+def _norm(k: str) -> str:
+    return re.sub(r"[_\-\s]", "", str(k)).lower()
+
+def _pick(d: dict, field: str):
+    nd = {_norm(k): v for k, v in d.items()}
+    for k in KEYS[field]:
+        v = nd.get(k)
+        if v not in (None, ""):
+            return v
+    return None
+
+def parse_body(text: str):
+    """JSON / JSONP の本文を Python オブジェクトに（失敗時 None）"""
+    text = (text or "").strip()
+    if not text:
+        return None
+    if text[0] not in "[{":
+        m = JSONP_RE.match(text)
+        if not m:
+            return None
+        text = m.group(1)
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+def _is_rank_item(d: dict) -> bool:
+    return _pick(d, "series_id") is not None and _to_int(_pick(d, "rank")) is not None
+
+def find_rank_lists(obj, out=None) -> list[list[dict]]:
+    """series_id と順位キーを持つ dict が並ぶ配列を再帰的に集める"""
+    if out is None:
+        out = []
+    if isinstance(obj, list):
+        dicts = [x for x in obj if isinstance(x, dict)]
+        if len(dicts) >= MIN_ROWS and sum(1 for x in dicts if _is_rank_item(x)) >= REQUIRED_SHARE * len(dicts):
+            out.append(dicts)
+        for x in obj:
+            find_rank_lists(x, out)
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            find_rank_lists(v, out)
+    return out
+
+def _to_int(v):
+    try:
+        return int(float(str(v).replace(",", "").strip()))
+    except Exception:
+        return None
+
+def _fmt_wan(v) -> str | None:
+    try:
+        x = float(v)
+    except Exception:
+        return None
+    if x > 1000:  # 元 単位なら万に換算
+        x = x / 10000
+    return f"{x:.2f}".rstrip("0").rstrip(".")
+
+def normalize_item(d: dict) -> dict | None:
+    """ランキング 1 行に正規化（series_id か順位が無ければ None）"""
+    sid = _pick(d, "series_id")
+    rank = _to_int(_pick(d, "rank"))
+    if sid is None or rank is None:
+        return None
+    price = None
+    p = _pick(d, "price")
+    if isinstance(p, str) and PRICE_RE.search(p):
+        price = PRICE_RE.search(p).group(0)
+    else:
+        lo, hi = _fmt_wan(_pick(d, "min_price")), _fmt_wan(_pick(d, "max_price"))
+        if lo and hi:
+            price = f"{lo}-{hi}万"
+    delta = None
+    dv = _to_int(_pick(d, "delta"))
+    if dv is not None:
+        delta = f"+{dv}" if dv > 0 else (f"{dv}" if dv < 0 else "0")
+    name = _pick(d, "name")
+    return {
+        "rank": rank,
+        "series_id": str(sid),
+        "name": re.sub(r"\s+", " ", str(name)).strip() if name is not None else None,
+        "price": price,
+        "units": _to_int(_pick(d, "units")),
+        "delta_vs_last_month": delta,
+    }
+
+class RankFeed:
+    """ページの JSON 応答を横取りし、ランキング候補の表（rank → 行）を集める。verify() で 1 つに決める"""
+    def __init__(self, page, url_pattern: str = r"autohome\.com\.cn"):
+        self.url_re = re.compile(url_pattern)
+        self.tables: list[tuple[str, dict[int, dict]]] = []
+        self.rows: dict[int, dict] = {}
+        self.sources: list[str] = []
+        self._pending = set()
+        page.on("response", self._on_response)
+
+    def _on_response(self, resp):
+        try:
+            if resp.request.resource_type not in ("xhr", "fetch", "script"):
+                return
+            if not self.url_re.search(resp.url):
+                return
+            ctype = (resp.headers.get("content-type") or "").lower()
+            if "json" not in ctype and "javascript" not in ctype:
+                return
+        except Exception:
+            return
+        task = asyncio.ensure_future(self._consume(resp))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _consume(self, resp):
+        try:
+            self.add(parse_body(await resp.text()), resp.url)
+        except Exception:
+            pass
+
+    def add(self, obj, source: str):
+        for lst in (find_rank_lists(obj) if obj is not None else []):
+            table: dict[int, dict] = {}
+            for d in lst:
+                rec = normalize_item(d)
+                if rec is not None:
+                    table.setdefault(rec["rank"], rec)
+            if len(table) >= MIN_ROWS:
+                self.tables.append((source, table))
+
+    def verify(self, dom: dict[int, str]) -> bool:
+        """カードの rank → data-series-id と突き合わせ、食い違いのない表で最も多く一致するものを採用"""
+        self.rows, self.sources = {}, []
+        if not dom:
+            if self.tables:
+                print("⚠️ JSON ranking cannot be cross-checked (no data-series-id on cards) → DOM extraction")
+            return False
+        best, best_agree = None, 0
+        for source, table in self.tables:
+            agree = sum(1 for r, sid in dom.items() if r in table and table[r]["series_id"] == sid)
+            disagree = sum(1 for r, sid in dom.items() if r in table and table[r]["series_id"] != sid)
+            if disagree:
+                print(f"⚠️ JSON table from {source} disagrees with cards on {disagree} rank(s); ignored")
+                continue
+            if agree > best_agree:
+                best, best_agree = (source, table), agree
+        if best is None:
+            return False
+        self.rows, self.sources = best[1], [best[0]]
+        return True
+
+    async def collect_embedded(self, page):
+        """SSR で埋め込まれたデータ（__NEXT_DATA__ など）も対象にする"""
+        try:
+            texts = await page.evaluate(
+                """() => Array.from(document.querySelectorAll('script#__NEXT_DATA__, script[type="application/json"]'))
+                       .map((s) => s.textContent || '')"""
+            )
+        except Exception:
+            texts = []
+        for t in texts:
+            self.add(parse_body(t), "embedded")
+
+    async def settle(self):
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def covers(self, ranks: list[int]) -> bool:
+        return bool(ranks) and all(r in self.rows for r in ranks)
+
+def use_json(feed: "RankFeed", ranks: list[int]) -> bool:
+    """RANK_SOURCE に従い JSON を使うか判定（json 指定で不足なら警告して使える分だけ使う）"""
+    if RANK_SOURCE == "dom":
+        return False
+    if feed.covers(ranks):
+        print(f"🧾 ranking data from JSON ({len(feed.rows)} rows, sources={len(feed.sources)})")
+        return True
+    if RANK_SOURCE == "json":
+        missing = [r for r in ranks if r not in feed.rows]
+        print(f"⚠️ JSON missing {len(missing)} ranks; those fall back to DOM")
+        return bool(feed.rows)
+    print(f"ℹ️ JSON covers {sum(1 for r in ranks if r in feed.rows)}/{len(ranks)} cards → DOM extraction")
+    return False
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# tools/rank_lazyload.py
+#
+# ランキングページの Lazy-load 待ち（rank_capture.py から利用）
+#   - ページ内の MutationObserver でカード数と画像の読み込み状況を監視
+#   - target 件のカードが揃い、その画像が decode 済みになった時点で即終了
+#   - 途中で増えなくなった場合（最下部・“加载更多”なし／押しても増えない・一定時間変化なし）も終了
+#     画像が読み込めないまま（壊れた画像など）一定時間変化がない場合も待ち続けない
+#   - “加载更多”は最後のカードより下にある文言一致のボタンだけを、カードが増えるたびに 1 回押す
+#   - どの場合でも deadline で打ち切る。終了時の decode 待ちも LOAD_DECODE_MS で打ち切る
+#   - 各フェーズの所要時間（ms）を返す
+#
+# 環境変数:
+#   LOAD_DEADLINE_S   打ち切りまでの秒数（既定 45）
+#   LOAD_IDLE_MS      変化なしで終了とみなすまでの ms（既定 3000）
+#   LOAD_DECODE_MS    終了時に画像の decode を待つ上限 ms（既定 5000）
+
+import os, time
+
+LOAD_DEADLINE_S = float(os.environ.get("LOAD_DEADLINE_S", "45"))
+LOAD_IDLE_MS = int(os.environ.get("LOAD_IDLE_MS", "3000"))
+LOAD_DECODE_MS = int(os.environ.get("LOAD_DECODE_MS", "5000"))
+
+WAIT_JS = r"""
+({selector, target, deadlineMs, idleMs, decodeMs}) => new Promise((resolve) => {
+  const t0 = performance.now();
+  const phases = {};
+  const now = () => Math.round(performance.now() - t0);
+  let lastChange = performance.now();
+  let lastCount = -1;
+  let lastPending = -1;
+  let clickedAt = -1;
+  let finished = false;
+  let scheduled = false;
+
+  // “加载更多”ボタン: 文言がそれだけの要素で、最後のカードより下にあるもの（ナビの「更多…」リンク等は除外）
+  const MORE_RE = /^(点击)?(加载|查看)更多$/;
+  const moreButton = (all) => {
+    const last = all[all.length - 1];
+    const bottom = last ? last.getBoundingClientRect().bottom : -Infinity;
+    let best = null;
+    let bestTop = Infinity;
+    for (const el of document.querySelectorAll("button, a, [role=button], span, div")) {
+      if (el.offsetParent === null || !MORE_RE.test((el.textContent || "").replace(/\s+/g, ""))) continue;
+      const top = el.getBoundingClientRect().top;
+      if (top >= bottom - 1 && top < bestTop) {
+        best = el;
+        bestTop = top;
+      } else if (best && top === bestTop && best.contains(el)) {
+        // 同じ位置なら内側（子孫）の要素を優先
+        best = el;
+      }
+    }
+    return best;
+  };
+
+  const pendingImages = (cards) => {
+    let pending = 0;
+    for (const card of cards) {
+      for (const img of card.querySelectorAll("img")) {
+        // ネイティブ lazy は eager に切り替えて読み込みを前倒し
+        if (img.loading === "lazy") img.loading = "eager";
+        if (!(img.complete && img.naturalWidth > 0)) pending++;
+      }
+    }
+    return pending;
+  };
+
+  const finish = (reason) => {
+    if (finished) return;
+    finished = true;
+    obs.disconnect();
+    clearInterval(stepper);
+    clearTimeout(killer);
+    document.removeEventListener("load", schedule, true);
+    const cards = Array.from(document.querySelectorAll(selector)).slice(0, target);
+    const imgs = cards.flatMap((c) => Array.from(c.querySelectorAll("img")));
+    // decode() が返らない画像があっても decodeMs で打ち切る（page.evaluate 自体にはタイムアウトがない）
+    Promise.race([
+      Promise.all(imgs.map((i) => (i.decode ? i.decode().catch(() => {}) : null))),
+      new Promise((r) => setTimeout(r, decodeMs)),
+    ]).then(() => {
+      phases.decode_ms = now();
+      window.scrollTo(0, 0);
+      resolve({
+        reason,
+        count: document.querySelectorAll(selector).length,
+        pending: pendingImages(cards),
+        phases,
+      });
+    });
+  };
+
+  const check = () => {
+    scheduled = false;
+    if (finished) return;
+    const all = document.querySelectorAll(selector);
+    const cards = Array.from(all).slice(0, target);
+    const pending = pendingImages(cards);
+    // カード数か未読み込み画像数が変われば「進んでいる」
+    if (all.length !== lastCount || pending !== lastPending) {
+      lastCount = all.length;
+      lastPending = pending;
+      lastChange = performance.now();
+    }
+    if (all.length > 0 && phases.first_card_ms === undefined) phases.first_card_ms = now();
+    const enough = all.length >= target;
+    if (enough && phases.cards_ms === undefined) phases.cards_ms = now();
+    if (enough && pending === 0) {
+      phases.images_ms = now();
+      finish("complete");
+      return;
+    }
+    const idle = performance.now() - lastChange > idleMs;
+    if (enough) {
+      // 壊れた画像などで pending が減らないまま idleMs 経ったら待たない
+      if (idle) {
+        phases.images_ms = now();
+        finish("images_stalled");
+      }
+      return;
+    }
+    const atBottom = window.innerHeight + window.scrollY >= document.body.scrollHeight - 2;
+    if (!atBottom) return;
+    // “加载更多”はカード数が増えるたびに 1 回だけ押す（押しても増えなければ idle で終了）
+    const btn = clickedAt === all.length ? null : moreButton(all);
+    if (btn) {
+      clickedAt = all.length;
+      btn.click();
+      lastChange = performance.now();
+    } else if (idle) {
+      phases.cards_ms = phases.cards_ms ?? now();
+      phases.images_ms = now();
+      finish("exhausted");
+    }
+  };
+
+  const schedule = () => {
+    if (!scheduled) {
+      scheduled = true;
+      setTimeout(check, 50);  // rAF は非アクティブなページで止まるため timer で
+    }
+  };
+
+  // DOM の追加・src 差し替えと画像の load（capture で拾う）を監視
+  const obs = new MutationObserver(schedule);
+  obs.observe(document.body, { childList: true, subtree: true, attributes: true, attributeFilter: ["src", "data-src", "srcset"] });
+  document.addEventListener("load", schedule, true);
+
+  // スクロールは 1 画面ずつ進めて途中の画像も視界に入れる（下端では check が“加载更多”を押す）
+  const stepper = setInterval(() => {
+    window.scrollBy(0, window.innerHeight);
+    schedule();
+  }, 150);
+  const killer = setTimeout(() => finish("deadline"), deadlineMs);
+  schedule();
+})
+"""
+
+async def wait_for_cards(page, selector: str = "div[data-rank-num]", target: int = 100,
+                         deadline_s: float | None = None, idle_ms: int | None = None) -> dict:
+    """カードと画像が揃うまで待ち、{reason, count, pending, phases} を返す"""
+    t0 = time.perf_counter()
+    res = await page.evaluate(WAIT_JS, {
+        "selector": selector,
+        "target": target,
+        "deadlineMs": int((deadline_s or LOAD_DEADLINE_S) * 1000),
+        "idleMs": idle_ms or LOAD_IDLE_MS,
+        "decodeMs": LOAD_DECODE_MS,
+    })
+    res["seconds"] = round(time.perf_counter() - t0, 2)
+    ph = res.get("phases", {})
+    print(
+        f"⏱️ lazy-load {res['reason']}: cards={res['count']} pending_img={res['pending']} "
+        + " ".join(f"{k}={v}" for k, v in ph.items())
+        + f" total={res['seconds']}s"
+    )
+    return res
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# tools/ranking_history.py
+#
+# 月次ランキングの履歴ストア（SQLite）
+#   - maker_rankings : メーカー別（autohome_company_from_html.py の月次 CSV）
+#   - model_rankings : 車系別（rank_capture.py の各ランキング。source = ランキング定義の key）
+#   - manufacturer / series_id / month にインデックス
+#   - 取り込みのたびに前月比（MoM）・前年同月比（YoY）・順位変化・直近 3 か月平均を
+#     maker_trends / model_trends に事前計算しておく（トレンド表示は SELECT 1 回で済む）
+#
+# 使い方:
+#   python tools/ranking_history.py ingest-company output/company/*/autohome_company_ranking_*.csv
+#   python tools/ranking_history.py ingest-ranking public/autohome_ranking_with_image_urls_with_maker.csv --source sales
+#   python tools/ranking_history.py trend --maker 比亚迪
+#   python tools/ranking_history.py trend --series 7806 --source sales
+#   python tools/ranking_history.py movers --month 2025-09 --source sales
+#
+# 環境変数:
+#   RANK_HISTORY_DB   DB のパス（既定 output/history/rankings.sqlite）
+#   RANK_MONTH        ランキング取得時に記録する月 YYYY-MM（既定は先月）
+
+import argparse, csv, os, re, sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+DB_PATH = Path(os.environ.get("RANK_HISTORY_DB", "output/history/rankings.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS maker_rankings (
+    month TEXT NOT NULL,
+    manufacturer TEXT NOT NULL,
+    rank INTEGER,
+    units INTEGER,
+    delta TEXT,
+    PRIMARY KEY (month, manufacturer)
+);
+CREATE INDEX IF NOT EXISTS idx_maker_rankings_manufacturer ON maker_rankings (manufacturer, month);
+
+CREATE TABLE IF NOT EXISTS model_rankings (
+    source TEXT NOT NULL,
+    month TEXT NOT NULL,
+    series_id TEXT NOT NULL,
+    rank INTEGER,
+    name TEXT,
+    manufacturer TEXT,
+    units INTEGER,
+    price TEXT,
+    delta TEXT,
+    PRIMARY KEY (source, month, series_id)
+);
+CREATE INDEX IF NOT EXISTS idx_model_rankings_series ON model_rankings (series_id, source, month);
+CREATE INDEX IF NOT EXISTS idx_model_rankings_manufacturer ON model_rankings (manufacturer, month);
+CREATE INDEX IF NOT EXISTS idx_model_rankings_month ON model_rankings (month, source);
+
+CREATE TABLE IF NOT EXISTS maker_trends (
+    month TEXT NOT NULL,
+    manufacturer TEXT NOT NULL,
+    rank INTEGER,
+    units INTEGER,
+    units_mom INTEGER,
+    units_mom_pct REAL,
+    units_yoy INTEGER,
+    units_yoy_pct REAL,
+    rank_change INTEGER,
+    units_3m_avg REAL,
+    PRIMARY KEY (month, manufacturer)
+);
+CREATE INDEX IF NOT EXISTS idx_maker_trends_manufacturer ON maker_trends (manufacturer, month);
+
+CREATE TABLE IF NOT EXISTS model_trends (
+    source TEXT NOT NULL,
+    month TEXT NOT NULL,
+    series_id TEXT NOT NULL,
+    name TEXT,
+    manufacturer TEXT,
+    rank INTEGER,
+    units INTEGER,
+    units_mom INTEGER,
+    units_mom_pct REAL,
+    units_yoy INTEGER,
+    units_yoy_pct REAL,
+    rank_change INTEGER,
+    units_3m_avg REAL,
+    PRIMARY KEY (source, month, series_id)
+);
+CREATE INDEX IF NOT EXISTS idx_model_trends_series ON model_trends (series_id, source, month);
+CREATE INDEX IF NOT EXISTS idx_model_trends_manufacturer ON model_trends (manufacturer, month);
+CREATE INDEX IF NOT EXISTS idx_model_trends_month ON model_trends (month, source);
+"""
+
+# 前月・前年同月は月の文字列から求める（欠けている月を 1 行前とみなさないように）
+_PREV = "strftime('%Y-%m', date(cur.month || '-01', '-1 month'))"
+_PREV_Y = "strftime('%Y-%m', date(cur.month || '-01', '-12 month'))"
+_AVG3 = ("(SELECT AVG(x.units) FROM {t} x WHERE {k} AND x.month BETWEEN "
+         "strftime('%Y-%m', date(cur.month || '-01', '-2 month')) AND cur.month)")
+_CALC = """
+    cur.units - prev.units,
+    CASE WHEN prev.units > 0 THEN ROUND(100.0 * (cur.units - prev.units) / prev.units, 2) END,
+    cur.units - prevy.units,
+    CASE WHEN prevy.units > 0 THEN ROUND(100.0 * (cur.units - prevy.units) / prevy.units, 2) END,
+    prev.rank - cur.rank
+"""
+
+def default_month() -> str:
+    env = os.environ.get("RANK_MONTH", "").strip()
+    if env:
+        return env
+    first = datetime.utcnow().replace(day=1) - timedelta(days=1)
+    return f"{first.year}-{first.month:02d}"
+
+def connect(path: Path | None = None) -> sqlite3.Connection:
+    path = Path(path or DB_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def _int(v):
+    try:
+        return int(float(str(v).replace(",", "").strip()))
+    except Exception:
+        return None
+
+def _str(v):
+    s = "" if v is None else str(v).strip()
+    return None if s in ("", "nan", "None") else s
+
+def _series_id(row: dict) -> str | None:
+    sid = _str(row.get("series_id"))
+    if sid:
+        return sid.split(".")[0]
+    m = re.search(r"autohome\.com\.cn/(?:series/)?(\d+)", str(row.get("link") or row.get("series_url") or ""))
+    return m.group(1) if m else None
+
+def refresh_maker_trends(conn: sqlite3.Connection, months: list[str]):
+    """指定月と、その前月/前年同月を参照する後続月（+1, +2, +12）の集計を作り直す"""
+    affected = _affected(months)
+    q = ",".join("?" * len(affected))
+    conn.execute(f"DELETE FROM maker_trends WHERE month IN ({q})", affected)
+    conn.execute(f"""
+        INSERT INTO maker_trends
+        SELECT cur.month, cur.manufacturer, cur.rank, cur.units, {_CALC},
+               {_AVG3.format(t="maker_rankings", k="x.manufacturer = cur.manufacturer")}
+        FROM maker_rankings cur
+        LEFT JOIN maker_rankings prev ON prev.manufacturer = cur.manufacturer AND prev.month = {_PREV}
+        LEFT JOIN maker_rankings prevy ON prevy.manufacturer = cur.manufacturer AND prevy.month = {_PREV_Y}
+        WHERE cur.month IN ({q})
+    """, affected)
+
+def refresh_model_trends(conn: sqlite3.Connection, source: str, months: list[str]):
+    affected = _affected(months)
+    q = ",".join("?" * len(affected))
+    conn.execute(f"DELETE FROM model_trends WHERE source = ? AND month IN ({q})", [source, *affected])
+    conn.execute(f"""
+        INSERT INTO model_trends
+        SELECT cur.source, cur.month, cur.series_id, cur.name, cur.manufacturer, cur.rank, cur.units, {_CALC},
+               {_AVG3.format(t="model_rankings", k="x.source = cur.source AND x.series_id = cur.series_id")}
+        FROM model_rankings cur
+        LEFT JOIN model_rankings prev ON prev.source = cur.source AND prev.series_id = cur.series_id AND prev.month = {_PREV}
+        LEFT JOIN model_rankings prevy ON prevy.source = cur.source AND prevy.series_id = cur.series_id AND prevy.month = {_PREV_Y}
+        WHERE cur.source = ? AND cur.month IN ({q})
+    """, [source, *affected])
+
+def _affected(months: list[str]) -> list[str]:
+    out = set()
+    for m in months:
+        y, mm = map(int, m.split("-"))
+        for k in (0, 1, 2, 12):
+            yy, m2 = divmod((y * 12 + mm - 1) + k, 12)
+            out.add(f"{yy}-{m2 + 1:02d}")
+    return sorted(out)
+
+def ingest_company_rows(conn: sqlite3.Connection, month: str, rows: list[dict]) -> int:
+    data = [
+        (month, _str(r.get("manufacturer")), _int(r.get("rank")), _int(r.get("units")), _str(r.get("delta")))
+        for r in rows if _str(r.get("manufacturer"))
+    ]
+    with conn:
+        conn.execute("DELETE FROM maker_rankings WHERE month = ?", (month,))
+        conn.executemany("INSERT OR REPLACE INTO maker_rankings VALUES (?, ?, ?, ?, ?)", data)
+        refresh_maker_trends(conn, [month])
+    return len(data)
+
+def ingest_company_csv(conn: sqlite3.Connection, path: Path, month: str | None = None) -> int:
+    path = Path(path)
+    if month is None:
+        m = re.search(r"(\d{4}-\d{2})", path.name)
+        month = m.group(1) if m else path.parent.name
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return ingest_company_rows(conn, month, list(csv.DictReader(f)))
+
+def ingest_ranking_rows(conn: sqlite3.Connection, source: str, month: str, rows: list[dict]) -> int:
+    """車系ランキングを追記（同じ月・同じ source は置き換え。maker は既存値を残す）"""
+    data = []
+    for r in rows:
+        sid = _series_id(r)
+        if not sid:
+            continue
+        data.append((source, month, sid, _int(r.get("rank")), _str(r.get("name")),
+                     _str(r.get("manufacturer_ja")) or _str(r.get("manufacturer")),
+                     _int(r.get("units")), _str(r.get("price")), _str(r.get("delta_vs_last_month"))))
+    with conn:
+        conn.executemany("""
+            INSERT INTO model_rankings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source, month, series_id) DO UPDATE SET
+                rank = excluded.rank, name = excluded.name,
+                manufacturer = COALESCE(excluded.manufacturer, model_rankings.manufacturer),
+                units = excluded.units, price = excluded.price, delta = excluded.delta
+        """, data)
+        refresh_model_trends(conn, source, [month])
+    return len(data)
+
+def ingest_ranking_csv(conn: sqlite3.Connection, path: Path, source: str, month: str | None = None) -> int:
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return ingest_ranking_rows(conn, source, month or default_month(), list(csv.DictReader(f)))
+
+def print_rows(cur: sqlite3.Cursor):
+    cols = [c[0] for c in cur.description]
+    print("\t".join(cols))
+    for row in cur:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", type=str, default="")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("ingest-company")
+    p.add_argument("csv", nargs="+")
+    p = sub.add_parser("ingest-ranking")
+    p.add_argument("csv")
+    p.add_argument("--source", default="sales")
+    p.add_argument("--month", default="")
+    p = sub.add_parser("trend")
+    p.add_argument("--maker", default="")
+    p.add_argument("--series", default="")
+    p.add_argument("--source", default="sales")
+    p.add_argument("--months", type=int, default=24)
+    p = sub.add_parser("movers")
+    p.add_argument("--month", default="")
+    p.add_argument("--source", default="sales")
+    p.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    conn = connect(Path(args.db) if args.db else None)
+    if args.cmd == "ingest-company":
+        n = sum(ingest_company_csv(conn, Path(c)) for c in sorted(args.csv))
+        print(f"✅ {n} maker rows from {len(args.csv)} file(s) → {DB_PATH if not args.db else args.db}")
+    elif args.cmd == "ingest-ranking":
+        n = ingest_ranking_csv(conn, Path(args.csv), args.source, args.month or None)
+        print(f"✅ {n} model rows ({args.source}, {args.month or default_month()})")
+    elif args.cmd == "trend":
+        if args.series:
+            cur = conn.execute(
+                "SELECT * FROM model_trends WHERE series_id = ? AND source = ? ORDER BY month DESC LIMIT ?",
+                (args.series, args.source, args.months))
+        elif args.maker:
+            cur = conn.execute(
+                "SELECT * FROM maker_trends WHERE manufacturer = ? ORDER BY month DESC LIMIT ?",
+                (args.maker, args.months))
+        else:
+            ap.error("trend には --maker か --series が必要です")
+        print_rows(cur)
+    elif args.cmd == "movers":
+        month = args.month or default_month()
+        cur = conn.execute("""
+            SELECT month, series_id, name, manufacturer, rank, rank_change, units, units_mom_pct
+            FROM model_trends WHERE month = ? AND source = ? AND rank_change IS NOT NULL
+            ORDER BY ABS(rank_change) DESC LIMIT ?
+        """, (month, args.source, args.top))
+        print_rows(cur)
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# tools/review_store.py
+#
+# 口コミレビューの保存先（koubei_summary_playwright.py / koubei_summary_to_csv.py / koubei_review_diff.py から利用）
+#   - 系列ごとに cache/koubei/<sid>/store/ へ gzip 圧縮の JSONL シャードを追記していく
+#       shard_00001.jsonl.gz, shard_00002.jsonl.gz, ...（1 回の追記 = 新しいシャード 1 つ。既存シャードを書き換えるのは compact() だけ）
+#       index.tsv: "review_id<TAB>shard" の追記専用索引（ID の有無はここだけで判定できる）
+#   - append() は索引にない ID だけを書く。シャードは tmp → replace、索引への追記はロック下で 1 回の write
+#   - iter_records() は 1 行ずつ読むストリーミング。索引と食い違う行（書きかけ・重複）は読み飛ばす
+#   - 旧形式（1 レビュー 1 JSON ファイル）は migrate_dir() で 1 シャードに取り込める
+#   - compact() は小さいシャードを連続する範囲ごとに REVIEW_SHARD_TARGET_MB 程度へまとめる
+#       まとめた先は範囲の先頭のシャード名（並び順＝追記順は変わらない）。書き換え順は
+#       先頭シャード → 索引 → 残りの削除。どこで止まっても索引に合う行だけが読まれる
+#     クローラ（koubei_summary_playwright.py）はシャードが REVIEW_COMPACT_AT 個を超えたら実行前に呼ぶ
+#
+# 使い方:
+#   python tools/review_store.py ids <series_id> [--out FILE]     # 保存済み ID 一覧
+#   python tools/review_store.py migrate <series_id> <dir>        # 旧 JSON 群を取り込む
+#   python tools/review_store.py compact <series_id>              # 小さいシャードをまとめる
+#
+# 環境変数:
+#   REVIEW_STORE_ROOT       ストアの親ディレクトリ（既定 cache/koubei）
+#   REVIEW_SHARD_TARGET_MB  compact 後のシャードの目安サイズ（既定 4）
+#   REVIEW_COMPACT_AT       クローラが自動で compact するシャード数（既定 16）
+
+import argparse, gzip, json, os, re, sys
+from pathlib import Path
+
+try:
+    import fcntl
+    _FCNTL_OK = True
+except Exception:
+    _FCNTL_OK = False
+
+STORE_ROOT = Path(os.environ.get("REVIEW_STORE_ROOT", "cache/koubei"))
+SHARD_RE = re.compile(r"shard_(\d+)\.jsonl\.gz$")
+SHARD_TARGET_BYTES = int(float(os.environ.get("REVIEW_SHARD_TARGET_MB", "4")) * 1024 * 1024)
+COMPACT_AT = max(2, int(os.environ.get("REVIEW_COMPACT_AT", "16")))
+
+class _FileLock:
+    def __init__(self, path: Path):
+        self.path = path
+        self.fh = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fh = open(self.path, "a")
+        if _FCNTL_OK:
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if _FCNTL_OK:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+        self.fh.close()
+
+class ReviewStore:
+    def __init__(self, series_id: str, root: Path | None = None):
+        self.series_id = str(series_id)
+        self.dir = Path(root or STORE_ROOT) / self.series_id / "store"
+        self.index_path = self.dir / "index.tsv"
+        self._index: dict[str, str] | None = None
+
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    def _read_index(self) -> dict[str, str]:
+        index: dict[str, str] = {}
+        try:
+            f = open(self.index_path, encoding="utf-8")
+        except FileNotFoundError:
+            return index
+        with f:
+            for line in f:
+                rid, _, shard = line.rstrip("\n").partition("\t")
+                if rid and shard:
+                    index.setdefault(rid, shard)  # 先に書かれたものが正
+        return index
+
+    @property
+    def index(self) -> dict[str, str]:
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def ids(self) -> set[str]:
+        return set(self.index)
+
+    def __contains__(self, rid: str) -> bool:
+        return rid in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def shards(self) -> list[Path]:
+        return sorted(self.dir.glob("shard_*.jsonl.gz"))
+
+    def append(self, records: list[dict]) -> Path | None:
+        """索引にない ID のレコードだけを新しいシャードに書く → シャードのパス（新規なしなら None）"""
+        with _FileLock(self.dir / ".lock"):
+            index = self._read_index()
+            fresh, seen = [], set()
+            for r in records:
+                rid = str(r.get("id") or "")
+                if rid and rid not in index and rid not in seen:
+                    seen.add(rid)
+                    fresh.append(r)
+            if not fresh:
+                self._index = index
+                return None
+            nums = [int(m.group(1)) for p in self.shards() if (m := SHARD_RE.search(p.name))]
+            shard = self.dir / f"shard_{(max(nums) + 1 if nums else 1):05d}.jsonl.gz"
+            self._write_shard(shard, fresh)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{r['id']}\t{shard.name}\n" for r in fresh))
+                f.flush()
+                os.fsync(f.fileno())
+            for r in fresh:
+                index[str(r["id"])] = shard.name
+            self._index = index
+        return shard
+
+    def _write_shard(self, shard: Path, records) -> None:
+        tmp = shard.with_name(shard.name + f".{os.getpid()}.tmp")
+        # mtime=0 で同じ内容なら同じバイト列（無駄な差分を出さない）
+        with open(tmp, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+            for r in records:
+                gz.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
+        os.replace(tmp, shard)
+
+    def compact(self, target_bytes: int = SHARD_TARGET_BYTES) -> int:
+        """連続する小さいシャードを target_bytes 程度ずつ先頭のシャード名へまとめる → 減ったシャード数"""
+        with _FileLock(self.dir / ".lock"):
+            self._index = self._read_index()
+            groups, cur, size = [], [], 0
+            for p in self.shards():
+                n = p.stat().st_size
+                if cur and size + n > target_bytes:
+                    groups.append(cur)
+                    cur, size = [], 0
+                cur.append(p)
+                size += n
+            if cur:
+                groups.append(cur)
+            groups = [g for g in groups if len(g) > 1]
+            if not groups:
+                return 0
+            moved: dict[str, str] = {}
+            for g in groups:
+                self._write_shard(g[0], list(self.iter_records(g)))
+                for p in g[1:]:
+                    moved[p.name] = g[0].name
+            tmp = self.index_path.with_name(self.index_path.name + f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("".join(f"{rid}\t{moved.get(shard, shard)}\n" for rid, shard in self._index.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.index_path)
+            for g in groups:
+                for p in g[1:]:
+                    p.unlink()
+            self._index = {rid: moved.get(shard, shard) for rid, shard in self._index.items()}
+        return len(moved)
+
+    def iter_records(self, shards: list[Path] | None = None):
+        """シャードを順に 1 行ずつ読む（索引に載っている行だけ）"""
+        index = self.index
+        for shard in shards if shards is not None else self.shards():
+            with gzip.open(shard, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                    except Exception:
+                        continue
+                    if index.get(str(r.get("id"))) == shard.name:
+                        yield r
+
+    def migrate_dir(self, src: Path) -> Path | None:
+        """旧形式（<rid>.json が並ぶディレクトリ）のレビューを取り込む。レビュー以外の JSON は無視"""
+        records = []
+        for p in sorted(Path(src).glob("*.json")):
+            if p.stem in self.index:
+                continue
+            try:
+                d = json.loads(p.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            if isinstance(d, dict) and "/detail/view_" in str(d.get("url", "")):
+                d.setdefault("id", p.stem)
+                records.append(d)
+        return self.append(records)
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("ids")
+    a.add_argument("series_id")
+    a.add_argument("--out", default="")
+    m = sub.add_parser("migrate")
+    m.add_argument("series_id")
+    m.add_argument("src")
+    c = sub.add_parser("compact")
+    c.add_argument("series_id")
+    args = ap.parse_args()
+
+    store = ReviewStore(args.series_id)
+    if args.cmd == "ids":
+        text = "".join(f"{rid}\n" for rid in sorted(store.ids()))
+        if args.out:
+            Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+            Path(args.out).write_text(text, encoding="utf-8")
+            print(f"✅ {len(store)} ids → {args.out}")
+        else:
+            sys.stdout.write(text)
+    elif args.cmd == "migrate":
+        shard = store.migrate_dir(Path(args.src))
+        print(f"✅ migrated → {shard}" if shard else "ℹ️ nothing to migrate")
+    elif args.cmd == "compact":
+        n_before = len(store.shards())
+        removed = store.compact()
+        print(f"✅ compacted {n_before} → {n_before - removed} shard(s)" if removed else "ℹ️ nothing to compact")
+
+if __name__ == "__main__":
+    main()
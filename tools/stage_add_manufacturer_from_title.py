@@ -1,8 +1,33 @@
 # -*- coding: utf-8 -*-
-import re, asyncio, html, requests, sys
+#
+# ランキング CSV の link（車系ページ）の <title> からメーカー名を取り出して manufacturer 列を追加する。
+#
+# manufacturer はタイトル由来のブランド名（例: 丰田）。タイトル由来キャッシュ → タイトル取得（HTTP → ブラウザ）の順
+#
+# 取得済みの諸元 CSV（output/autohome/<sid>/config_<sid>.csv）の 基本参数/厂商 行は manufacturer_oem 列に別に出す
+#   - 厂商 は製造会社・合弁会社（例: 广汽丰田）で、ブランド名とは別物なので manufacturer の代わりには使わない
+#   - series_id → 厂商 の索引を cache/config_maker_index.json に持ち、サイズ＋内容ハッシュが変わった CSV だけ読み直す
+#     （mtime はチェックアウトのたびに変わるので使わない）
+#
+# 車系→メーカーの対応はほぼ変わらないので cache/series_maker.json に永続キャッシュする
+#   { series_id: {"maker", "title", "fetched_at", "ok"} }
+#   - 成功は MAKER_CACHE_TTL_DAYS（既定 90 日）、失敗（メーカー取れず）は MAKER_NEG_TTL_DAYS（既定 3 日）有効
+#   - 新しい／期限切れの車系だけ取得し、全部キャッシュで足りればブラウザも起動しない
+#   - MAKER_CACHE_REFRESH=1 でキャッシュを無視して全件取り直す
+#
+# 取得は HTTP 優先: 接続プール付きセッションで全リンクを並行取得（TITLE_HTTP_CONCURRENCY、既定 16）し、
+# タイトル／メーカーが取れなかったものだけ少数のブラウザページ（TITLE_BROWSER_PAGES、既定 3）で取り直す
+#   - HTTP はストリームで読み、</title> が来た時点で打ち切って接続を閉じる（先頭数 KB だけ）
+#   - デコードは koubei_summary_playwright.decode_html と同じ charset 判定
+#   - ブラウザではメインのドキュメント以外（画像・CSS・JS・XHR 等）を route で abort
+import os, re, csv, json, time, asyncio, html, hashlib, requests, sys
+from collections import Counter
 import pandas as pd
 from pathlib import Path
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+from requests.adapters import HTTPAdapter
+
+from koubei_summary_playwright import decode_html
 
 UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
       "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36")
@@ -12,6 +37,98 @@ HDRS = {
     "Referer": "https://www.autohome.com.cn/",
 }
 
+CACHE_PATH = Path(os.environ.get("MAKER_CACHE_PATH", "cache/series_maker.json"))
+TTL_DAYS = float(os.environ.get("MAKER_CACHE_TTL_DAYS", "90"))
+NEG_TTL_DAYS = float(os.environ.get("MAKER_NEG_TTL_DAYS", "3"))
+REFRESH = os.environ.get("MAKER_CACHE_REFRESH", "").strip() in ("1", "true", "yes")
+HTTP_CONCURRENCY = int(os.environ.get("TITLE_HTTP_CONCURRENCY", "16"))
+BROWSER_PAGES = int(os.environ.get("TITLE_BROWSER_PAGES", "3"))
+TITLE_MAX_BYTES = 256 * 1024   # </title> が見つからないときの読み取り上限
+TITLE_END_RE = re.compile(rb"</title\s*>", re.I)
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title", re.I | re.S)
+FETCH_STATS = {"http": 0, "bytes": 0, "seconds": 0.0}
+
+CONFIG_ROOT = Path(os.environ.get("CONFIG_ROOT", "output/autohome"))
+CONFIG_INDEX_PATH = Path(os.environ.get("CONFIG_MAKER_INDEX", "cache/config_maker_index.json"))
+
+def maker_from_config_csv(path: Path):
+    """諸元 CSV の 基本参数/厂商 行（最頻値）を返す。行が見つかった時点で読むのをやめる"""
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rd = csv.reader(f)
+            header = next(rd, None)
+            if not header or "項目" not in header:
+                return None
+            ci = header.index("項目")
+            for row in rd:
+                if len(row) > ci and row[ci].strip() == "厂商":
+                    vals = [v.strip() for v in row[ci + 1:] if v.strip() and v.strip() != "-"]
+                    return Counter(vals).most_common(1)[0][0] if vals else None
+    except Exception:
+        return None
+    return None
+
+def load_config_index() -> dict:
+    """series_id → {maker, size, sha1, path}。サイズか内容ハッシュが変わった CSV だけ読み直して保存"""
+    try:
+        index = json.loads(CONFIG_INDEX_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        index = {}
+    changed = False
+    seen = set()
+    for p in CONFIG_ROOT.glob("*/config_*.csv"):
+        m = re.fullmatch(r"config_(\d+)", p.stem)
+        if not m or m.group(1) != p.parent.name:
+            continue  # 翻訳済み（.ja / _ja）などは対象外
+        sid = m.group(1)
+        seen.add(sid)
+        size = p.stat().st_size
+        ent = index.get(sid)
+        if ent and ent.get("size") == size and ent.get("path") == p.as_posix():
+            digest = hashlib.sha1(p.read_bytes()).hexdigest()
+            if ent.get("sha1") == digest:
+                continue
+        else:
+            digest = hashlib.sha1(p.read_bytes()).hexdigest()
+        index[sid] = {"maker": maker_from_config_csv(p), "size": size, "sha1": digest, "path": p.as_posix()}
+        changed = True
+    for sid in list(index):
+        if sid not in seen:
+            del index[sid]
+            changed = True
+    if changed:
+        CONFIG_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CONFIG_INDEX_PATH.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(index, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+        tmp.replace(CONFIG_INDEX_PATH)
+    return index
+
+def series_id_from_link(url: str):
+    m = re.search(r"autohome\.com\.cn/(?:series/)?(\d+)", str(url or ""))
+    return m.group(1) if m else None
+
+def load_cache() -> dict:
+    try:
+        return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def save_cache(cache: dict):
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_PATH.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(cache, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(CACHE_PATH)
+
+def cache_fresh(ent: dict, now: float) -> bool:
+    if not ent or REFRESH:
+        return False
+    try:
+        age = now - time.mktime(time.strptime(ent["fetched_at"], "%Y-%m-%dT%H:%M:%S"))
+    except Exception:
+        return False
+    ttl = TTL_DAYS if ent.get("ok") else NEG_TTL_DAYS
+    return age < ttl * 86400
+
 def extract_maker_from_title(title: str):
     if not title: return None
     for pat in [
@@ -41,34 +158,125 @@ async def fetch_title_playwright(page, url):
             continue
     return None
 
-def fetch_title_requests(url):
+def make_session(pool: int) -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=1)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update(HDRS)
+    return s
+
+def fetch_title_requests(url, session=None):
+    """本文を先頭からストリームで読み、</title> を見た時点で接続を閉じる"""
+    t0 = time.time()
+    buf = b""
     try:
-        r = requests.get(url, headers=HDRS, timeout=30)
-        r.raise_for_status()
-        m = re.search(r"<title[^>]*>(.*?)</title>", r.text, re.I | re.S)
+        with (session or requests).get(url, headers=HDRS, timeout=30, stream=True) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size=4096):
+                buf += chunk
+                end = TITLE_END_RE.search(buf)
+                if end:
+                    buf = buf[:end.end()]   # 途中で切れた多バイト文字を decode に渡さない
+                    break
+                if len(buf) >= TITLE_MAX_BYTES:
+                    break
+        m = TITLE_RE.search(decode_html(buf))
         if not m: return None
         return html.unescape(m.group(1)).strip()
     except Exception:
         return None
+    finally:
+        FETCH_STATS["http"] += 1
+        FETCH_STATS["bytes"] += len(buf)
+        FETCH_STATS["seconds"] += time.time() - t0
+
+async def resolve_titles(urls: list[str]) -> dict:
+    """HTTP で並行取得 → メーカーが取れなかった URL だけブラウザのページプールで取り直す"""
+    titles = {}
+    session = make_session(HTTP_CONCURRENCY)
+    sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+
+    async def http_one(url):
+        async with sem:
+            titles[url] = await asyncio.to_thread(fetch_title_requests, url, session)
+
+    t0 = time.time()
+    await asyncio.gather(*(http_one(u) for u in urls))
+    session.close()
+    misses = [u for u in urls if not extract_maker_from_title(titles.get(u))]
+    n = max(1, FETCH_STATS["http"])
+    print(f"🌐 http: {len(urls) - len(misses)}/{len(urls)} resolved in {time.time() - t0:.1f}s "
+          f"(avg {FETCH_STATS['bytes'] / n / 1024:.1f} KB, {FETCH_STATS['seconds'] / n:.2f}s per title)")
+
+    if misses:
+        t0 = time.time()
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            ctx = await browser.new_context(user_agent=UA, locale="zh-CN")
+            # タイトルだけ欲しいのでメインのドキュメント以外は読み込まない
+            await ctx.route("**/*", lambda route: route.continue_() if route.request.resource_type == "document" else route.abort())
+            queue: asyncio.Queue = asyncio.Queue()
+            for u in misses:
+                queue.put_nowait(u)
+
+            async def worker():
+                page = await ctx.new_page()
+                while True:
+                    try:
+                        url = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    title = await fetch_title_playwright(page, url)
+                    if title:
+                        titles[url] = title
+                await page.close()
+
+            await asyncio.gather(*(worker() for _ in range(max(1, min(BROWSER_PAGES, len(misses))))))
+            await ctx.close(); await browser.close()
+        print(f"🧭 browser: {sum(1 for u in misses if extract_maker_from_title(titles.get(u)))}/{len(misses)} resolved in {time.time() - t0:.1f}s")
+    return titles
 
 async def main():
     infile = Path(sys.argv[1])
     df = pd.read_csv(infile, encoding="utf-8-sig")
     df["manufacturer"] = None
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context(user_agent=UA, locale="zh-CN")
-        page = await ctx.new_page()
-        for i, url in enumerate(df["link"].dropna().unique(), 1):
-            print(f"[{i}/{len(df)}] visiting {url}")
-            title = await fetch_title_playwright(page, url)
-            if not title:
-                title = fetch_title_requests(url)
+    cache = load_cache()
+    now = time.time()
+
+    config_index = load_config_index()
+
+    links = list(df["link"].dropna().unique())
+    makers = {}
+    oems = {}
+    todo = []
+    for url in links:
+        sid = series_id_from_link(url)
+        cfg = config_index.get(sid) if sid else None
+        if cfg and cfg.get("maker"):
+            oems[url] = cfg["maker"]
+        ent = cache.get(sid) if sid else None
+        if sid and cache_fresh(ent, now):
+            makers[url] = ent.get("maker")
+        else:
+            todo.append((sid, url))
+    print(f"🗂️ maker: title cache {len(links) - len(todo)} / {len(todo)} to fetch ({CACHE_PATH}); "
+          f"oem from config {len(oems)} ({CONFIG_ROOT})")
+
+    if todo:
+        titles = await resolve_titles([url for _, url in todo])
+        for i, (sid, url) in enumerate(todo, 1):
+            title = titles.get(url)
             maker = extract_maker_from_title(title)
-            print(f" → title: {title or '(none)'}")
-            print(f" → extracted manufacturer: {maker or '-'}")
-            df.loc[df["link"] == url, "manufacturer"] = maker
-        await ctx.close(); await browser.close()
+            print(f"[{i}/{len(todo)}] {url} → {maker or '-'}  ({title or 'no title'})")
+            makers[url] = maker
+            if sid:
+                cache[sid] = {"maker": maker, "title": title, "ok": bool(maker),
+                              "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        save_cache(cache)
+
+    df["manufacturer"] = df["link"].map(makers)
+    df["manufacturer_oem"] = df["link"].map(oems)
     out = infile.with_name(infile.stem + "_with_maker.csv")
     df.to_csv(out, index=False, encoding="utf-8-sig")
     print(f"\n✅ Done. Saved → {out}")
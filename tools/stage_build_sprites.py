@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# tools/stage_build_sprites.py
+#
+# ランキング取得後のステージ: カード画像をスプライトシート数枚にまとめる
+#   - 入力 CSV の image_url（public/ 配下のローカルファイル）を順位順に棚詰め
+#   - public/<prefix>_sprites/sprite_<n>_<hash>.webp と manifest.json（rank / series_id → 座標）を出力
+#   - CSV に sprite_url, sprite_x, sprite_y, sprite_w, sprite_h 列を追記（上書き保存）
+#   → ダッシュボードは 100 枚の個別画像ではなく数枚のシートで上位 100 を描画できる
+#
+# 使い方:
+#   python tools/stage_build_sprites.py public/autohome_ranking_with_image_urls.csv
+#   python tools/stage_build_sprites.py <csv> --sheet-width 2048 --sheet-height 4096 --format png
+
+import argparse, hashlib, io, json, os, re
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+
+PUBLIC_DIR = Path("public")
+PUBLIC_PREFIX = os.environ.get("PUBLIC_PREFIX", "").rstrip("/")
+SPRITE_COLS = ["sprite_url", "sprite_x", "sprite_y", "sprite_w", "sprite_h"]
+
+def local_path(image_url: str) -> Path | None:
+    """image_url → public/ 配下のファイル"""
+    u = str(image_url or "").strip()
+    if not u or u == "nan":
+        return None
+    if PUBLIC_PREFIX and u.startswith(PUBLIC_PREFIX):
+        u = u[len(PUBLIC_PREFIX):]
+    p = PUBLIC_DIR / u.lstrip("/")
+    return p if p.is_file() else None
+
+def series_id_of(row) -> str:
+    sid = str(row.get("series_id") or "").strip()
+    if sid and sid != "nan":
+        return sid.split(".")[0]
+    m = re.search(r"autohome\.com\.cn/(\d+)", str(row.get("link") or ""))
+    return m.group(1) if m else ""
+
+def shelf_pack(sizes: list[tuple[int, int]], sheet_w: int, sheet_h: int, pad: int = 2):
+    """入力順のまま棚詰め → [(sheet, x, y)]（1 枚がシートより大きい場合もそのシートに単独で置く）"""
+    out = []
+    sheet, x, y, row_h = 0, 0, 0, 0
+    for w, h in sizes:
+        if x and x + w > sheet_w:
+            x, y, row_h = 0, y + row_h + pad, 0
+        if y and y + h > sheet_h:
+            sheet, x, y, row_h = sheet + 1, 0, 0, 0
+        out.append((sheet, x, y))
+        x += w + pad
+        row_h = max(row_h, h)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("csv", type=str)
+    ap.add_argument("--sheet-width", type=int, default=2048)
+    ap.add_argument("--sheet-height", type=int, default=4096)
+    ap.add_argument("--format", choices=["webp", "png"], default="webp")
+    ap.add_argument("--quality", type=int, default=82)
+    args = ap.parse_args()
+
+    infile = Path(args.csv)
+    df = pd.read_csv(infile, encoding="utf-8-sig")
+    if "rank" in df.columns:
+        df = df.sort_values("rank", kind="stable").reset_index(drop=True)
+    prefix = infile.stem.split("_ranking_with_image_urls")[0]
+    out_dir = PUBLIC_DIR / f"{prefix}_sprites"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    items = []  # (row index, image)
+    for i, row in df.iterrows():
+        p = local_path(row.get("image_url"))
+        if p is None:
+            continue
+        im = Image.open(p)
+        im.load()
+        items.append((i, im.convert("RGBA")))
+    if not items:
+        print(f"⚠️ no local images referenced by {infile}; nothing to pack")
+        return
+
+    places = shelf_pack([im.size for _, im in items], args.sheet_width, args.sheet_height)
+    n_sheets = max(s for s, _, _ in places) + 1
+    extents = [[0, 0] for _ in range(n_sheets)]
+    for (_, im), (s, x, y) in zip(items, places):
+        extents[s][0] = max(extents[s][0], x + im.width)
+        extents[s][1] = max(extents[s][1], y + im.height)
+
+    sheets = []
+    for s in range(n_sheets):
+        canvas = Image.new("RGBA", tuple(extents[s]), (0, 0, 0, 0))
+        for (_, im), (si, x, y) in zip(items, places):
+            if si == s:
+                canvas.paste(im, (x, y))
+        buf = io.BytesIO()
+        if args.format == "webp":
+            canvas.save(buf, format="WEBP", quality=args.quality, method=6)
+        else:
+            canvas.save(buf, format="PNG", optimize=True)
+        data = buf.getvalue()
+        # 内容ハッシュ入りのファイル名（変わらなければ同じ名前 → キャッシュが効く）
+        name = f"sprite_{s}_{hashlib.sha256(data).hexdigest()[:10]}.{args.format}"
+        path = out_dir / name
+        if not path.exists():
+            path.write_bytes(data)
+        url = f"{PUBLIC_PREFIX}/{out_dir.name}/{name}" if PUBLIC_PREFIX else f"/{out_dir.name}/{name}"
+        sheets.append({"url": url, "file": name, "width": canvas.width, "height": canvas.height})
+
+    # 古いシートを掃除
+    keep = {s["file"] for s in sheets}
+    for old in out_dir.glob("sprite_*"):
+        if old.name not in keep:
+            old.unlink()
+
+    for c in SPRITE_COLS:
+        df[c] = None
+    by_rank, by_sid = {}, {}
+    for (i, im), (s, x, y) in zip(items, places):
+        entry = {"sheet": s, "x": x, "y": y, "w": im.width, "h": im.height}
+        df.loc[i, SPRITE_COLS] = [sheets[s]["url"], x, y, im.width, im.height]
+        row = df.loc[i]
+        if "rank" in df.columns and pd.notna(row["rank"]):
+            by_rank[str(int(row["rank"]))] = entry
+        sid = series_id_of(row)
+        if sid:
+            by_sid[sid] = entry
+
+    manifest = {
+        "source": infile.name,
+        "sheets": [{k: v for k, v in s.items() if k != "file"} for s in sheets],
+        "by_rank": by_rank,
+        "by_series_id": by_sid,
+    }
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    df.to_csv(infile, index=False, encoding="utf-8-sig")
+    print(f"✅ {len(items)} images → {n_sheets} sprite sheet(s) in {out_dir}")
+    print(f"✅ manifest: {out_dir / 'manifest.json'} / CSV updated: {infile}")
+
+if __name__ == "__main__":
+    main()
@@ -6,107 +6,53 @@
 #   - 'name'列の隣に'global_name'列を追加
 #   - global_nameは辞書優先、なければキャッシュ、最後にLLM翻訳
 #   - 既存動作・出力構造は変更しない
+#   - 辞書は data/term_dict/manufacturer.jsonl / vehicle_name.jsonl（term_dict.py）
+#     LLM の新しい訳はそこへロック付きで追記する（src=llm, model, at 付き）
 #
 # 使い方:
 #   python tools/stage_translate_maker_to_ja.py <csv>
+#   python tools/stage_translate_maker_to_ja.py --plan <csv>   # LLM を呼ばず必要な呼び出し数を見積もる
 
 import os, sys, re, json, time
 from pathlib import Path
 import pandas as pd
 from openai import OpenAI
+from llm_budget import Budget, Planner, estimate_tokens
+from term_dict import TermDict
 
 try:
     sys.stdout.reconfigure(line_buffering=True)
 except Exception:
     pass
 
-# ==== メーカー翻訳辞書 ====
-DICT_ZH_TO_JA = {
-    # ✅ 自主ブランド
-    "比亚迪": "BYD",
-    "吉利": "Geely（吉利）",
-    "吉利银河": "Geely Galaxy（吉利銀河）",
-    "奇瑞": "Chery（奇瑞）",
-    "奇瑞风云": "Chery Fengyun（奇瑞風雲）",
-    "长安": "長安",
-    "长安启源": "長安啓源",
-    "哈弗": "Haval（哈弗）",
-    "魏牌": "WEY（魏牌）",
-    "红旗": "紅旗",
-    "名爵": "MG（名爵）",
-    "荣威": "Roewe（栄威）",
-    "零跑汽车": "Leapmotor",
-    "理想汽车": "Li Auto（理想）",
-    "小鹏": "Xpeng（小鵬）",
-    "极狐": "ARCFOX（極狐）",
-    "深蓝汽车": "Deepal（深藍）",
-    "领克": "Lynk & Co",
-    "乐道": "ONVO（楽道）",
-    "方程豹": "方程豹",
-    "iCAR": "iCAR（奇瑞iCAR）",
-    "腾势": "DENZA（騰勢）",
-    
-    # ✅ 上汽グループ系
-    "上汽": "上海汽車（SAIC）",
-    "上汽集团": "上海汽車（SAIC）",
-    "上汽通用": "上汽通用（SAIC-GM）",
-    "上汽通用五菱": "上汽通用五菱（SGMW／五菱）",
-    "五菱汽车": "五菱（Wuling）",
-    "宝骏": "宝駿（Baojun）",
-
-    # ✅ 外資系合弁
-    "大众": "フォルクスワーゲン",
-    "奥迪": "アウディ",
-    "宝马": "BMW",
-    "奔驰": "メルセデス・ベンツ",
-    "丰田": "トヨタ",
-    "本田": "ホンダ",
-    "日产": "日産",
-    "马自达": "マツダ",
-    "三菱": "三菱",
-    "铃木": "スズキ",
-    "斯巴鲁": "スバル",
-    "雷克萨斯": "レクサス",
-    "别克": "ビュイック",
-    "雪佛兰": "シボレー",
-    "捷途": "Jetour（捷途）",
-    "奔腾": "Bestune（奔騰）",
-    "沃尔沃": "Volvo",
-    "捷达": "Jetta",
-    "凯迪拉克": "Cadillac",
-    "福特": "フォード",
-    "现代": "ヒュンダイ",
-    "smart": "smart",
-    "起亚": "起亜",
-    "林肯": "Lincoln",
-    "雪铁龙": "Citroën",
-    "捷豹": "Jaguar",
-
-    # ✅ 新興および外資独資
-    "特斯拉": "テスラ（Tesla）",
-    "小米汽车": "小米（Xiaomi Auto）",
-    "AITO 问界": "AITO（問界）",
-    "ARCFOX极狐": "ARCFOX（極狐）",
-    "方程豹汽车": "方程豹（Fang Cheng Bao）",
-}
-
 # ==== OpenAI Translator ====
 class Translator:
-    def __init__(self, model: str, api_key: str | None):
+    def __init__(self, model: str, api_key: str | None, base_url: str | None = None):
         self.model = model
-        self.client = OpenAI(api_key=api_key) if api_key else None
+        if base_url and not api_key:
+            api_key = "offline"  # ローカル互換サーバはキーを見ない
+        self.client = OpenAI(api_key=api_key, base_url=base_url) if api_key else None
         self.batch_size = 60
         self.retries = 3
         self.sleep_base = 1.2
 
-    def translate_unique(self, terms: list[str]) -> dict[str, str]:
+    def translate_unique(self, terms: list[str], budget: Budget | None = None, priority_of=None) -> dict[str, str]:
+        """terms は優先順に並べて渡す。返すのは応答から読み取れた訳だけ
+        （予算で見送ったバッチ・失敗したバッチ・応答に無かった語は結果から外す → 呼び出し側は原文扱い、次回へ回す）"""
         if not self.client:
             print("⚠️ No OpenAI API key; skipping LLM translation")
-            return {t: t for t in terms}
+            return {}
         
         result = {}
         for i in range(0, len(terms), self.batch_size):
             batch = terms[i:i + self.batch_size]
+            if budget is not None:
+                prompt = self._build_prompt(batch)
+                prio = min(priority_of(t) for t in batch) if priority_of else 0
+                if not budget.allow(estimate_tokens(prompt), estimate_tokens("\n".join(batch)) * 2, priority=prio):
+                    budget.defer(len(batch))
+                    print(f"⏭️ budget: deferred {len(batch)} term(s) to next run")
+                    continue
             for attempt in range(self.retries):
                 try:
                     prompt = self._build_prompt(batch)
@@ -115,6 +61,8 @@ class Translator:
                         messages=[{"role": "user", "content": prompt}],
                         temperature=0.3,
                     )
+                    if budget is not None:
+                        budget.record(getattr(resp, "usage", None))
                     content = resp.choices[0].message.content or ""
                     parsed = self._parse_response(content, batch)
                     result.update(parsed)
@@ -123,9 +71,6 @@ class Translator:
                     print(f"⚠️ LLM translation attempt {attempt+1}/{self.retries} failed: {e}")
                     if attempt < self.retries - 1:
                         time.sleep(self.sleep_base ** (attempt + 1))
-                    else:
-                        for t in batch:
-                            result[t] = t
         return result
 
     def _build_prompt(self, terms: list[str]) -> str:
@@ -143,239 +88,48 @@ class Translator:
 ..."""
 
     def _parse_response(self, content: str, batch: list[str]) -> dict[str, str]:
+        """「番号. 訳」の行だけを番号で対応付ける（欠けた番号は埋めない）"""
         result = {}
-        lines = [ln.strip() for ln in content.split("\n") if ln.strip()]
-        for i, line in enumerate(lines):
-            m = re.match(r"^\d+[\.\)]\s*(.+)$", line)
-            if m and i < len(batch):
-                result[batch[i]] = m.group(1).strip()
-        # Fill missing translations
-        for t in batch:
-            if t not in result:
-                result[t] = t
+        for line in content.split("\n"):
+            m = re.match(r"^\s*(\d+)[\.\)]\s*(.+)$", line)
+            if not m:
+                continue
+            i = int(m.group(1)) - 1
+            if 0 <= i < len(batch) and batch[i] not in result:
+                result[batch[i]] = m.group(2).strip()
         return result
 
-# ==== 辞書の自動更新 ====
-def update_dictionary_file(dict_name: str, new_entries: dict[str, str]):
-    """
-    辞書に新しいエントリを追加してPythonファイルに書き戻す
-    """
-    if not new_entries:
-        return
-    
-    script_path = Path(__file__)
-    
-    try:
-        with script_path.open("r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # 辞書の開始・終了位置を検索
-        if dict_name == "DICT_ZH_TO_JA":
-            pattern = r"(DICT_ZH_TO_JA = \{[^}]*?)(\})"
-        elif dict_name == "DICT_GLOBAL_NAME":
-            pattern = r"(DICT_GLOBAL_NAME = \{[^}]*?)(\}\n\})"  # ネストした構造
-        else:
-            return
-        
-        match = re.search(pattern, content, re.DOTALL)
-        if not match:
-            print(f"⚠️ Could not find {dict_name} in script")
-            return
-        
-        # 新しいエントリを生成
-        new_lines = []
-        for key, value in sorted(new_entries.items()):
-            # エスケープ処理
-            key_escaped = key.replace('"', '\\"')
-            value_escaped = value.replace('"', '\\"')
-            new_lines.append(f'    "{key_escaped}": "{value_escaped}",')
-        
-        # 辞書に追加
-        dict_start = match.group(1)
-        dict_end = match.group(2)
-        
-        # 既存の最後のカンマを確認
-        if not dict_start.rstrip().endswith(","):
-            dict_start += ","
-        
-        new_dict = dict_start + "\n    # LLMで自動追加\n" + "\n".join(new_lines) + "\n" + dict_end
-        
-        # ファイルを更新
-        new_content = content[:match.start()] + new_dict + content[match.end():]
-        
-        with script_path.open("w", encoding="utf-8") as f:
-            f.write(new_content)
-        
-        print(f"✅ Added {len(new_entries)} entries to {dict_name}")
-        
-    except Exception as e:
-        print(f"⚠️ Failed to update dictionary: {e}")
+# ==== 訳語辞書（data/term_dict/*.jsonl） ====
+# 固定訳とLLMで追加した訳は外部の辞書ストアに置く（このスクリプト自体は書き換えない）
+MAKER_DICT = TermDict("manufacturer")
+NAME_DICT = TermDict("vehicle_name")
 
-def translate_with_dict_update(kind: str, terms: list[str], fixed_map: dict[str, str], tr: Translator) -> dict[str, str]:
+def translate_with_dict_update(kind: str, terms: list[str], store: TermDict, tr: Translator,
+                               budget: Budget | None = None, priority_of=None) -> dict[str, str]:
     """
-    固定辞書で翻訳 → なければLLM → 辞書ファイルに追加
+    辞書ストアで翻訳 → なければLLM → 辞書ストアに追記（src=llm）
     """
     out: dict[str, str] = {}
 
-    # 1) 固定辞書
+    # 1) 辞書
     for t in terms:
-        if t in fixed_map:
-            out[t] = fixed_map[t]
+        if t in store:
+            out[t] = store.get(t)
 
     # 2) LLM
     need = [t for t in terms if t not in out]
     if need:
         print(f"🤖 Translating {len(need)} {kind}(s) with LLM...")
-        llm_map = tr.translate_unique(need)
+        llm_map = tr.translate_unique(need, budget, priority_of)
         out.update(llm_map)
-        
-        # 3) 辞書ファイルに追加
-        dict_name = "DICT_ZH_TO_JA" if kind == "manufacturer" else "DICT_GLOBAL_NAME"
-        update_dictionary_file(dict_name, llm_map)
-
-    return out
 
-DICT_KEYS_SORTED = sorted(DICT_ZH_TO_JA.keys(), key=len, reverse=True)
+        # 3) 辞書ストアに追加（応答から読み取れた訳だけ。失敗・欠落した語は次回また LLM へ）
+        if llm_map:
+            added = store.add(llm_map, src="llm", model=tr.model)
+            if added:
+                print(f"✅ Added {added} entries to {store.path}")
 
-# ==== グローバル名辞書 ====
-DICT_GLOBAL_NAME = {
-    # 前10位
-    "宏光MINIEV": "宏光MINIEV",
-    "Model Y": "モデルY",
-    "星愿": "星願",
-    "秦PLUS": "秦PLUS",
-    "轩逸": "シルフィ",
-    "海狮06新能源": "Sealion 06",
-    "博越L": "博越L",
-    "海豹06新能源": "Seal 06",
-    "秦L": "秦L",
-    "元UP": "Atto2",
-
-    # 11–20
-    "海鸥": "シーガル",
-    "速腾": "サギター（Sagitar）",
-    "长安Lumin": "ルミン（Lumin）",
-    "小米YU7": "YU7",
-    "朗逸": "ラヴィーダ",
-    "海豚": "ドルフィン（Dolphin）",
-    "问界M8": "AITO M8",
-    "凯美瑞": "カムリ",
-    "Model 3": "モデル3",
-    "RAV4荣放": "RAV4",
-
-    # 21–40
-    "小米SU7": "SU7",
-    "途观L": "ティグアンL",
-    "帕萨特": "パサート",
-    "逸动": "Eado",
-    "星越L": "Monjaro",
-    "迈腾": "マゴタン",
-    "哈弗大狗": "ビッグドッグ",
-    "奥迪A6L": "A6L",
-    "探岳": "タイロン（Tayron）",
-    "卡罗拉锐放": "カローラクロス",
-
-    # 41–60
-    "瑞虎8": "ティゴ8（Tiggo 8）",
-    "小鹏MONA M03": "MONA M03",
-    "本田CR-V": "CR-V",
-    "红旗H5": "H5",
-    "缤越": "クールレイ（Coolray）",
-    "锋兰达": "フロントランダー",
-    "艾瑞泽8": "アリゾ8（Arrizo 8）",
-    "宋Pro新能源": "Sealion 5 DM‑i",
-    "雅阁": "アコード",
-    "深蓝S05": "Deepal S05",
-    "奔驰E级": "Eクラス",
-    "熊猫": "パンダ",
-    "银河A7": "Galaxy A7",
-    "昂科威Plus": "Envision Plus",
-    "零跑C10": "C10",
-    "元PLUS": "Atto 3",
-    "海豹05 DM-i": "Seal 05 DM-i",
-    "零跑B01": "B01",
-    "宝马3系": "3シリーズ",
-    "途岳": "途岳（Tharu）",
-
-    # 61–80
-    "奔腾小马": "ポニー（Pony）",
-    "理想L6": "L6",
-    "奥迪Q5L": "Q5L",
-    "威兰达": "ウィランダー",
-    "海狮05 EV": "海狮05 EV",
-    "长安CS75PLUS": "CS75プラス",
-    "MG4": "MG4",
-    "亚洲龙": "アバロン",
-    "奔驰GLC": "GLC",
-    "哈弗猛龙新能源": "ラプター（Haval Raptor）",
-    "宋PLUS新能源": "宋PLUS新能源（Song PLUS EV）",
-    "乐道L90": "乐道L90",
-    "零跑C11": "C11",
-    "问界M9": "問界M9（AITO M9）",
-    "奔驰C级": "Cクラス",
-    "长安启源Q07": "啓源Q07（Qiyuan Q07）",
-    "捷途X70": "X70（Jetour X70）",
-    "银河E5": "銀河E5",
-    "宋L DM-i": "宋L DM-i",
-    "极狐T1": "極狐T1（ARCFOX T1）",
-
-    # 81–100
-    "银河星耀8": "銀河星耀8",
-    "风云A9L": "風雲A9L",
-    "皓影": "ブリーズ",
-    "五菱缤果": "ビンゴ（Bingo）",
-    "零跑B10": "B10",
-    "长安X5 PLUS": "X5プラス",
-    "零跑C16": "C16",
-    "宝马5系": "5シリーズ",
-    "铂智3X": "bZ3X",
-    "荣威i5": "i5",
-    "银河星舰7": "銀河星艦7",
-    "赛那SIENNA": "シエナ",
-    "钛7": "レパード7（Leopard 7）",
-    "小鹏P7": "P7",
-    "宝马X3": "X3",
-    "长安UNI-Z新能源": "UNI-Z",
-    "魏牌 高山": "高山（Wey Gaoshan）",
-    "iCAR 超级V23": "iCAR V23",
-    "奥迪A4L": "A4L",
-    "红旗HS5": "HS5",
-    "逍客": "キャシュカイ",
-    "领克900": "Lynk & Co 09",
-    "星瑞": "Preface",
-    "腾势D9": "Denza D9",
-    "驱逐舰05": "Destroyer 05",
-    "卡罗拉": "カローラ",
-    "别克GL8新能源": "GL8",
-    "宝来": "Bora",
-    "传祺GS3": "GS3",
-
-    # 追加精査分
-    "ID.4 CROZZ": "ID.4 CROZZ",
-    "ID.4 X": "ID.4 X",
-    "T-ROC探歌": "T-ROC（探歌）",
-    "一汽-大众CC": "CC",
-    "伊兰特": "エラントラ（Elantra）",
-    "凌渡": "ラモンド（Lamando）",
-    "凯迪拉克CT5": "CT5",
-    "凯迪拉克XT4": "XT4",
-    "凯迪拉克XT5": "XT5",
-    "别克E5": "E5",
-    "别克GL8": "GL8",
-    "蒙迪欧": "モンデオ（Mondeo）",
-    "沃尔沃S90": "S90",
-    "沃尔沃XC60": "XC60",
-    "福瑞迪": "フォルテ（Forte）",
-    "赛图斯": "セルトス（Seltos）",
-    "smart精灵#1": "smart精灵#1",
-    "航海家": "ノーチラス（Nautilus）",
-    "锐界": "エッジ（Edge）",
-    "马自达CX-5": "CX-5",
-    "马自达EZ-60": "EZ-60",
-    "皇冠陆放": "クラウンクルーガー（Crown Kluger）",
-    "雷凌": "レビン（Levin）",
-    "高尔夫": "ゴルフ（Golf）",
-}
+    return out
 
 # ==== ピンイン補助 ====
 try:
@@ -411,7 +165,20 @@ def add_block_pinyin_inline(name: str, global_name: str) -> str:
     return "".join(out)
 
 # ==== メイン ====
-def process_csv(csv_path: Path) -> Path | None:
+def rank_priority(df: pd.DataFrame, col: str):
+    """ランキング上位の値ほど優先（llm_budget の優先度: 上位=1, それ以外=2）"""
+    top = float(os.environ.get("LLM_PRIORITY_TOP", "30") or 30)
+    best: dict[str, float] = {}
+    if "rank" in df.columns:
+        ranks = pd.to_numeric(df["rank"], errors="coerce")
+        for v, r in zip(df[col].astype(str), ranks):
+            if pd.notna(r):
+                best[v] = min(best.get(v, r), r)
+    order = lambda v: best.get(v, float("inf"))
+    prio = lambda v: 1 if order(v) <= top else 2
+    return order, prio
+
+def process_csv(csv_path: Path, plan: Planner | None = None) -> Path | None:
     print(f"\n=== Processing {csv_path} ===")
     try:
         df = pd.read_csv(csv_path)
@@ -425,23 +192,29 @@ def process_csv(csv_path: Path) -> Path | None:
     # OpenAI設定
     model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
     api_key = os.environ.get("OPENAI_API_KEY")
-    tr = Translator(model, api_key)
+    base_url = os.environ.get("OPENAI_BASE_URL", "").strip() or None
+    tr = Translator(model, api_key, base_url)
+    budget = Budget.from_env("stage_translate_maker_to_ja", csv_path.stem, model)
 
     # manufacturer_ja - 辞書優先、なければLLM→辞書追加
     print("\n📋 Translating manufacturers...")
     uniq_makers = list(set(df["manufacturer"].dropna().astype(str).unique()))
     
-    # まず辞書でマッチング（部分一致）
+    # まず辞書でマッチング（部分一致・最長。Aho-Corasick 索引なので辞書が増えても入力長ぶんの手間）
     maker_ja_map = {}
+    maker_index = MAKER_DICT.index()
     for val in uniq_makers:
-        matched = next((DICT_ZH_TO_JA[k] for k in DICT_KEYS_SORTED if k in val), None)
+        matched = maker_index.get(val)
         if matched:
             maker_ja_map[val] = matched
     
-    # 辞書にないものをLLMで翻訳→辞書に追加
-    need_llm_makers = [m for m in uniq_makers if m not in maker_ja_map]
-    if need_llm_makers:
-        llm_maker_map = translate_with_dict_update("manufacturer", need_llm_makers, {}, tr)
+    # 辞書にないものをLLMで翻訳→辞書に追加（ランキング上位から）
+    maker_order, maker_prio = rank_priority(df, "manufacturer")
+    need_llm_makers = sorted((m for m in uniq_makers if m not in maker_ja_map), key=maker_order)
+    if plan is not None:
+        plan.add("manufacturer", need_llm_makers, tr.batch_size)
+    elif need_llm_makers:
+        llm_maker_map = translate_with_dict_update("manufacturer", need_llm_makers, MAKER_DICT, tr, budget, maker_prio)
         maker_ja_map.update(llm_maker_map)
     
     # データフレームに適用
@@ -453,15 +226,22 @@ def process_csv(csv_path: Path) -> Path | None:
     
     # 固定辞書からマッチング
     name_map = {}
+    name_index = NAME_DICT.index()
     for n in uniq_names:
-        if n in DICT_GLOBAL_NAME:
-            name_map[n] = DICT_GLOBAL_NAME[n]
+        g = name_index.exact(n)
+        if g is not None:
+            name_map[n] = g
     
-    # 辞書にないものをLLMで翻訳→辞書に追加
-    need_llm_names = [n for n in uniq_names if n not in name_map]
+    # 辞書にないものをLLMで翻訳→辞書に追加（ランキング上位から）
+    name_order, name_prio = rank_priority(df, "name")
+    need_llm_names = sorted((n for n in uniq_names if n not in name_map), key=name_order)
+    if plan is not None:
+        plan.add("vehicle_name", need_llm_names, tr.batch_size)
+        return None
     if need_llm_names:
-        llm_name_map = translate_with_dict_update("vehicle_name", need_llm_names, DICT_GLOBAL_NAME, tr)
+        llm_name_map = translate_with_dict_update("vehicle_name", need_llm_names, NAME_DICT, tr, budget, name_prio)
         name_map.update(llm_name_map)
+    budget.print_summary()
     
     # ピンインフォールバック（LLMで翻訳できなかった、または中国語のみの場合）
     globals_ = []
@@ -484,13 +264,17 @@ def process_csv(csv_path: Path) -> Path | None:
     return out
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python tools/stage_translate_maker_to_ja.py <csv>")
+    args = [a for a in sys.argv[1:] if a != "--plan"]
+    if not args:
+        print("Usage: python tools/stage_translate_maker_to_ja.py [--plan] <csv>")
         sys.exit(1)
-    for arg in sys.argv[1:]:
+    plan = Planner("stage_translate_maker_to_ja", os.environ.get("OPENAI_MODEL", "gpt-4o-mini")) if "--plan" in sys.argv[1:] else None
+    for arg in args:
         p = Path(arg)
         if p.exists() and p.suffix.lower() == ".csv":
-            process_csv(p)
+            process_csv(p, plan)
+    if plan is not None:
+        plan.print_report()
 
 if __name__ == "__main__":
     main()
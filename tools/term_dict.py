@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# tools/term_dict.py
+#
+# 訳語辞書ストア（stage_translate_maker_to_ja.py から利用）
+#   - 辞書ごとに 1 つの JSONL（1 行 1 エントリ）: data/term_dict/<kind>.jsonl
+#       {"zh": 原文, "ja": 訳語, "src": "fixed" | "llm", "model": ..., "at": ..., "group": ...}
+#   - 追記のみ。同じ原文は fixed が llm より優先、同じ src 同士は後の行が優先
+#   - 初回参照時に読み込んで dict で索引化（import 時には読まない）
+#     部分一致用の最長一致索引（longest_match.py）も初回の index() で組み立てる
+#   - 追記はロックファイル（fcntl）で排他し、ロック中に読み直して既にある原文は書かない
+#     → main / hezi のパイプラインが同時に走っても行が混ざったり重複したりしない
+#
+# 環境変数:
+#   TERM_DICT_DIR   辞書ディレクトリ（既定 data/term_dict）
+
+import json, os, threading, time
+from pathlib import Path
+
+from longest_match import LongestMatchIndex
+
+try:
+    import fcntl
+    _FCNTL_OK = True
+except Exception:
+    _FCNTL_OK = False
+
+TERM_DICT_DIR = Path(os.environ.get("TERM_DICT_DIR", "data/term_dict"))
+SRC_RANK = {"fixed": 0, "llm": 1}
+
+class _FileLock:
+    def __init__(self, path: Path):
+        self.path = path
+        self.fh = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fh = open(self.path, "a")
+        if _FCNTL_OK:
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if _FCNTL_OK:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+        self.fh.close()
+
+class TermDict:
+    def __init__(self, kind: str, root: Path | None = None):
+        self.kind = kind
+        self.path = Path(root or TERM_DICT_DIR) / f"{kind}.jsonl"
+        self._entries: dict[str, dict] | None = None
+        self._index: LongestMatchIndex | None = None
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict[str, dict]:
+        entries: dict[str, dict] = {}
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return entries
+        with f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    e = json.loads(line)
+                except Exception:
+                    continue  # 書きかけの行などは読み飛ばす
+                zh = e.get("zh")
+                if not zh or "ja" not in e:
+                    continue
+                old = entries.get(zh)
+                if old is None or SRC_RANK.get(e.get("src"), 9) <= SRC_RANK.get(old.get("src"), 9):
+                    entries[zh] = e
+        return entries
+
+    @property
+    def entries(self) -> dict[str, dict]:
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            return self._entries
+
+    def get(self, zh: str, default=None):
+        e = self.entries.get(zh)
+        return e["ja"] if e else default
+
+    def __contains__(self, zh: str) -> bool:
+        return zh in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def mapping(self) -> dict[str, str]:
+        return {k: e["ja"] for k, e in self.entries.items()}
+
+    def index(self) -> LongestMatchIndex:
+        entries = self.entries
+        with self._lock:
+            if self._index is None:
+                self._index = LongestMatchIndex({k: e["ja"] for k, e in entries.items()})
+            return self._index
+
+    def add(self, new_entries: dict[str, str], src: str = "llm", model: str = "") -> int:
+        """ロックして読み直し、まだない原文だけを 1 回の write で追記 → 追加件数"""
+        if not new_entries:
+            return 0
+        with _FileLock(self.path.with_name(self.path.name + ".lock")):
+            current = self._read()
+            at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            lines = []
+            for zh, ja in sorted(new_entries.items()):
+                if not zh or zh in current:
+                    continue
+                e = {"zh": zh, "ja": ja, "src": src, "at": at}
+                if model:
+                    e["model"] = model
+                current[zh] = e
+                lines.append(json.dumps(e, ensure_ascii=False))
+            if lines:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        with self._lock:
+            self._entries = current
+            if lines:
+                self._index = None
+        return len(lines)
@@ -1,8 +1,11 @@
 from __future__ import annotations
-import os, json, time, re, urllib.request
+import os, sys, json, time, re, shutil, unicodedata, urllib.request
 from pathlib import Path
 import pandas as pd
 from openai import OpenAI
+from translate_core import build_system_prompt, chat_translate_batch, chunked, estimate_batch_tokens, service_translate
+from llm_budget import Budget, Planner, series_priority_offset
+from longest_match import LongestMatchIndex
 
 # =============================
 # 入出力解決
@@ -48,6 +51,14 @@ def make_secondary(dst: Path) -> Path:
 
 DST_SECONDARY = make_secondary(DST_PRIMARY)
 
+def make_lang_path(dst: Path, lang: str) -> Path:
+    # config_XXXX.ja.csv → config_XXXX.en.csv（_ja.csv も同様）
+    s = dst.name
+    for suf in (".ja.csv", "_ja.csv"):
+        if s.endswith(suf):
+            return dst.parent / (s[: -len(suf)] + suf.replace("ja", lang))
+    return dst.parent / f"{dst.stem}.{lang}.csv"
+
 def detect_series_id_from_path(p: Path) -> str:
     # output/autohome/<sid>/config_<sid>.csv の <sid> を推定
     try:
@@ -78,9 +89,25 @@ STRIP_GRADE_PREFIX = os.environ.get("STRIP_GRADE_PREFIX", "true").lower() == "tr
 SERIES_PREFIX_RE   = os.environ.get("SERIES_PREFIX", "").strip()
 EXRATE_CNY_TO_JPY  = float(os.environ.get("EXRATE_CNY_TO_JPY", "21.0"))
 CURRENCYFREAKS_KEY = os.environ.get("CURRENCY", "").strip()
+# OpenAI 互換エンドポイントの差し替え（例: tools/llm_standin.py でオフライン計測）
+BASE_URL = os.environ.get("OPENAI_BASE_URL", "").strip() or None
+# ローカル翻訳サービス（tools/translate_service.py）を使う場合は URL を指定
+TRANSLATE_SERVICE_URL = os.environ.get("TRANSLATE_SERVICE_URL", "").strip()
+# 出力言語（先頭が主言語）。例: TARGET_LANGS=ja,en で 1 回の LLM 呼び出しから両言語を得る
+TARGET_LANGS = [l.strip() for l in os.environ.get("TARGET_LANGS", "ja").split(",") if l.strip()] or ["ja"]
+if "ja" in TARGET_LANGS:
+    TARGET_LANGS.remove("ja")
+    TARGET_LANGS.insert(0, "ja")
 
 BATCH_SIZE, RETRIES, SLEEP_BASE = 60, 3, 1.2
 
+# --plan: LLM を呼ばず、現在のキャッシュ状況から必要な呼び出し数を見積もるだけ
+PLAN_ONLY = "--plan" in sys.argv[1:]
+BUDGET = Budget.from_env("translate_columns", SERIES_FOR_CACHE, MODEL)
+PLANNER = Planner("translate_columns", MODEL)
+# 優先度（llm_budget.PRIORITY_SHARE）。ランキング下位の系列は 1 段下げる
+PRIO_OFFSET = series_priority_offset()
+
 # =============================
 # 為替（CurrencyFreaks優先 / 失敗時はフォールバック）
 # =============================
@@ -193,6 +220,7 @@ BRAND_MAP = {
     "奔驰": "メルセデス・ベンツ",
     "梅赛德斯-奔驰": "メルセデス・ベンツ",
 }
+BRAND_INDEX = LongestMatchIndex(BRAND_MAP)
 
 # ====== セクション/項目の固定辞書 ======
 FIX_JA_SECTIONS = {
@@ -542,7 +570,7 @@ def parse_cny(text: str):
         return float(m2.group("num").replace(",", ""))
     return None
 
-def _format_yuan_and_jpy(cell: str, rate: float) -> str:
+def _format_yuan_and_jpy(cell: str, rate: float, lang: str = "ja") -> str:
     t = strip_any_yen_tokens(clean_price_cell(cell))
     if not t or t in {"-", "–", "—"}:
         return t
@@ -551,16 +579,18 @@ def _format_yuan_and_jpy(cell: str, rate: float) -> str:
         if ("元" not in t) and RE_WAN.search(t):
             t = f"{t}元"
         return t
+    jpy = int(round(cny * EXRATE_CNY_TO_JPY))
+    if lang != "ja":
+        return f"CNY {cny:,.0f} (approx. JPY {jpy:,})"
     m1 = RE_WAN.search(t)
     yuan_disp = f"{m1.group('num')}万元" if m1 else (t if "元" in t else f"{t}元")
-    jpy = int(round(cny * EXRATE_CNY_TO_JPY))
     return f"{yuan_disp}（日本円 約{jpy:,}円）"
 
-def msrp_to_yuan_and_jpy(cell: str, rate: float) -> str:
-    return _format_yuan_and_jpy(cell, rate)
+def msrp_to_yuan_and_jpy(cell: str, rate: float, lang: str = "ja") -> str:
+    return _format_yuan_and_jpy(cell, rate, lang)
 
-def dealer_to_yuan_and_jpy(cell: str, rate: float) -> str:
-    return _format_yuan_and_jpy(cell, rate)
+def dealer_to_yuan_and_jpy(cell: str, rate: float, lang: str = "ja") -> str:
+    return _format_yuan_and_jpy(cell, rate, lang)
 
 # =============================
 # 便利関数
@@ -573,77 +603,86 @@ def uniq(seq):
             out.append(x)
     return out
 
-def chunked(xs, n):
-    for i in range(0, len(xs), n):
-        yield xs[i:i+n]
-
-def parse_json_relaxed(content: str, terms: list[str]) -> dict[str, str]:
-    try:
-        d = json.loads(content)
-        if isinstance(d, dict) and "translations" in d:
-            return {
-                str(t["cn"]).strip(): str(t.get("ja", t["cn"])).strip()
-                for t in d["translations"]
-                if t.get("cn")
-            }
-    except Exception:
-        pass
-    pairs = re.findall(r'"cn"\s*:\s*"([^"]+)"\s*,\s*"ja"\s*:\s*"([^"]*)"', content)
-    if pairs:
-        return {cn.strip(): ja.strip() for cn, ja in pairs}
-    return {t: t for t in terms}
-
 # =============================
 # 翻訳クラス
 # =============================
 class Translator:
-    def __init__(self, model: str, api_key: str):
+    def __init__(self, model: str, api_key: str, langs: list[str] | None = None, base_url: str | None = None):
         if not (api_key and api_key.strip()):
-            raise RuntimeError("OPENAI_API_KEY is not set")
-        self.client = OpenAI(api_key=api_key)
+            if not base_url:
+                raise RuntimeError("OPENAI_API_KEY is not set")
+            api_key = "offline"  # ローカル互換サーバはキーを見ない
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
         self.model = model
-        self.system = (
-            "あなたは自動車仕様表の専門翻訳者です。"
-            "入力は中国語の『セクション名/項目名/モデル名/セル値』の配列です。"
-            "自然で簡潔な日本語へ翻訳してください。数値・年式・排量・AT/MT等の記号は保持。"
-            "出力は JSON（{'translations':[{'cn':'原文','ja':'訳文'}]}）のみ。"
-        )
+        self.langs = list(langs or ["ja"])
+        self.system = build_system_prompt(self.langs)
 
-    def translate_batch(self, terms: list[str]) -> dict[str, str]:
+    def translate_batch_multi(self, terms: list[str]) -> dict[str, dict[str, str]]:
+        """失敗時は {}（原文を訳として返さない）"""
         if not terms:
             return {}
-        msgs = [
-            {"role": "system", "content": self.system},
-            {"role": "user", "content": json.dumps({"terms": terms}, ensure_ascii=False)},
-        ]
         try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=msgs,
-                temperature=0,
-                response_format={"type": "json_object"},
-            )
-            content = resp.choices[0].message.content or ""
-            return parse_json_relaxed(content, terms)
+            return chat_translate_batch(self.client, self.model, self.langs, terms, on_usage=BUDGET.record)
         except Exception as e:
             print("❌ OpenAI error:", repr(e))
-            return {t: t for t in terms}
+            return {}
 
-    def translate_unique(self, unique_terms: list[str]) -> dict[str, str]:
-        out = {}
+    def translate_unique_multi(self, unique_terms: list[str], priority: int = 0) -> dict[str, dict[str, str]]:
+        """予算を超えるバッチ・リトライ切れのバッチは結果から外す（呼び出し側はキャッシュせず次回へ回す）"""
+        out: dict[str, dict[str, str]] = {}
         for chunk in chunked(unique_terms, BATCH_SIZE):
+            if not BUDGET.allow(*estimate_batch_tokens(self.langs, chunk), priority=priority):
+                BUDGET.defer(len(chunk))
+                continue
             for attempt in range(1, RETRIES + 1):
                 try:
-                    out.update(self.translate_batch(chunk))
+                    out.update(chat_translate_batch(self.client, self.model, self.langs, chunk, on_usage=BUDGET.record))
                     break
                 except Exception as e:
                     print(f"❌ translate_unique error attempt={attempt}:", repr(e))
-                    if attempt == RETRIES:
-                        for t in chunk:
-                            out.setdefault(t, t)
-                    time.sleep(SLEEP_BASE * attempt)
+                    if attempt < RETRIES:
+                        time.sleep(SLEEP_BASE * attempt)
+        return out
+
+    def translate_batch(self, terms: list[str]) -> dict[str, str]:
+        return {k: v.get(self.langs[0], k) for k, v in self.translate_batch_multi(terms).items()}
+
+    def translate_unique(self, unique_terms: list[str]) -> dict[str, str]:
+        return {k: v.get(self.langs[0], k) for k, v in self.translate_unique_multi(unique_terms).items()}
+
+class ServiceTranslator(Translator):
+    """translate_service.py 経由で翻訳（複数ジョブ間で重複語をまとめ、レート制限を共有）"""
+    def __init__(self, url: str, langs: list[str] | None = None):
+        self.url = url
+        self.langs = list(langs or ["ja"])
+
+    def translate_batch_multi(self, terms: list[str]) -> dict[str, dict[str, str]]:
+        return self.translate_unique_multi(terms)
+
+    def translate_unique_multi(self, unique_terms: list[str], priority: int = 0) -> dict[str, dict[str, str]]:
+        """Translator と同じくバッチごとに予算を判定（消費はサービスが返す usage を記録）"""
+        out: dict[str, dict[str, str]] = {}
+        for chunk in chunked(unique_terms, BATCH_SIZE):
+            if not BUDGET.allow(*estimate_batch_tokens(self.langs, chunk), priority=priority):
+                BUDGET.defer(len(chunk))
+                continue
+            for attempt in range(1, RETRIES + 1):
+                try:
+                    res = service_translate(self.url, chunk, self.langs, on_usage=BUDGET.record)
+                    out.update({t: res[t] for t in chunk if res.get(t)})
+                    break
+                except Exception as e:
+                    print(f"❌ translate service error attempt={attempt}:", repr(e))
+                    if attempt < RETRIES:
+                        time.sleep(SLEEP_BASE * attempt)
         return out
 
+def make_translator() -> Translator:
+    if TRANSLATE_SERVICE_URL:
+        print(f"🔗 using translate service: {TRANSLATE_SERVICE_URL}")
+        return ServiceTranslator(TRANSLATE_SERVICE_URL, TARGET_LANGS)
+    return Translator(MODEL, API_KEY, TARGET_LANGS, BASE_URL)
+
 # =============================
 # キャッシュ
 # =============================
@@ -652,13 +691,20 @@ def ensure_dir(p: Path):
     return p
 
 CACHE_DIR = ensure_dir(Path("cache") / SERIES_FOR_CACHE)
-CACHE_FILES = {
-    "section": CACHE_DIR / "sections.json",
-    "item":    CACHE_DIR / "items.json",
-    "value":   CACHE_DIR / "values.json",
-    "col":     CACHE_DIR / "columns.json",
+CACHE_BASENAMES = {
+    "section": "sections",
+    "item":    "items",
+    "value":   "values",
+    "col":     "columns",
 }
 
+def cache_files_for(lang: str) -> dict[str, Path]:
+    # ja は従来通り sections.json、他言語は sections.en.json のように言語別ファイル
+    suffix = ".json" if lang == "ja" else f".{lang}.json"
+    return {kind: CACHE_DIR / f"{base}{suffix}" for kind, base in CACHE_BASENAMES.items()}
+
+CACHE_FILES_BY_LANG = {lang: cache_files_for(lang) for lang in TARGET_LANGS}
+
 def load_json(p: Path) -> dict[str, str]:
     try:
         if p.exists():
@@ -678,53 +724,136 @@ def dump_json_safe(p: Path, data: dict[str, str]):
     except Exception as e:
         print(f"⚠️ cache save failed {p}: {e}")
 
-# メモリキャッシュ（実行中のみ）
-MEM_CACHE = {
-    "section": {},
-    "item": {},
-    "value": {},
-    "col": {},
-}
+# =============================
+# キャッシュキー正規化
+#   全角/半角・繁体/簡体・末尾句読点・内側の空白の揺れを同一キーに寄せる
+# =============================
+try:
+    from opencc import OpenCC
+    _T2S = OpenCC("t2s")
+except Exception:
+    _T2S = None
+
+_KEY_WS_RE = re.compile(r"[ \t\u3000\u00A0\u200b\ufeff]+")
+_KEY_CJK_GAP_RE = re.compile(r"(?<=[\u3000-\u30ff\u4e00-\u9fff]) (?=\S)|(?<=\S) (?=[\u3000-\u30ff\u4e00-\u9fff])")
+_KEY_TAIL_PUNCT = "。．.，,、;；:：!！?？"
+
+def canon_key(s: str) -> str:
+    t = unicodedata.normalize("NFKC", str(s))
+    if _T2S is not None:
+        try:
+            t = _T2S.convert(t)
+        except Exception:
+            pass
+    lines = []
+    for seg in t.splitlines():
+        seg = _KEY_WS_RE.sub(" ", seg).strip()
+        seg = _KEY_CJK_GAP_RE.sub("", seg)
+        lines.append(seg.rstrip(_KEY_TAIL_PUNCT).rstrip())
+    return "\n".join(lines).strip()
+
+def canon_map(d: dict[str, str]) -> dict[str, str]:
+    # 先勝ち（既存の訳を正規化の衝突で上書きしない）
+    out: dict[str, str] = {}
+    for k, v in d.items():
+        out.setdefault(canon_key(k), v)
+    return out
+
+_FIXED_CANON: dict[int, tuple[dict[str, str], dict[str, str]]] = {}
 
+def _fixed_canon(fixed_map: dict[str, str] | None) -> dict[str, str]:
+    # 固定辞書は呼び出しごとに作り直さない（元の dict も保持して id 再利用に備える）
+    # 空の辞書は登録しない（呼び出し側の `or {}` などで毎回新しい dict が来てもキャッシュが増えない）
+    if not fixed_map:
+        return {}
+    hit = _FIXED_CANON.get(id(fixed_map))
+    if hit is None or hit[0] is not fixed_map:
+        hit = (fixed_map, canon_map(fixed_map))
+        _FIXED_CANON[id(fixed_map)] = hit
+    return hit[1]
+
+# メモリキャッシュ（実行中のみ）: MEM_CACHE[lang][kind]
+MEM_CACHE = {lang: {kind: {} for kind in CACHE_BASENAMES} for lang in TARGET_LANGS}
+
+# シリーズキャッシュ(JSON): SERIES_CACHE[lang][kind]
 SERIES_CACHE = {
-    "section": load_json(CACHE_FILES["section"]),
-    "item":    load_json(CACHE_FILES["item"]),
-    "value":   load_json(CACHE_FILES["value"]),
-    "col":     load_json(CACHE_FILES["col"]),
+    lang: {kind: canon_map(load_json(files[kind])) for kind in CACHE_BASENAMES}
+    for lang, files in CACHE_FILES_BY_LANG.items()
 }
 
-def translate_with_caches(kind: str, terms: list[str], fixed_map: dict[str, str], tr: Translator) -> dict[str, str]:
+# ヒット率計測（ユニーク語数ベース）
+# 既定の出力先 cache/<sid>/cache_stats.json は .gitignore 済み（毎回変わるのでコミットしない）
+CACHE_TIERS = ("fixed", "series", "mem", "llm")
+CACHE_STATS = {kind: {tier: 0 for tier in CACHE_TIERS} for kind in CACHE_BASENAMES}
+CACHE_STATS_OUT = Path(os.environ.get("CACHE_STATS_OUT", "").strip() or (CACHE_DIR / "cache_stats.json"))
+
+def translate_with_caches(kind: str, terms: list[str], fixed_maps: dict[str, dict[str, str]], tr: Translator | None,
+                          priority: int = 0) -> dict[str, dict[str, str]]:
     """
     優先順: 固定辞書 > シリーズキャッシュ(JSON) > メモリキャッシュ > LLM
+    参照・保存はすべて canon_key() で正規化したキーで行う。
+    fixed_maps は {lang: 固定辞書}。戻り値は {lang: {原文: 訳文}}。
+    いずれかの言語が欠けた語だけを LLM に送り、全言語を 1 回で受け取る。
+    予算で見送られた語は原文のまま返し、キャッシュしない（次回に回す）。
     """
-    out: dict[str, str] = {}
-
-    # 1) 固定辞書
-    for t in terms:
-        if t in fixed_map:
-            out[t] = fixed_map[t]
-
-    # 2) シリーズキャッシュ(JSON)
+    langs = list(SERIES_CACHE)
+    groups: dict[str, list[str]] = {}
     for t in terms:
-        if t not in out and t in SERIES_CACHE[kind]:
-            out[t] = SERIES_CACHE[kind][t]
-
-    # 3) メモリキャッシュ
-    for t in terms:
-        if t not in out and t in MEM_CACHE[kind]:
-            out[t] = MEM_CACHE[kind][t]
-
-    # 4) LLM
-    need = [t for t in terms if t not in out]
-    if need:
-        llm_map = tr.translate_unique(uniq(need))
-        out.update(llm_map)
-        # メモリ・シリーズキャッシュに反映
-        for k, v in llm_map.items():
-            MEM_CACHE[kind][k] = v
-            SERIES_CACHE[kind][k] = v
+        groups.setdefault(canon_key(t), []).append(t)
+
+    hit: dict[str, dict[str, str]] = {lang: {} for lang in langs}
+    need: list[str] = []
+    fixed_by_lang = {lang: _fixed_canon(fixed_maps.get(lang)) for lang in langs}
+    for ck in groups:
+        tier = None
+        for lang in langs:
+            fixed = fixed_by_lang[lang]
+            if ck in fixed:
+                hit[lang][ck], t = fixed[ck], "fixed"
+            elif ck in SERIES_CACHE[lang][kind]:
+                hit[lang][ck], t = SERIES_CACHE[lang][kind][ck], "series"
+            elif ck in MEM_CACHE[lang][kind]:
+                hit[lang][ck], t = MEM_CACHE[lang][kind][ck], "mem"
+            else:
+                t = "llm"
+            tier = t if tier is None or t == "llm" else tier
+        CACHE_STATS[kind][tier or "llm"] += 1
+        if tier == "llm":
+            # LLM（正規化キーごとに代表の原文を1つだけ送る）
+            need.append(groups[ck][0])
+
+    if need and PLAN_ONLY:
+        PLANNER.add(f"{kind}/p{priority}", need, BATCH_SIZE)
+    elif need:
+        llm_map = tr.translate_unique_multi(need, priority=priority)
+        for t in need:
+            ck = canon_key(t)
+            row = llm_map.get(t)
+            if row is None:
+                continue
+            for lang in langs:
+                if ck in hit[lang]:
+                    continue
+                v = row.get(lang, t)
+                hit[lang][ck] = v
+                # メモリ・シリーズキャッシュに反映
+                MEM_CACHE[lang][kind][ck] = v
+                SERIES_CACHE[lang][kind][ck] = v
+
+    return {
+        lang: {t: hit[lang].get(ck, t) for ck, originals in groups.items() for t in originals}
+        for lang in langs
+    }
 
-    return out
+def report_cache_stats():
+    total = {tier: sum(CACHE_STATS[k][tier] for k in CACHE_STATS) for tier in CACHE_TIERS}
+    report = {"series": SERIES_FOR_CACHE, "kinds": CACHE_STATS, "total": total}
+    for kind, c in list(CACHE_STATS.items()) + [("total", total)]:
+        n = sum(c.values())
+        rate = (n - c["llm"]) / n if n else 0.0
+        report.setdefault("hit_rate", {})[kind] = round(rate, 4)
+        print(f"📊 cache[{kind}] fixed={c['fixed']} series={c['series']} mem={c['mem']} llm={c['llm']} hit={rate:.1%}")
+    dump_json_safe(CACHE_STATS_OUT, report)
 
 # =============================
 # モデル名・グレード整形
@@ -789,34 +918,40 @@ def main():
         raise FileNotFoundError(f"入力CSVが見つかりません: {SRC}")
 
     df = pd.read_csv(SRC, encoding="utf-8-sig")
-    df.columns = [BRAND_MAP.get(c, c) for c in df.columns]
+    df.columns = [BRAND_INDEX.exact(c, c) for c in df.columns]
     
     # 価格行のセクション情報を修正（厂商指导价/经销商报价）
     df = fix_price_section_info(df)
 
-    tr = Translator(MODEL, API_KEY)
+    tr = None if PLAN_ONLY else make_translator()
+    primary = TARGET_LANGS[0]
+    print(f"🌐 target langs: {','.join(TARGET_LANGS)}")
 
     # セクション/項目：辞書を先に適用、無いものはキャッシュ優先で補完
     uniq_sec  = uniq([str(x).strip() for x in df["セクション"].fillna("") if str(x).strip()])
     uniq_item = uniq([str(x).strip() for x in df["項目"].fillna("")    if str(x).strip()])
 
-    sec_map = translate_with_caches("section", uniq_sec, FIX_JA_SECTIONS, tr)
-    item_map = translate_with_caches("item", uniq_item, FIX_JA_ITEMS, tr)
-
-    df.insert(1, "セクション_ja", df["セクション"].map(lambda s: sec_map.get(str(s).strip(), str(s).strip())))
-    df.insert(3, "項目_ja",       df["項目"].map(lambda s: item_map.get(str(s).strip(),   str(s).strip())))
+    sec_maps = translate_with_caches("section", uniq_sec, {"ja": FIX_JA_SECTIONS}, tr, priority=0)
+    item_maps = translate_with_caches("item", uniq_item, {"ja": FIX_JA_ITEMS}, tr, priority=0)
 
     # モデル列（ヘッダ）
+    grades = list(df.columns[2:])
+    grade_cols = {lang: grades for lang in TARGET_LANGS}
     if TRANSLATE_COLNAMES:
-        orig_cols = list(df.columns)
-        fixed = orig_cols[:4]
-        grades = orig_cols[4:]
         grades_stripped = strip_series_prefix_from_grades(grades)
         grades_rule_ja = [grade_rule_ja(g) for g in grades_stripped]
-        need_llm = [g for g in grades_rule_ja if re.search(r"[\u4e00-\u9fff]", g)]
-        col_map = translate_with_caches("col", uniq(need_llm), {}, tr) if need_llm else {}
-        final_grades = [col_map.get(g, g) for g in grades_rule_ja]
-        df.columns = fixed + final_grades
+        # 日本語以外も出す場合は、規則置換で入ったカナも訳す（ja 側はそのまま）
+        multi = TARGET_LANGS != ["ja"]
+        need_llm = [
+            g for g in grades_rule_ja
+            if re.search(r"[\u4e00-\u9fff]", g) or (multi and re.search(r"[\u3040-\u30ff]", g))
+        ]
+        ja_as_is = {g: g for g in need_llm if not re.search(r"[\u4e00-\u9fff]", g)}
+        col_maps = translate_with_caches("col", uniq(need_llm), {"ja": ja_as_is}, tr, priority=1 + PRIO_OFFSET) if need_llm else {}
+        grade_cols = {
+            lang: [col_maps.get(lang, {}).get(g, g) for g in grades_rule_ja]
+            for lang in TARGET_LANGS
+        }
 
     # 価格行検出
     def norm_key(s: str) -> str:
@@ -825,8 +960,9 @@ def main():
         s = re.sub(r"[（(].*?[）)]", "", s)
         return s
 
+    item_primary = df["項目"].map(lambda s: item_maps[primary].get(str(s).strip(), str(s).strip()))
     key_cn_norm = df["項目"].map(norm_key)
-    key_ja_norm = df["項目_ja"].map(norm_key)
+    key_ja_norm = item_primary.map(norm_key)
 
     is_msrp = (
         key_cn_norm.str.contains("厂商指导", na=False) |
@@ -842,69 +978,92 @@ def main():
     print(f"🔎 price rows: msrp={msrp_count}, dealer={dealer_count}")
     if msrp_count:
         i0 = is_msrp.idxmax()
-        print(f"  sample MSRP key: CN='{df.at[i0,'項目']}', JA='{df.at[i0,'項目_ja']}'")
+        print(f"  sample MSRP key: CN='{df.at[i0,'項目']}', {primary.upper()}='{item_primary.at[i0]}'")
     if dealer_count:
         j0 = is_dealer.idxmax()
-        print(f"  sample Dealer key: CN='{df.at[j0,'項目']}', JA='{df.at[j0,'項目_ja']}'")
-
-    # 価格セル変換（列番号で処理）＋ロック
-    converted_cells: dict[tuple[int, int], str] = {}
-    for col_idx in range(4, len(df.columns)):
-        for row_idx in df.index[is_msrp]:
-            oldv = df.iloc[row_idx, col_idx]
-            newv = msrp_to_yuan_and_jpy(oldv, EXRATE_CNY_TO_JPY)
-            converted_cells[(row_idx, col_idx)] = newv
-        for row_idx in df.index[is_dealer]:
-            oldv = df.iloc[row_idx, col_idx]
-            newv = dealer_to_yuan_and_jpy(oldv, EXRATE_CNY_TO_JPY)
-            converted_cells[(row_idx, col_idx)] = newv
+        print(f"  sample Dealer key: CN='{df.at[j0,'項目']}', {primary.upper()}='{item_primary.at[j0]}'")
 
     # 値セルクリーン（価格行は除外）
     df_vals = df.copy()
     for row_idx in range(len(df_vals)):
-        for col_idx in range(4, len(df_vals.columns)):
+        for col_idx in range(2, len(df_vals.columns)):
             if is_msrp.iloc[row_idx] or is_dealer.iloc[row_idx]:
                 continue
             df_vals.iat[row_idx, col_idx] = clean_any_noise(df_vals.iat[row_idx, col_idx])
 
-    # 値セル翻訳（固定→シリーズ→メモリ→LLM）
+    # 値セル翻訳（固定→シリーズ→メモリ→LLM）: 全言語を 1 パスで
+    coords = []
+    val_maps = {lang: {} for lang in TARGET_LANGS}
     if TRANSLATE_VALUES:
         numeric_like = re.compile(r"^[\d\.\,\%\:/xX\+\-\(\)~～\smmkKwWhHVVAhL丨·—–]+$")
         tr_values_terms = []
-        coords = []
+        basic_terms = []
         for row_idx in range(len(df_vals)):
             if is_msrp.iloc[row_idx] or is_dealer.iloc[row_idx]:
                 continue
-            for col_idx in range(4, len(df_vals.columns)):
+            is_basic = str(df_vals.iat[row_idx, 0]).strip() == "基本参数"
+            for col_idx in range(2, len(df_vals.columns)):
                 v = str(df_vals.iat[row_idx, col_idx]).strip()
                 if v in {"", "●", "○", "–", "-", "—"}:
                     continue
                 if numeric_like.fullmatch(v):
                     continue
                 tr_values_terms.append(v)
+                if is_basic:
+                    basic_terms.append(v)
                 coords.append((row_idx, col_idx))
-        uniq_vals = uniq(tr_values_terms)
+        # 基本仕様の値を先に（予算が厳しいときは残りを次回へ）
+        uniq_basic = uniq(basic_terms)
+        basic_set = set(uniq_basic)
+        uniq_rest = [v for v in uniq(tr_values_terms) if v not in basic_set]
         # 値の固定辞書は今は無し({})。キャッシュ優先。
-        val_map = translate_with_caches("value", uniq_vals, {}, tr) if uniq_vals else {}
+        for group, prio in ((uniq_basic, 1), (uniq_rest, 2)):
+            if group:
+                m = translate_with_caches("value", group, {}, tr, priority=prio + PRIO_OFFSET)
+                for lang in TARGET_LANGS:
+                    val_maps[lang].update(m.get(lang, {}))
+
+    def build_lang_frame(lang: str) -> pd.DataFrame:
+        out = df.copy()
+        out.insert(1, f"セクション_{lang}", df["セクション"].map(lambda s: sec_maps[lang].get(str(s).strip(), str(s).strip())))
+        out.insert(3, f"項目_{lang}",       df["項目"].map(lambda s: item_maps[lang].get(str(s).strip(),   str(s).strip())))
+        out.columns = list(out.columns[:4]) + list(grade_cols[lang])
+
         for (row_idx, col_idx) in coords:
             s = str(df_vals.iat[row_idx, col_idx]).strip()
-            df.iat[row_idx, col_idx] = val_map.get(s, s)
+            out.iat[row_idx, col_idx + 2] = val_maps[lang].get(s, s)
+
+        # 価格セル変換（列番号で処理）: 翻訳結果より優先
+        for col_idx in range(2, len(df.columns)):
+            for row_idx in df.index[is_msrp]:
+                out.iat[row_idx, col_idx + 2] = msrp_to_yuan_and_jpy(df.iloc[row_idx, col_idx], EXRATE_CNY_TO_JPY, lang)
+            for row_idx in df.index[is_dealer]:
+                out.iat[row_idx, col_idx + 2] = dealer_to_yuan_and_jpy(df.iloc[row_idx, col_idx], EXRATE_CNY_TO_JPY, lang)
+        return out
 
-    # 価格ロック再適用
-    for (row_idx, col_idx), val in converted_cells.items():
-        df.iat[row_idx, col_idx] = val
+    if PLAN_ONLY:
+        PLANNER.print_report()
+        return
 
     # キャッシュ保存
-    dump_json_safe(CACHE_FILES["section"], SERIES_CACHE["section"])
-    dump_json_safe(CACHE_FILES["item"],    SERIES_CACHE["item"])
-    dump_json_safe(CACHE_FILES["value"],   SERIES_CACHE["value"])
-    dump_json_safe(CACHE_FILES["col"],     SERIES_CACHE["col"])
+    for lang, files in CACHE_FILES_BY_LANG.items():
+        for kind, path in files.items():
+            dump_json_safe(path, SERIES_CACHE[lang][kind])
+    report_cache_stats()
+    BUDGET.print_summary()
 
-    # 出力
+    # 出力（ja は従来の 2 ファイル。2 つ目は書き直さずコピー）
     DST_PRIMARY.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(DST_PRIMARY,   index=False, encoding="utf-8-sig")
-    df.to_csv(DST_SECONDARY, index=False, encoding="utf-8-sig")
-    print(f"✅ Saved: {DST_PRIMARY}")
+    for lang in TARGET_LANGS:
+        out_df = build_lang_frame(lang)
+        if lang == "ja":
+            out_df.to_csv(DST_PRIMARY, index=False, encoding="utf-8-sig")
+            shutil.copyfile(DST_PRIMARY, DST_SECONDARY)
+            print(f"✅ Saved: {DST_PRIMARY}")
+        else:
+            dst = make_lang_path(DST_PRIMARY, lang)
+            out_df.to_csv(dst, index=False, encoding="utf-8-sig")
+            print(f"✅ Saved: {dst}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# tools/translate_core.py
+#
+# 仕様表翻訳の共通部品（translate_columns.py / translate_service.py から利用）
+#   - プロンプト生成・応答 JSON の寛容パース
+#   - OpenAI 1 バッチ呼び出し
+#   - ローカル翻訳サービス（translate_service.py）へのクライアント
+#
+# import 時に副作用（環境変数読み込み・ディレクトリ作成など）を持たないこと。
+
+import json, re, urllib.request
+
+LANG_NAMES = {"ja": "日本語", "en": "英語", "zh-TW": "繁体字中国語", "ko": "韓国語"}
+
+def chunked(xs, n):
+    for i in range(0, len(xs), n):
+        yield xs[i:i+n]
+
+def build_system_prompt(langs: list[str]) -> str:
+    if list(langs) == ["ja"]:
+        return (
+            "あなたは自動車仕様表の専門翻訳者です。"
+            "入力は中国語の『セクション名/項目名/モデル名/セル値』の配列です。"
+            "自然で簡潔な日本語へ翻訳してください。数値・年式・排量・AT/MT等の記号は保持。"
+            "出力は JSON（{'translations':[{'cn':'原文','ja':'訳文'}]}）のみ。"
+        )
+    names = "・".join(LANG_NAMES.get(l, l) for l in langs)
+    fields = ",".join(f"'{l}':'{LANG_NAMES.get(l, l)}訳'" for l in langs)
+    return (
+        "あなたは自動車仕様表の専門翻訳者です。"
+        "入力は中国語の『セクション名/項目名/モデル名/セル値』の配列です。"
+        f"各語を自然で簡潔な{names}へ同時に翻訳してください。数値・年式・排量・AT/MT等の記号は保持。"
+        f"出力は JSON（{{'translations':[{{'cn':'原文',{fields}}}]}}）のみ。"
+    )
+
+def parse_json_relaxed(content: str, terms: list[str], langs: list[str] = ("ja",)) -> dict[str, dict[str, str]]:
+    """{'cn': {lang: 訳文}} を返す。欠けた言語は原文で埋める。
+    読み取れなかった語は含めない（原文を訳としてキャッシュしないように）。"""
+    try:
+        d = json.loads(content)
+        if isinstance(d, dict) and "translations" in d:
+            return {
+                str(t["cn"]).strip(): {l: str(t.get(l, t["cn"])).strip() for l in langs}
+                for t in d["translations"]
+                if t.get("cn")
+            }
+    except Exception:
+        pass
+    out: dict[str, dict[str, str]] = {}
+    for obj in re.findall(r'\{[^{}]*"cn"\s*:[^{}]*\}', content):
+        m = re.search(r'"cn"\s*:\s*"([^"]+)"', obj)
+        if not m:
+            continue
+        cn = m.group(1).strip()
+        row = {}
+        for l in langs:
+            ml = re.search(rf'"{l}"\s*:\s*"([^"]*)"', obj)
+            row[l] = ml.group(1).strip() if ml else cn
+        out[cn] = row
+    return out
+
+def estimate_batch_tokens(langs: list[str], terms: list[str]) -> tuple[int, int]:
+    """1 バッチの (prompt, completion) トークン概算（予算判定用）"""
+    from llm_budget import estimate_tokens
+    body = estimate_tokens(json.dumps({"terms": terms}, ensure_ascii=False))
+    prompt = estimate_tokens(build_system_prompt(langs)) + body
+    return prompt, int(body * 1.5 * len(langs))
+
+def chat_translate_batch(client, model: str, langs: list[str], terms: list[str], on_usage=None) -> dict[str, dict[str, str]]:
+    """OpenAI へ 1 バッチ送信。例外はそのまま呼び出し側へ。on_usage には resp.usage を渡す。"""
+    msgs = [
+        {"role": "system", "content": build_system_prompt(langs)},
+        {"role": "user", "content": json.dumps({"terms": terms}, ensure_ascii=False)},
+    ]
+    resp = client.chat.completions.create(
+        model=model,
+        messages=msgs,
+        temperature=0,
+        response_format={"type": "json_object"},
+    )
+    if on_usage is not None:
+        on_usage(getattr(resp, "usage", None))
+    content = resp.choices[0].message.content or ""
+    return parse_json_relaxed(content, terms, langs)
+
+# =============================
+# ローカル翻訳サービスのクライアント
+# =============================
+def service_translate(url: str, terms: list[str], langs: list[str], timeout: float = 600.0,
+                      on_usage=None) -> dict[str, dict[str, str]]:
+    """translate_service.py の POST /translate を呼ぶ。戻り値は {原文: {lang: 訳文}}。
+    on_usage にはこの依頼のために使われたトークン（{"prompt_tokens", "completion_tokens"}）を渡す。"""
+    body = json.dumps({"terms": terms, "langs": list(langs)}, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(
+        url.rstrip("/") + "/translate",
+        data=body,
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        data = json.loads(r.read().decode("utf-8"))
+    if on_usage is not None and any((data.get("usage") or {}).values()):
+        on_usage(data["usage"])
+    return data.get("translations", {})
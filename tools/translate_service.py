@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# tools/translate_service.py
+#
+# 目的:
+#   同一ホストで並行実行される translate_columns.py 間で LLM 翻訳を共有する常駐サービス。
+#   - 全クライアントの依頼語を集約し、処理中（in-flight）の同一語は 1 回だけ翻訳
+#   - プロセスをまたいでバッチを組み、レート制限はサービス全体で 1 つ
+#   - 結果は依頼元すべてへ配り、実行中はメモリに保持
+#
+# 使い方:
+#   python tools/translate_service.py --port 8765 [--backend openai|mock]
+#   TRANSLATE_SERVICE_URL=http://127.0.0.1:8765 python tools/translate_columns.py
+#
+# API（translate_unique と同じ入出力）:
+#   POST /translate  {"terms": [...], "langs": ["ja", "en"]}
+#        → {"translations": {"原文": {"ja": "...", "en": "..."}},
+#           "usage": {"prompt_tokens": n, "completion_tokens": n}}
+#        usage はこの依頼が最初に出した語のぶん（バッチの消費を語数で按分。キャッシュ・相乗りの語は 0）
+#        --request-timeout 秒で揃わなければ 504、バッチ処理自体が落ちたら 502
+#   GET  /stats      集約・バッチ・キャッシュの統計
+
+import argparse, json, os, sys, threading, time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from translate_core import chat_translate_batch
+
+try:
+    sys.stdout.reconfigure(line_buffering=True)
+except Exception:
+    pass
+
+# =============================
+# バックエンド
+# =============================
+class OpenAIBackend:
+    def __init__(self, model: str, api_key: str | None, base_url: str | None = None):
+        from openai import OpenAI
+        if not (api_key and api_key.strip()):
+            if not base_url:
+                raise RuntimeError("OPENAI_API_KEY is not set")
+            api_key = "offline"
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.model = model
+
+    def __call__(self, terms: list[str], langs: list[str], on_usage=None) -> dict[str, dict[str, str]]:
+        return chat_translate_batch(self.client, self.model, langs, terms, on_usage=on_usage)
+
+class MockBackend:
+    """オフライン検証用: '[ja]原文' のような決定的な訳を返す"""
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def __call__(self, terms: list[str], langs: list[str], on_usage=None) -> dict[str, dict[str, str]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return {t: {l: f"[{l}]{t}" for l in langs} for t in terms}
+
+# =============================
+# レート制限（サービス全体で共有）
+# =============================
+class RateLimiter:
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+# =============================
+# 集約器
+# =============================
+class Coalescer:
+    def __init__(self, backend, batch_size=60, max_wait=0.05, rpm=0.0, workers=2, retries=3, sleep_base=1.2):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.limiter = RateLimiter(rpm)
+        self.retries = retries
+        self.sleep_base = sleep_base
+        self.cv = threading.Condition()
+        self.queue: list[tuple[tuple[str, ...], str]] = []
+        self.inflight: dict[tuple[tuple[str, ...], str], Future] = {}
+        self.done: dict[tuple[tuple[str, ...], str], dict[str, str]] = {}
+        self.stats = {"requests": 0, "terms": 0, "cached": 0, "coalesced": 0, "sent": 0, "batches": 0, "errors": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+        for _ in range(max(1, workers)):
+            threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, terms: list[str], langs: list[str], timeout: float = 600.0) -> tuple[dict[str, dict[str, str]], dict[str, int]]:
+        """→ (訳, この依頼が最初に出した語に按分されたトークン)
+        訳が取れなかった語は結果に含めない（呼び出し側で原文をキャッシュしないように）
+        timeout 秒（全体）で揃わなければ FutureTimeout、バッチ処理が落ちればその例外を送出"""
+        lk = tuple(langs)
+        out: dict[str, dict[str, str]] = {}
+        waits: dict[str, Future] = {}
+        owned: set[str] = set()
+        with self.cv:
+            self.stats["requests"] += 1
+            for t in dict.fromkeys(terms):
+                key = (lk, t)
+                self.stats["terms"] += 1
+                if key in self.done:
+                    out[t] = self.done[key]
+                    self.stats["cached"] += 1
+                elif key in self.inflight:
+                    waits[t] = self.inflight[key]
+                    self.stats["coalesced"] += 1
+                else:
+                    fut = Future()
+                    self.inflight[key] = fut
+                    self.queue.append(key)
+                    waits[t] = fut
+                    owned.add(t)
+            self.cv.notify_all()
+        usage = {"prompt_tokens": 0.0, "completion_tokens": 0.0}
+        deadline = time.monotonic() + timeout
+        for t, fut in waits.items():
+            row, share = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+            if row:
+                out[t] = row
+            if t in owned:
+                for k in usage:
+                    usage[k] += share.get(k, 0)
+        return out, {k: round(v) for k, v in usage.items()}
+
+    def _take_batch(self) -> list[tuple[tuple[str, ...], str]]:
+        with self.cv:
+            while True:
+                while not self.queue:
+                    self.cv.wait()
+                # 少しだけ待って他プロセスの依頼も同じバッチに乗せる
+                deadline = time.monotonic() + self.max_wait
+                while len(self.queue) < self.batch_size:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self.cv.wait(left)
+                # 待っている間に他のワーカーが持っていったら最初から
+                if self.queue:
+                    break
+            lk = self.queue[0][0]
+            batch = [k for k in self.queue if k[0] == lk][: self.batch_size]
+            taken = set(batch)
+            self.queue = [k for k in self.queue if k not in taken]
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # 想定外の失敗でも待っている依頼を取り残さない（ワーカーは次のバッチへ）
+                print("❌ batch failed:", repr(e))
+                with self.cv:
+                    self.stats["errors"] += 1
+                    for key in batch:
+                        fut = self.inflight.pop(key, None)
+                        if fut is not None and not fut.done():
+                            fut.set_exception(e)
+
+    def _run_batch(self, batch: list[tuple[tuple[str, ...], str]]):
+        langs = list(batch[0][0])
+        terms = [t for _, t in batch]
+        res = None
+        err = None
+        used = {"prompt_tokens": 0, "completion_tokens": 0}
+
+        def on_usage(u):
+            get = u.get if isinstance(u, dict) else (lambda k, d=0: getattr(u, k, d))
+            for k in used:
+                used[k] += int(get(k, 0) or 0)
+
+        for attempt in range(1, self.retries + 1):
+            self.limiter.acquire()
+            try:
+                res = self.backend(terms, langs, on_usage=on_usage)
+                break
+            except Exception as e:
+                err = e
+                with self.cv:
+                    self.stats["errors"] += 1
+                print(f"❌ backend error attempt={attempt}:", repr(e))
+                if attempt < self.retries:
+                    time.sleep(self.sleep_base * attempt)
+        share = {k: v / len(batch) for k, v in used.items()}
+        with self.cv:
+            self.stats["batches"] += 1
+            self.stats["sent"] += len(terms)
+            for k, v in used.items():
+                self.stats[k] += v
+            for key in batch:
+                fut = self.inflight.pop(key, None)
+                if res is None:
+                    # リトライ切れ: 原文を訳として返さずエラーにする（クライアントは 502 を受けてキャッシュしない）
+                    if fut is not None:
+                        fut.set_exception(err or RuntimeError("backend failed"))
+                    continue
+                row = res.get(key[1]) or None   # 応答に無い語は None（submit が結果から外す）
+                if row:
+                    self.done[key] = row
+                if fut is not None:
+                    fut.set_result((row, share))
+
+# =============================
+# HTTP
+# =============================
+def make_handler(coalescer: Coalescer, request_timeout: float = 600.0):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with coalescer.cv:
+                    stats = dict(coalescer.stats, queued=len(coalescer.queue), inflight=len(coalescer.inflight))
+                self._send(200, stats)
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/translate":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                n = int(self.headers.get("Content-Length") or 0)
+                req = json.loads(self.rfile.read(n).decode("utf-8"))
+                terms = [str(t) for t in req.get("terms", [])]
+                langs = [str(l) for l in req.get("langs", ["ja"])] or ["ja"]
+            except Exception as e:
+                self._send(400, {"error": f"bad request: {e}"})
+                return
+            try:
+                translations, usage = coalescer.submit(terms, langs, timeout=request_timeout)
+            except FutureTimeout:
+                self._send(504, {"error": f"translation timed out after {request_timeout:g}s"})
+                return
+            except Exception as e:
+                self._send(502, {"error": f"translation failed: {e!r}"})
+                return
+            self._send(200, {"translations": translations, "usage": usage})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", type=str, default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--backend", choices=["openai", "mock"], default="openai")
+    ap.add_argument("--model", type=str, default=os.environ.get("OPENAI_MODEL", "gpt-4.1-mini"))
+    ap.add_argument("--batch-size", type=int, default=60)
+    ap.add_argument("--max-wait-ms", type=int, default=50, help="バッチを組むための最大待ち時間")
+    ap.add_argument("--rpm", type=float, default=0.0, help="サービス全体の LLM リクエスト上限/分（0 で無制限）")
+    ap.add_argument("--workers", type=int, default=2, help="同時に LLM へ投げるバッチ数")
+    ap.add_argument("--mock-latency", type=float, default=0.0)
+    ap.add_argument("--request-timeout", type=float, default=600.0, help="1 依頼の待ち上限秒（超えたら 504）")
+    args = ap.parse_args()
+
+    if args.backend == "mock":
+        backend = MockBackend(args.mock_latency)
+    else:
+        backend = OpenAIBackend(args.model, os.environ.get("OPENAI_API_KEY"), os.environ.get("OPENAI_BASE_URL", "").strip() or None)
+    coalescer = Coalescer(backend, args.batch_size, args.max_wait_ms / 1000.0, args.rpm, args.workers)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(coalescer, args.request_timeout))
+    print(f"🚀 translate service on http://{args.host}:{args.port} (backend={args.backend})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()